@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the GDAIS-core data reception path.
+
+They replay a raw capture without Qt, so they can be run on any host:
+
+    python benchmark.py framing [-i test/LOF06.bin] [-c conf/instruments/gps.json]
+    python benchmark.py decoding [-i test/LOF06.bin] [-c conf/instruments/gps.json]
+    python benchmark.py records [-c conf/instruments/compass_f350.json] [-n 1000000]
+    python benchmark.py packets [-i test/LOF06.bin] [-c conf/instruments/gps.json]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+from codec import Codec
+from framer import Framer
+from instrument import Instrument, PacketFormat
+from replay import FastReplay
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(BASE_PATH, 'test', 'LOF06.bin')
+DEFAULT_INSTRUMENT = os.path.join(BASE_PATH, 'conf', 'instruments', 'gps.json')
+DEFAULT_RECORDS_INSTRUMENT = os.path.join(BASE_PATH, 'conf', 'instruments', 'compass_f350.json')
+
+# read size used by Connection.read_data
+DEFAULT_READ_SIZE = 8
+
+# packets decoded together, as batched by the connections
+DEFAULT_BATCH_SIZE = 256
+
+# records generated and bytes read at once (as Transport.READ_SIZE) by the
+# records benchmark
+DEFAULT_RECORDS = 1000000
+DEFAULT_RECORDS_READ_SIZE = 4096
+
+
+class LegacyFramer(object):
+    """Start and end marks search as done by Connection before using Framer.
+
+    Marks are checked slicing the data at every offset, and the whole
+    packet is rescanned from the last index on every read.
+
+    Connection had no byte stuffing, so with dle the doubled DLE bytes are
+    skipped when looking for the end mark and un-escaped in the packets, to
+    find the same packets as Framer in DLE framed data.
+    """
+
+    def __init__(self, start_bytes, end_bytes, dle=False):
+        self.start_bytes = bytearray(start_bytes)
+        self.start_bytes_len = len(self.start_bytes)
+        self.end_bytes = bytearray(end_bytes)
+        self.end_bytes_len = len(self.end_bytes)
+        self.stuffed_dle = self.start_bytes[:1] * 2 if dle else None
+        self.packet = bytearray()
+        self.old_data = None
+        self.last_index = -1
+
+    def feed(self, data):
+        packets = []
+        if self.last_index == -1:
+            if self.old_data:
+                data = self.old_data + data
+                self.old_data = None
+            for i in range(len(data) - self.start_bytes_len + 1):
+                if data[i:i + self.start_bytes_len] == self.start_bytes:
+                    self.packet += data[i + self.start_bytes_len:]
+                    self.last_index = 0
+                    break
+            if self.last_index == -1:
+                self.old_data = data
+        else:
+            self.packet += data
+
+        if self.last_index >= 0 and self.packet:
+            i = self.last_index
+            while i < len(self.packet) - self.end_bytes_len + 1:
+                if self.stuffed_dle and self.packet[i:i + 2] == self.stuffed_dle:
+                    i += 2
+                    continue
+                if self.packet[i:i + self.end_bytes_len] == self.end_bytes:
+                    packet = self.packet[:i]
+                    if self.stuffed_dle:
+                        packet = packet.replace(self.stuffed_dle, self.start_bytes[:1])
+                    packets.append(packet)
+                    self.old_data = self.packet[i + self.end_bytes_len:]
+                    self.packet = bytearray('')
+                    self.last_index = -1
+                    break
+                i += 1
+            if self.last_index >= 0:
+                self.last_index = i
+        return packets
+
+
+class LegacyParsedPacket(object):
+    """ParsedPacket as it was before using slots.
+
+    Each packet has an instance dictionary, keeps its raw data and looks up
+    the parser logger.
+    """
+
+    def __init__(self, raw_data, packet=None, parsed_data=None):
+        self.raw_data = raw_data
+        self.instrument_packet = packet
+        self.data = parsed_data
+        self.info = ''
+        self.log = logging.getLogger('GDAIS.Parser')
+
+
+def replay(framer, data, read_size):
+    """Feed data to the framer in read_size chunks.
+
+    Returns a tuple with the number of frames found and the elapsed time.
+    """
+    frames = 0
+    t0 = time.time()
+    for i in xrange(0, len(data), read_size):
+        frames += len(framer.feed(data[i:i + read_size]))
+    return frames, time.time() - t0
+
+
+def report(name, frames, size, elapsed):
+    txt = "{0:>8}: {1:7d} frames in {2:7.3f} s ({3:9.0f} frames/s, {4:7.2f} MB/s)"
+    print txt.format(name, frames, elapsed, frames / elapsed, size / elapsed / 1e6)
+
+
+def bench_framing(args):
+    instrument = Instrument(os.path.abspath(args.instrument))
+    format = instrument.packet_format
+    if not (PacketFormat.FormatField.start_bytes in format.rx_format and
+            PacketFormat.FormatField.end_bytes in format.rx_format):
+        raise SystemExit("Framing benchmark needs start and end bytes in rx_format")
+
+    with open(args.input, 'rb') as fp:
+        data = fp.read()
+    print "Replaying {0} ({1} bytes), read size: {2}".format(args.input, len(data), args.read_size)
+
+    dle = format.byte_stuffing == PacketFormat.ByteStuffing.dle
+    frames, elapsed = replay(LegacyFramer(format.start_bytes, format.end_bytes, dle),
+                             data, args.read_size)
+    report('before', frames, len(data), elapsed)
+
+    frames, elapsed = replay(Framer(instrument), data, args.read_size)
+    report('after', frames, len(data), elapsed)
+
+
+def bench_decoding(args):
+    instrument = Instrument(os.path.abspath(args.instrument))
+    codec = Codec(instrument)
+    with open(args.input, 'rb') as fp:
+        batches = list(FastReplay(fp, Framer(instrument)).batches(args.batch_size))
+    frames = sum(len(batch) for batch in batches)
+    size = os.path.getsize(args.input)
+    print "Decoding {0} frames of {1}, batch size: {2}".format(frames, args.input, args.batch_size)
+
+    t0 = time.time()
+    for batch in batches:
+        [codec.parse(frame) for frame in batch]
+    report('before', frames, size, time.time() - t0)
+
+    t0 = time.time()
+    for batch in batches:
+        codec.decode_frames(batch)
+    report('after', frames, size, time.time() - t0)
+
+
+def bench_packets(args):
+    instrument = Instrument(os.path.abspath(args.instrument))
+    codec = Codec(instrument)
+    with open(args.input, 'rb') as fp:
+        frames = [frame for batch in FastReplay(fp, Framer(instrument)).batches(DEFAULT_BATCH_SIZE)
+                        for frame in batch]
+    frames = [frame for frame in frames if not codec.identify(frame)[2]]
+    size = os.path.getsize(args.input)
+    print "Parsing {0} packets of {1} one by one".format(len(frames), args.input)
+
+    # the packets are kept, as when they are queued to the controller
+    t0 = time.time()
+    packets = []
+    for frame in frames:
+        packet, fields_size, _ = codec.identify(frame)
+        data = frame[codec.header_size:codec.header_size + fields_size]
+        packets.append(LegacyParsedPacket(frame, packet, packet.struct.unpack(str(data))))
+    report('before', len(packets), size, time.time() - t0)
+    # record and its dictionary, and the raw data it keeps alive
+    record = sum(sys.getsizeof(p) + sys.getsizeof(p.__dict__) for p in packets)
+    raw = sum(sys.getsizeof(p.raw_data) for p in packets)
+    before = float(record + raw) / len(packets)
+    txt = "{0:>8}: {1:.0f} bytes/packet (record: {2:.0f}, raw data: {3:.0f})"
+    print txt.format('', before, float(record) / len(packets), float(raw) / len(packets))
+
+    del packets
+    t0 = time.time()
+    packets = [codec.parse(frame) for frame in frames]
+    report('after', len(packets), size, time.time() - t0)
+    after = float(sum(sys.getsizeof(p) for p in packets)) / len(packets)
+    txt = "{0:>8}: {1:.0f} bytes/packet, {2:.0f} bytes/packet saved"
+    print txt.format('', after, before - after)
+
+
+def bench_records(args):
+    instrument = Instrument(os.path.abspath(args.instrument))
+    record_size = Framer(instrument).record_size
+    if not record_size:
+        raise SystemExit("Records benchmark needs packets made only of their fields")
+
+    # there are no captures of these instruments, records are random bytes
+    data = bytearray(random.getrandbits(8) for _ in xrange(args.records * record_size))
+    txt = "Decoding {0} records of {1} bytes, read size: {2}"
+    print txt.format(args.records, record_size, args.read_size)
+
+    framer = Framer(instrument)
+    codec = Codec(instrument)
+    t0 = time.time()
+    for i in xrange(0, len(data), args.read_size):
+        framer.append(data[i:i + args.read_size])
+        codec.decode_frames([bytearray(packet) for packet in framer.extract()])
+    report('before', args.records, len(data), time.time() - t0)
+
+    framer = Framer(instrument)
+    t0 = time.time()
+    for i in xrange(0, len(data), args.read_size):
+        framer.append(data[i:i + args.read_size])
+        codec.decode_records(bytearray(framer.extract_records()))
+    report('after', args.records, len(data), time.time() - t0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='GDAIS-core reception benchmarks')
+    subparsers = parser.add_subparsers()
+
+    framing = subparsers.add_parser('framing', help='Frame search in a raw capture')
+    framing.add_argument('-i', dest='input', default=DEFAULT_INPUT,
+                                        help='Raw capture file to replay')
+    framing.add_argument('-c', dest='instrument', default=DEFAULT_INSTRUMENT,
+                                        help='Instrument file (.json) describing the packet format')
+    framing.add_argument('-r', dest='read_size', type=int, default=DEFAULT_READ_SIZE,
+                                        help='Bytes fed to the framer on each read')
+    framing.set_defaults(func=bench_framing)
+
+    decoding = subparsers.add_parser('decoding', help='Packet decoding of a raw capture')
+    decoding.add_argument('-i', dest='input', default=DEFAULT_INPUT,
+                                        help='Raw capture file to replay')
+    decoding.add_argument('-c', dest='instrument', default=DEFAULT_INSTRUMENT,
+                                        help='Instrument file (.json) describing the packets')
+    decoding.add_argument('-b', dest='batch_size', type=int, default=DEFAULT_BATCH_SIZE,
+                                        help='Packets decoded together')
+    decoding.set_defaults(func=bench_decoding)
+
+    packets = subparsers.add_parser('packets', help='Size and creation time of the '
+                                                    'packets parsed one by one')
+    packets.add_argument('-i', dest='input', default=DEFAULT_INPUT,
+                                        help='Raw capture file to replay')
+    packets.add_argument('-c', dest='instrument', default=DEFAULT_INSTRUMENT,
+                                        help='Instrument file (.json) describing the packets')
+    packets.set_defaults(func=bench_packets)
+
+    records = subparsers.add_parser('records', help='Decoding of packets made only of '
+                                                    'their fields, one block per read')
+    records.add_argument('-c', dest='instrument', default=DEFAULT_RECORDS_INSTRUMENT,
+                                        help='Instrument file (.json) describing the records')
+    records.add_argument('-n', dest='records', type=int, default=DEFAULT_RECORDS,
+                                        help='Records decoded')
+    records.add_argument('-r', dest='read_size', type=int, default=DEFAULT_RECORDS_READ_SIZE,
+                                        help='Bytes received on each read')
+    records.set_defaults(func=bench_records)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the raw capture file format.
+
+A capture file stores the data received from an instrument as it arrived:
+a header (magic bytes and format version) followed by a record for each
+read, with the receive time (seconds, float64) and the length (uint32) of
+its data, little-endian:
+
+    GDAISCAP | version (uint8) | time | length | data | time | length | ...
+
+Files without the header are raw captures (only data, e.g.: test/LOF06.bin).
+Receive times are taken from a monotonic clock, so only the differences
+between them are meaningful. It does not depend on Qt.
+"""
+import ctypes
+import ctypes.util
+from datetime import datetime
+import logging
+import os
+import Queue
+import struct
+import threading
+import time
+
+
+# magic bytes and version of the capture file header
+MAGIC = b'GDAISCAP'
+VERSION = 1
+HEADER = struct.Struct('<8sB')
+
+# header of each data record: receive time and data length
+RECORD = struct.Struct('<dI')
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _load_clock_gettime():
+    for name in (ctypes.util.find_library('rt'), ctypes.util.find_library('c')):
+        try:
+            return ctypes.CDLL(name, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            pass
+    return None
+
+_clock_gettime = _load_clock_gettime()
+
+# clock_gettime clock id (Linux)
+CLOCK_MONOTONIC = 1
+
+
+def monotonic():
+    """Return the seconds of a clock that is not affected by system time changes.
+
+    Falls back to time.time where clock_gettime is not available.
+    """
+    if _clock_gettime:
+        ts = _Timespec()
+        if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) == 0:
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+    return time.time()
+
+
+def is_capture(fp):
+    """Whether the given file has the capture header.
+
+    The file position is kept.
+    """
+    position = fp.tell()
+    magic = fp.read(len(MAGIC))
+    fp.seek(position)
+    return magic == MAGIC
+
+
+class CaptureReader(object):
+    """Iterator of the (time, data) records of a capture file."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        magic, version = HEADER.unpack(fp.read(HEADER.size))
+        if magic != MAGIC:
+            raise Exception('Not a capture file')
+        if version != VERSION:
+            raise Exception('Capture format version {0} not supported'.format(version))
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        record = self.fp.read(RECORD.size)
+        if len(record) < RECORD.size:
+            raise StopIteration
+        timestamp, length = RECORD.unpack(record)
+        data = self.fp.read(length)
+        if len(data) < length:
+            # truncated record (e.g.: capture not closed correctly)
+            raise StopIteration
+        return timestamp, data
+
+
+class CaptureStream(object):
+    """Reader of the data of a capture file, without its record headers.
+
+    It can be read as the raw file it was captured from (readinto), e.g.:
+    to replay it in blocks as data from a device.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.records = CaptureReader(fp)
+
+        # data of the current record and position of its first byte not read
+        self.data = b''
+        self.position = 0
+
+    def readinto(self, buffer):
+        if self.position >= len(self.data):
+            try:
+                _, self.data = next(self.records)
+            except StopIteration:
+                return 0
+            self.position = 0
+        size = min(len(buffer), len(self.data) - self.position)
+        buffer[:size] = self.data[self.position:self.position + size]
+        self.position += size
+        return size
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        self.fp.close()
+
+
+class CaptureWriter(object):
+    """Writer of the data received from an instrument to a capture file.
+
+    Data is queued with its receive time, and a writer thread appends it to
+    the file with buffered writes, so the reading thread is never blocked by
+    the disk. If the queue is full, data is dropped (and counted) instead.
+    """
+
+    BASE_PATH = '/home/pau/feina/UPC/projecte/code/GDAIS/GDAIS-core'
+    CAPTURE_PATH = os.path.join(BASE_PATH, 'data', 'captures')
+
+    # reads waiting to be written, and size of the file buffer
+    QUEUE_SIZE = 4096
+    BUFFER_SIZE = 1024 * 1024
+
+    @staticmethod
+    def create(instrument):
+        """Return a writer to a new capture file of the given instrument."""
+        dir = os.path.join(CaptureWriter.CAPTURE_PATH, instrument.short_name)
+        if not os.path.exists(dir):
+            os.makedirs(dir)
+        txt = "{0}_{1}.cap"
+        filename = txt.format(instrument.short_name, datetime.utcnow().strftime("%Y%m%d_%H%M%S"))
+        return CaptureWriter(os.path.join(dir, filename))
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fp = open(filename, 'wb', self.BUFFER_SIZE)
+        self.fp.write(HEADER.pack(MAGIC, VERSION))
+
+        # queue of (time, data) records to be written, None ends the thread
+        self.queue = Queue.Queue(self.QUEUE_SIZE)
+
+        # number of bytes written and dropped because the queue was full
+        self.bytes = 0
+        self.dropped = 0
+
+        # default logger
+        self.log = logging.getLogger('GDAIS.CaptureWriter')
+
+        self.thread = threading.Thread(target=self._run, name='CaptureWriter')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, data):
+        """Queue the data just received (a memoryview, or any buffer)."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        else:
+            data = str(data)
+        try:
+            self.queue.put_nowait((monotonic(), data))
+        except Queue.Full:
+            self.dropped += len(data)
+
+    def close(self):
+        """Write the queued data and close the file."""
+        if self.fp:
+            self.queue.put(None)
+            self.thread.join()
+            self.fp.close()
+            self.fp = None
+            txt = "Captured {0} bytes to '{1}'"
+            self.log.info(txt.format(self.bytes, self.filename))
+            if self.dropped:
+                self.log.warn("Capture queue full, bytes dropped: {0}".format(self.dropped))
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            timestamp, data = record
+            try:
+                self.fp.write(RECORD.pack(timestamp, len(data)))
+                self.fp.write(data)
+            except IOError:
+                self.log.exception("Error writing capture file")
+                self.dropped += len(data)
+            else:
+                self.bytes += len(data)
+        self.fp.flush()
+
+
+def start_capture(instrument, framer, log):
+    """Capture the raw data received by framer, if enabled for the instrument.
+
+    Returns the CaptureWriter (to be closed with the connection), or None if
+    the data is not captured. The errors creating the file are logged.
+    """
+    if not instrument.connection.capture:
+        return None
+    try:
+        capture = CaptureWriter.create(instrument)
+    except (IOError, OSError):
+        log.exception("Can not create capture file, data will not be captured")
+        return None
+    log.info("Capturing raw data to '{0}'".format(capture.filename))
+    framer.tap = capture.write
+    return capture
@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the instrument connections run by the I/O reactor.
+
+A channel is the reactor counterpart of a Connection and its Parser: the
+data received from the instrument is read, framed and parsed inline in the
+reactor thread, and the parsed packets of each read are handed out together
+to the packets handler. It does not depend on Qt.
+"""
+import logging
+import socket
+import time
+
+import serial
+
+from capture import monotonic, start_capture
+from codec import Codec
+from demux import Demultiplexer, link_instrument
+from framer import Framer
+import instrument
+from replay import FastReplay, PacedReplay
+from transport import Transport
+from txqueue import TxQueue
+
+
+class Channel(object):
+    """Instrument connection run by the reactor, for any transport.
+
+    Stream transports are read and framed, and datagram transports hold a
+    whole frame in each datagram. TCP connections (TCPChannel) and input
+    files (FileChannel) add reconnection and replay.
+    """
+
+    @staticmethod
+    def create(reactor, instr, *args, **kwds):
+        conn_type = instrument.ConnectionCfg.Type
+        channel = {
+            conn_type.file:     FileChannel,
+            conn_type.tcp:     TCPChannel
+        }.get(instr.connection.type, Channel)
+
+        return channel(reactor, instr, *args, **kwds)
+
+    @staticmethod
+    def create_link(reactor, link, instr_cfgs):
+        """Create the channel of a link shared by the given instruments.
+
+        Its packets are handed to the LinkChannel of each instrument.
+        """
+        channel = Channel.create(reactor, link_instrument(link, instr_cfgs))
+        channel.demux = Demultiplexer(link, channel.instrument.packet_format,
+                                      instr_cfgs)
+        return channel
+
+    def __init__(self, reactor, instrument):
+        # reactor running this channel
+        self.reactor = reactor
+
+        # instrument description
+        self.instrument = instrument
+
+        # default logger
+        self.log = logging.getLogger('GDAIS.'+instrument.short_name+'.Channel')
+
+        # I/O transport of the connection type
+        self.transport = Transport.create(instrument, self.log)
+
+        # packet framing engine and decoder
+        self.framer = Framer(instrument)
+        self.codec = Codec(instrument)
+
+        # frames waiting to be written to the instrument, and whether the
+        # reactor is waiting for the connection to accept more data
+        self.tx_queue = TxQueue()
+        self.write_waiting = False
+
+        # bytes read at once and maximum packets handled on each read (0 for
+        # no limit, the remaining ones are handled on the next iteration)
+        self.read_size = instrument.connection.read_size or self.transport.READ_SIZE
+        self.max_frames = instrument.connection.max_frames
+
+        # time when the data being framed was received
+        self.receive_time = 0.0
+
+        # functions called with the packets decoded on each read (list of
+        # PacketBatch), and when an error occurs
+        self.packets_handler = None
+        self.error_handler = None
+
+        # router of the packets to the instruments sharing this channel, if
+        # it is a shared link (see create_link)
+        self.demux = None
+
+        # writer of the raw data received to a capture file (if enabled)
+        self.capture = start_capture(instrument, self.framer, self.log)
+
+    def open(self):
+        """Open the connection and start reading it (in the reactor thread)."""
+        if not self.transport.open():
+            self.on_error()
+        else:
+            self.reactor.add_reader(self.fileno(), self.on_readable)
+
+    def close(self):
+        """Stop reading and close the connection (in the reactor thread)."""
+        self.stop_watching()
+        self.transport.close()
+        if self.tx_queue.sent or self.tx_queue.dropped:
+            self.log.info(self.tx_queue.summary())
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+        txt = "Packets received: {0}, rejected: {1}, resyncs: {2}"
+        self.log.info(txt.format(self.framer.accepted, self.framer.rejected,
+                                 self.framer.resyncs))
+        if self.demux:
+            self.log.info(self.demux.summary())
+
+    def stop_watching(self):
+        """Stop waiting for the connection to be readable or writable."""
+        if self.transport.io_conn:
+            self.reactor.remove_reader(self.fileno())
+            self.reactor.remove_writer(self.fileno())
+        self.write_waiting = False
+
+    def is_open(self):
+        return self.transport.io_conn is not None
+
+    def fileno(self):
+        return self.transport.fileno()
+
+    def write(self, data):
+        """Queue data to be written and write as much as possible now."""
+        if self.transport.receiver:
+            self.transport.send_datagram(data)
+            return
+        self.tx_queue.put(data)
+        self.flush()
+
+    def flush(self):
+        """Write the queued frames, as many as the connection accepts now.
+
+        If some are left, the reactor calls it again when the connection
+        accepts more data.
+        """
+        while True:
+            data = self.tx_queue.data()
+            if not data:
+                break
+            written = self.transport.write_some(data)
+            if not written:
+                if not self.write_waiting:
+                    self.reactor.add_writer(self.fileno(), self.on_writable)
+                    self.write_waiting = True
+                return
+            self.tx_queue.consume(written)
+        if self.write_waiting:
+            self.reactor.remove_writer(self.fileno())
+            self.write_waiting = False
+
+    def on_writable(self):
+        try:
+            self.flush()
+        except (IOError, OSError, socket.error, serial.SerialException):
+            self.log.exception("Error writing to the connection")
+            self.on_error()
+
+    def send(self, command):
+        """Send the given command to the instrument."""
+        if not self.is_open():
+            self.log.error("Received new command while not connected")
+            return
+        self.log.debug("Sending '{0}' command (0x{1:X})".format(command.name, command.id))
+        try:
+            self.write(self.framer.frame(self.codec.encode(command)))
+        except (IOError, OSError, socket.error, serial.SerialException):
+            self.log.exception("Error writing to the connection")
+            self.on_error()
+
+    def on_readable(self):
+        if self.transport.receiver:
+            self.receive_datagrams()
+            return
+        try:
+            received = self.framer.fill(self.transport.read_into, self.read_size)
+        except (IOError, OSError, socket.error, serial.SerialException):
+            self.log.exception("Error reading from the connection")
+            self.on_error()
+            return
+
+        if not received:
+            if received == 0 and self.transport.EMPTY_READ_CLOSES:
+                self.on_closed()
+            return
+        self.receive_time = time.time()
+        self.extract()
+
+    def receive_datagrams(self):
+        # each datagram holds a whole frame, no stream framing is needed
+        try:
+            packets = self.transport.receive(self.framer, self.max_frames)
+        except socket.error:
+            self.log.exception("Error receiving datagrams")
+            self.on_error()
+            return
+        self.receive_time = time.time()
+        self.handle_frames(packets)
+
+    def extract(self):
+        """Parse the packets found in the received data and hand them out."""
+        if self.framer.record_size:
+            records = self.framer.extract_records(self.max_frames)
+            found = len(records) // self.framer.record_size
+        else:
+            packets = self.framer.extract(self.max_frames)
+            found = len(packets)
+        if self.max_frames and found == self.max_frames:
+            # let other channels run, remaining data is handled afterwards
+            self.reactor.call_soon(self.extract)
+        if self.framer.record_size:
+            self.handle_records(records)
+        else:
+            self.handle_frames(packets)
+
+    def handle_frames(self, packets):
+        """Parse the given packets found by the framer and hand them out."""
+        if packets:
+            # packets are views of the receive buffer, parse copies of them
+            self.dispatch_frames([bytearray(packet) for packet in packets],
+                                 [self.receive_time] * len(packets))
+
+    def handle_records(self, records):
+        """Parse the given block of records found by the framer and hand them out."""
+        if len(records):
+            # records are a view of the receive buffer, parse a copy of them
+            self.dispatch_records(bytearray(records), self.receive_time)
+
+    def dispatch_records(self, records, timestamp):
+        """Decode the given block of records, received at the given time, at
+        once and hand it out."""
+        batch = self.codec.decode_records(records, timestamp)
+        if batch and self.packets_handler:
+            self.packets_handler([batch])
+
+    def dispatch_frames(self, frames, times):
+        """Decode the given packets, received at the given times, in batches
+        and hand them out.
+
+        On a shared link, they are handed to the instruments they belong to.
+        """
+        if self.demux:
+            for link_channel, link_frames, link_times in self.demux.split(frames, times):
+                link_channel.dispatch_frames(link_frames, link_times)
+            return
+        batches = self.codec.decode_frames(frames, self.log, times)
+        if batches and self.packets_handler:
+            self.packets_handler(batches)
+
+    def on_closed(self):
+        # the producer is gone, no more data will be received
+        self.log.error("Connection closed by the other end")
+        self.on_error()
+
+    def on_error(self):
+        self.close()
+        if self.error_handler:
+            self.error_handler()
+
+
+class TCPChannel(Channel):
+    """Channel of a TCP connection, opened again when it is lost."""
+
+    def __init__(self, reactor, instrument):
+        Channel.__init__(self, reactor, instrument)
+
+        # timer of the next reconnection attempt
+        self.reconnect_timer = None
+
+    def open(self):
+        self.reconnect_timer = None
+        if not self.transport.open():
+            self.connection_lost()
+        else:
+            self.reactor.add_writer(self.fileno(), self.on_connected)
+
+    def on_connected(self):
+        self.reactor.remove_writer(self.fileno())
+        if not self.transport.finish_connect():
+            self.connection_lost()
+        else:
+            self.reactor.add_reader(self.fileno(), self.on_readable)
+            self.on_writable()
+
+    def on_closed(self):
+        self.log.info("Connection closed by the other end")
+        if self.transport.reconnector.max_attempts:
+            self.connection_lost()
+        else:
+            self.close()
+
+    def on_error(self):
+        self.connection_lost()
+
+    def connection_lost(self):
+        """Close the socket and open it again after the reconnection delay.
+
+        When no more attempts have to be made, the channel is closed and the
+        error is reported.
+        """
+        self.stop_watching()
+        delay = self.transport.lost()
+        # frames queued for the lost connection are stale
+        self.tx_queue.clear()
+        if delay is None:
+            Channel.on_error(self)
+            return
+
+        # the partial packet received before the connection was lost is not valid
+        self.framer.reset()
+        self.reconnect_timer = self.reactor.call_later(delay, self.open)
+
+    def close(self):
+        if self.reconnect_timer:
+            self.reconnect_timer.cancel()
+            self.reconnect_timer = None
+        Channel.close(self)
+
+    def flush(self):
+        if self.transport.connected:
+            Channel.flush(self)
+
+
+class FileChannel(Channel):
+
+    # packets handed out together in fast replay mode
+    REPLAY_BATCH_SIZE = 4096
+
+    def __init__(self, reactor, instrument):
+        Channel.__init__(self, reactor, instrument)
+
+        # files are always readable, so they are not polled: a block is read
+        # on each reactor iteration until the end of the file
+        self.end_of_file = False
+
+        # fast replay of the input file and its batches of packets
+        self.replay = None
+        self.replay_batches = None
+
+        # paced replay of the input file, its chunks and start time
+        self.replay_chunks = None
+        self.replay_start = 0
+
+    def open(self):
+        if not self.transport.open():
+            self.on_error()
+            return
+        io_conn = self.transport.io_conn
+        conn = self.instrument.connection
+        replay_mode = instrument.FileConnectionCfg.ReplayMode
+        if conn.replay == replay_mode.fast:
+            self.replay = FastReplay(io_conn, self.framer)
+            if self.framer.record_size:
+                self.replay_batches = self.replay.record_blocks(self.REPLAY_BATCH_SIZE)
+            else:
+                self.replay_batches = self.replay.batches(self.REPLAY_BATCH_SIZE)
+            self.reactor.call_soon(self.replay_next)
+        elif conn.replay == replay_mode.paced:
+            self.replay = PacedReplay(io_conn, conn.replay_baudrate, conn.replay_speed)
+            self.replay_chunks = self.replay.chunks()
+            self.replay_start = monotonic()
+            self.reactor.call_soon(self.replay_chunk)
+        else:
+            self.reactor.call_soon(self.on_readable)
+
+    def replay_next(self):
+        """Hand out the next batch of packets in fast replay mode."""
+        if not self.is_open():
+            return
+        try:
+            packets = next(self.replay_batches)
+        except StopIteration:
+            self.log.info(self.replay.summary())
+            self.end_of_file = True
+            return
+
+        # the packets are received as they are read from the file
+        now = time.time()
+        if self.framer.record_size:
+            self.dispatch_records(packets, now)
+        else:
+            self.dispatch_frames(packets, [now] * len(packets))
+        # let other channels run between batches
+        self.reactor.call_soon(self.replay_next)
+
+    def replay_chunk(self, data=None):
+        """Handle the data due and wait for the next chunk in paced replay mode."""
+        if not self.is_open():
+            return
+        if data:
+            self.receive_time = time.time()
+            if self.framer.record_size:
+                self.framer.append(data)
+                self.handle_records(self.framer.extract_records())
+            else:
+                self.handle_frames(self.framer.feed(data))
+        try:
+            due, data = next(self.replay_chunks)
+        except StopIteration:
+            txt = "Replayed {0} bytes in {1:.3f} s (speed x{2:g})"
+            self.log.info(txt.format(self.replay.bytes, monotonic() - self.replay_start,
+                                     self.replay.speed))
+            self.end_of_file = True
+            return
+        delay = self.replay_start + due - monotonic()
+        self.reactor.call_later(max(0, delay), self.replay_chunk, data)
+
+    def close(self):
+        if self.replay_batches:
+            self.replay_batches.close()
+            self.replay_batches = None
+        if self.replay_chunks:
+            self.replay_chunks.close()
+            self.replay_chunks = None
+        Channel.close(self)
+
+    def stop_watching(self):
+        # files are not polled by the reactor
+        pass
+
+    def on_readable(self):
+        if self.is_open() and not self.end_of_file:
+            Channel.on_readable(self)
+            if self.is_open() and not self.end_of_file:
+                self.reactor.call_soon(self.on_readable)
+
+    def on_closed(self):
+        # the file is kept open until the channel is closed, as FileConnection
+        self.log.info("End of input file")
+        self.end_of_file = True
+
+
+class LinkChannel(object):
+    """Channel of an instrument sharing a link with other instruments.
+
+    The link channel (see Channel.create_link) reads and frames the link
+    data, and hands the packets of this instrument to it, which parses them
+    with the instrument codec. Commands are sent through the link channel.
+    """
+
+    def __init__(self, link_channel, instr_cfg):
+        # channel of the shared link
+        self.link_channel = link_channel
+
+        # config of the instrument, with its address or packet ids in the link
+        self.instr_cfg = instr_cfg
+        self.instrument = instr_cfg.instrument
+
+        # packets decoder
+        self.codec = Codec(self.instrument)
+
+        # functions called with the packets decoded on each read (list of
+        # PacketBatch), and when an error occurs (link errors are handled by
+        # the link owner)
+        self.packets_handler = None
+        self.error_handler = None
+
+        # default logger
+        self.log = logging.getLogger('GDAIS.'+self.instrument.short_name+'.LinkChannel')
+
+    def open(self):
+        """Start receiving the packets of the instrument (in the reactor thread)."""
+        self.log.info("Using shared link '{0}'".format(self.instr_cfg.link))
+        self.link_channel.demux.add_route(self.instr_cfg, self)
+
+    def close(self):
+        """Stop receiving the packets of the instrument (in the reactor thread)."""
+        self.link_channel.demux.remove_route(self.instr_cfg, self)
+
+    def send(self, command):
+        """Send the given command to the instrument, through the link."""
+        link_channel = self.link_channel
+        if not link_channel.is_open():
+            self.log.error("Received new command while the link is not connected")
+            return
+        self.log.debug("Sending '{0}' command (0x{1:X})".format(command.name, command.id))
+        data = link_channel.demux.address_data(self.instr_cfg, self.codec.encode(command))
+        try:
+            link_channel.write(link_channel.framer.frame(data))
+        except (IOError, OSError, socket.error, serial.SerialException):
+            link_channel.log.exception("Error writing to the connection")
+            link_channel.on_error()
+
+    def dispatch_frames(self, frames, times):
+        """Decode the given packets of the instrument, received at the given
+        times, and hand them out."""
+        batches = self.codec.decode_frames(frames, self.log, times)
+        if batches and self.packets_handler:
+            self.packets_handler(batches)
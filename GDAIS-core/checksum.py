@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the packet checksum algorithms.
+
+Checksums are computed over the packet data, starting checksum_offset bytes
+after the packet start (a negative offset includes part of the start bytes)
+and ending just before the checksum field. All the algorithms use C loops
+(builtin sum, numpy reductions or the table-driven binascii and zlib CRCs),
+so no Python code is run per byte.
+"""
+import binascii
+import numpy
+import struct
+import zlib
+
+from instrument import PacketFormat
+
+
+class Checksum(object):
+
+    @staticmethod
+    def create(instrument, *args, **kwds):
+        """Return the checksum of the instrument packets, or None."""
+        checksum_type = PacketFormat.ChecksumType
+        checksum = {
+            checksum_type.sum8:  Sum8Checksum,
+            checksum_type.xor8:  Xor8Checksum,
+            checksum_type.crc16: CRC16Checksum,
+            checksum_type.crc32: CRC32Checksum
+        }.get(instrument.packet_format.checksum_type, None)
+
+        if not checksum:
+            if instrument.packet_format.checksum_type:
+                txt = 'Checksum type "{0}" not implemented'
+                raise Exception(txt.format(instrument.packet_format.checksum_type))
+            return None
+
+        return checksum(instrument, *args, **kwds)
+
+    def __init__(self, instrument):
+        format = instrument.packet_format
+
+        # first byte checked, relative to the packet data start
+        self.offset = format.checksum_offset
+
+        # checksum field encoder and decoder
+        self.struct = struct.Struct(instrument.byte_order_char +
+                                    PacketFormat.SIZE_CODES[format.checksum_size])
+
+    def compute(self, data, start, end):
+        """Compute the checksum of data[start:end]."""
+        raise NotImplementedError
+
+    def check(self, data, packet_start, position):
+        """Check the checksum field found at the given position."""
+        value = self.compute(data, packet_start + self.offset, position)
+        return value == self.struct.unpack_from(data, position)[0]
+
+    def fill(self, data, packet_start, position):
+        """Write the checksum field at the given position."""
+        value = self.compute(data, packet_start + self.offset, position)
+        self.struct.pack_into(data, position, value)
+
+
+class Sum8Checksum(Checksum):
+    """Additive 8 bit checksum (e.g.: Xsens), data and checksum add up to 0."""
+
+    def compute(self, data, start, end):
+        return -sum(data[start:end]) & 0xFF
+
+
+class Xor8Checksum(Checksum):
+    """XOR of all the data bytes."""
+
+    def compute(self, data, start, end):
+        if end <= start:
+            return 0
+        return int(numpy.bitwise_xor.reduce(
+                                numpy.frombuffer(data, numpy.uint8, end - start, start)))
+
+
+class CRC16Checksum(Checksum):
+    """CRC-16/CCITT (polynomial 0x1021, initial value 0xFFFF)."""
+
+    def compute(self, data, start, end):
+        return binascii.crc_hqx(buffer(data, start, end - start), 0xFFFF)
+
+
+class CRC32Checksum(Checksum):
+    """CRC-32 as used by zlib and Ethernet."""
+
+    def compute(self, data, start, end):
+        return zlib.crc32(buffer(data, start, end - start)) & 0xFFFFFFFF
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the packet decoder and encoder.
+
+The codec translates the packets found by the framer into ParsedPacket
+objects, or into PacketBatch structured arrays when they are decoded in
+batches, and the commands into packet data ready to be framed. It does not
+depend on Qt, so it can be used by the Parser thread and inline by the I/O
+reactor.
+"""
+import struct
+import time
+
+import numpy
+
+from instrument import PacketFormat
+
+
+def format_values(names, values):
+    """Return the text describing the given field values, for logging.
+
+    Arrays are described by their number of elements, not listed.
+    """
+    txt = []
+    for name, value in zip(names, values):
+        if isinstance(value, numpy.ndarray):
+            txt.append("{0}: [{1} values]".format(name, len(value)))
+        else:
+            txt.append("{0}: {1:g}".format(name, value))
+    return ', '.join(txt)
+
+
+class ParsedPacket(object):
+    """Received packet parsed by the codec.
+
+    It is a compact record, without instance dictionary: the packet
+    description, the field values (tuple, with a NumPy array for each array
+    field) and the time when the packet was received, or the text describing
+    the problem found if it could not be.
+    """
+
+    __slots__ = ('instrument_packet', 'data', 'timestamp', 'info')
+
+    def __init__(self, packet=None, parsed_data=None, timestamp=0.0, info=''):
+        self.instrument_packet = packet
+        self.data = parsed_data
+        self.timestamp = timestamp
+        self.info = info
+
+    @property
+    def packet_id(self):
+        """Packet number of the packet (None if unknown)."""
+        if self.instrument_packet is None:
+            return None
+        return self.instrument_packet.id
+
+
+class PacketBatch(object):
+    """Packets of the same type decoded together.
+
+    The fields of the packets are the rows of a NumPy structured array, with
+    the dtype of the packet (see Packet.structured_dtype), in the instrument
+    byte order. The time when each packet was received is in the float64
+    array of timestamps.
+    """
+
+    def __init__(self, packet, data, frames, timestamps):
+        # packet description, structured array and packets it was decoded
+        # from (None if the packets are just their fields, see decode_records)
+        self.instrument_packet = packet
+        self.data = data
+        self.frames = frames
+
+        # time when each packet was received
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.data)
+
+    def packet(self, index):
+        """Return the ParsedPacket of the packet at the given index."""
+        return ParsedPacket(self.instrument_packet, self.data[index].tolist(),
+                            float(self.timestamps[index]))
+
+    def packets(self):
+        """Generate a ParsedPacket for each packet of the batch."""
+        for values, timestamp in zip(self.data.tolist(), self.timestamps.tolist()):
+            yield ParsedPacket(self.instrument_packet, values, timestamp)
+
+
+class Codec(object):
+
+    def __init__(self, instrument):
+        self.packet_format = instrument.packet_format
+
+        # position of the packet number and size of the format fields before
+        # and after the packet fields in the received packets
+        rx_format = self.packet_format.rx_format
+        self.has_packet_num = PacketFormat.FormatField.packet_num in rx_format
+        if self.has_packet_num:
+            self.packet_num_offset = self.packet_format.field_offset(rx_format,
+                                                PacketFormat.FormatField.packet_num)
+        self.header_size = self.packet_format.header_size(rx_format)
+        self.trailer_size = self.packet_format.trailer_size(rx_format)
+
+        self.rx_packets = instrument.rx_packets
+        for packet_num, packet in self.rx_packets.iteritems():
+            packet.id = packet_num
+            packet.struct = struct.Struct(instrument.byte_order_char + packet.struct_format())
+            packet.dtype = packet.structured_dtype(instrument.byte_order_char)
+            # packets with arrays are decoded with their dtype, and field by
+            # field when the arrays have a variable length (see unpack_fields)
+            packet.has_array_fields = packet.has_arrays()
+            packet.layout = None
+            if packet.is_variable():
+                packet.layout = packet.field_layout(instrument.byte_order_char)
+
+        self.length_struct = struct.Struct(instrument.byte_order_char +
+                            PacketFormat.SIZE_CODES[self.packet_format.length_size])
+
+        self.tx_packets = instrument.tx_packets
+        for packet in self.tx_packets.itervalues():
+            packet.struct = struct.Struct(instrument.byte_order_char + packet.struct_format())
+
+    def encode(self, command):
+        """Return the data of the packet sending the given command.
+
+        The data includes the format fields between the start and end bytes,
+        with room for the checksum (filled by the framer).
+        """
+        packet = self.tx_packets[command.id]
+        # TODO: should know values type and convert them correctly
+        values = map(int, command.values)
+        fields_data = packet.struct.pack(*values)
+
+        data = bytearray()
+        for field in self.packet_format.tx_format:
+            if field == PacketFormat.FormatField.packet_num:
+                data.append(command.id)
+            elif field == PacketFormat.FormatField.length:
+                data.extend(self.length_struct.pack(len(fields_data)))
+            elif field == PacketFormat.FormatField.packet_fields:
+                data.extend(fields_data)
+            elif field == PacketFormat.FormatField.checksum:
+                # filled by the framer
+                data.extend(bytearray(self.packet_format.checksum_size))
+        return data
+
+    def identify(self, raw_data):
+        """Find the packet description of a received packet.
+
+        Returns the packet description (None if unknown), the size of the
+        packet fields data and the text describing the problem found, empty
+        if the packet can be parsed.
+        """
+        if not raw_data:
+            return None, 0, "Empty packet received"
+
+        if self.has_packet_num:
+            packet_num = -1
+            if len(raw_data) > self.packet_num_offset:
+                packet_num = raw_data[self.packet_num_offset]
+            if packet_num not in self.rx_packets:
+                txt = "Unknown packet id: 0x{0:X} (Raw Data: {1})"
+                txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in raw_data])
+                return None, 0, txt.format(packet_num, txt_raw)
+            packet = self.rx_packets[packet_num]
+        else:
+            # without packet number only one packet can be defined
+            packet = self.rx_packets.values()[0]
+
+        size = max(0, len(raw_data) - self.header_size - self.trailer_size)
+        if packet.layout:
+            # its exact length is only known when its fields are decoded
+            if size > packet.struct.size:
+                txt = "Wrong packet length: {0}, maximum: {1} (Raw Data: {2})"
+                txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in raw_data])
+                return packet, size, txt.format(size, packet.struct.size, txt_raw)
+        elif size != packet.struct.size:
+            txt = "Wrong packet length: {0}, expected: {1} (Raw Data: {2})"
+            txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in raw_data])
+            return packet, size, txt.format(size, packet.struct.size, txt_raw)
+        return packet, size, ''
+
+    def parse(self, raw_data, timestamp=None):
+        """Parse a received packet.
+
+        timestamp is the time when the packet was received (the parsing time
+        if not given). Returns a ParsedPacket, whose info describes the
+        problem found when the packet could not be parsed.
+        """
+        packet, size, info = self.identify(raw_data)
+        if info:
+            return ParsedPacket(packet, info=info)
+        if timestamp is None:
+            timestamp = time.time()
+        if packet.layout:
+            rows = numpy.zeros(1, packet.dtype)
+            info = self.unpack_fields(packet, raw_data, size, rows, 0)
+            if info:
+                return ParsedPacket(packet, info=info)
+            return ParsedPacket(packet, rows.tolist()[0], timestamp)
+        if packet.has_array_fields:
+            rows = numpy.frombuffer(raw_data, packet.dtype, 1, self.header_size)
+            return ParsedPacket(packet, rows.tolist()[0], timestamp)
+        data = raw_data[self.header_size:self.header_size + size]
+        return ParsedPacket(packet, packet.struct.unpack(str(data)), timestamp)
+
+    def unpack_fields(self, packet, raw_data, size, rows, index):
+        """Decode the fields of a packet with variable length arrays.
+
+        The fields data (size bytes after the header in raw_data) is decoded
+        field by field into rows[index], as the position of the fields after
+        an array depends on its length. The elements after the end of the
+        arrays are left as they are. Returns the text describing the problem
+        found, empty if the packet has been decoded.
+        """
+        offset = self.header_size
+        end = offset + size
+        for name, field_type, count, count_name in packet.layout:
+            length = 1 if count is None else count
+            if count_name:
+                length = int(rows[count_name][index])
+                if not 0 <= length <= count:
+                    txt = "Wrong '{0}' array length: {1}, maximum: {2}"
+                    return txt.format(name, length, count)
+            field_end = offset + length * field_type.itemsize
+            if field_end > end:
+                break
+            if name:
+                values = numpy.frombuffer(raw_data, field_type, length, offset)
+                if count is None:
+                    rows[name][index] = values[0]
+                else:
+                    rows[name][index, :length] = values
+            offset = field_end
+        if offset != end:
+            txt = "Wrong packet length: {0}, fields length: {1} (Raw Data: {2})"
+            txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in raw_data])
+            return txt.format(size, offset - self.header_size, txt_raw)
+        return ''
+
+    def decode_variable(self, packet, frames, log=None):
+        """Decode packets with variable length arrays (see unpack_fields).
+
+        Returns the structured array with the packets decoded, whose arrays
+        have their maximum length, and the list of the indexes of those
+        packets in frames. The problems found in the packets not decoded are
+        logged to the given logger.
+        """
+        rows = numpy.zeros(len(frames), packet.dtype)
+        decoded = []
+        for frame_index, raw_data in enumerate(frames):
+            index = len(decoded)
+            size = len(raw_data) - self.header_size - self.trailer_size
+            info = self.unpack_fields(packet, raw_data, size, rows, index)
+            if info:
+                if log:
+                    log.info(info)
+                # clear the fields decoded, the row is used by the next packet
+                rows[index:index + 1] = numpy.zeros(1, packet.dtype)
+            else:
+                decoded.append(frame_index)
+        return rows[:len(decoded)], decoded
+
+    def decode_frames(self, frames, log=None, times=None):
+        """Decode a list of received packets in batches.
+
+        The packets are grouped by packet id, and the fields data of each
+        group is decoded at once into a structured array. times is the list
+        of the receive times of the packets (the decoding time if not
+        given). Returns the list of PacketBatch, in the order their first
+        packet was received. The problems found in the packets not decoded
+        are logged to the given logger.
+        """
+        if times is None:
+            times = [time.time()] * len(frames)
+        groups = {}
+        order = []
+        header_size = self.header_size
+        for raw_data, receive_time in zip(frames, times):
+            packet, size, info = self.identify(raw_data)
+            if info:
+                if log:
+                    log.info(info)
+                continue
+            group = groups.get(packet)
+            if group is None:
+                group = groups[packet] = ([], bytearray(), [])
+                order.append(packet)
+            group[0].append(raw_data)
+            group[2].append(receive_time)
+            if not packet.layout:
+                group[1].extend(memoryview(raw_data)[header_size:header_size + size])
+
+        batches = []
+        for packet in order:
+            group_frames, fields_data, group_times = groups[packet]
+            if packet.layout:
+                data, decoded = self.decode_variable(packet, group_frames, log)
+                if not decoded:
+                    continue
+                group_frames = [group_frames[index] for index in decoded]
+                group_times = [group_times[index] for index in decoded]
+            elif packet.dtype.itemsize:
+                data = numpy.frombuffer(fields_data, packet.dtype)
+            else:
+                # packets without fields (e.g.: acknowledgements)
+                data = numpy.zeros(len(group_frames), packet.dtype)
+            timestamps = numpy.array(group_times, numpy.float64)
+            batches.append(PacketBatch(packet, data, group_frames, timestamps))
+        return batches
+
+    def decode_records(self, records, timestamp=None):
+        """Decode a block of received packets that are just their fields.
+
+        The block holds complete packets of the only packet defined, one
+        after the other (see Framer.extract_records), and it is decoded at
+        once into a structured array. timestamp is the time when the block
+        was received (the decoding time if not given). Returns the
+        PacketBatch, or None if the block is empty.
+        """
+        if not records:
+            return None
+        packet = self.rx_packets.values()[0]
+        data = numpy.frombuffer(records, packet.dtype)
+        if timestamp is None:
+            timestamp = time.time()
+        timestamps = numpy.empty(len(data), numpy.float64)
+        timestamps.fill(timestamp)
+        return PacketBatch(packet, data, None, timestamps)
@@ -1,19 +1,42 @@
-from PyQt4.QtCore import pyqtSignal, QEventLoop, QSocketNotifier, QThread, QTimer
-from PyQt4.QtNetwork import QTcpSocket
+from PyQt4.QtCore import pyqtSignal, QObject, QSocketNotifier, QThread, QTimer
 
 import logging
 import serial
+import socket
+import threading
+import time
 
+from capture import start_capture
+from channel import Channel, LinkChannel
+from codec import Codec, ParsedPacket
+from demux import Demultiplexer, link_instrument
+from framer import Framer
 import instrument
-from instrument import PacketFormat
+from reactor import Reactor
+from transport import Transport
+from txqueue import TxQueue
+from replay import FastReplay, PacedReplay
 
 
 class Connection(QThread):
     
-    DEFAULT_BUFFER_SIZE = 8
+    # Signal for new data packet received event, with its receive time
+    new_data_received = pyqtSignal(bytearray, float)
     
-    # Signal for new data packet received event
-    new_data_received = pyqtSignal(bytearray)
+    # Signal for new batch of data packets received event (list of bytearray
+    # and list of their receive times)
+    new_frames_received = pyqtSignal(list, list)
+    
+    # Signal for new block of data packets received event, when the packets
+    # are just their fields (bytearray, see Framer.extract_records), with
+    # its receive time
+    new_records_received = pyqtSignal(bytearray, float)
+    
+    # Signals for new packet parsed and new batch of packets parsed (list of
+    # PacketBatch) events, emitted instead of the received ones when parsing
+    # is fused into the connection thread
+    new_packet_parsed = pyqtSignal(ParsedPacket)
+    new_packets_parsed = pyqtSignal(list)
     
     # Signal for new data packet received event
     error_occurred = pyqtSignal()
@@ -23,39 +46,54 @@ class Connection(QThread):
         conn_type = instrument.ConnectionCfg.Type
         connection = {
             conn_type.file:     FileConnection,
-            conn_type.serial: SerialConnection,
             conn_type.tcp:     TCPConnection
-        }.get(conn.type, None)
-        
-        if not connection:
-            raise Exception('Connection type not implemented')
+        }.get(conn.type, Connection)
         
         return connection(*args, **kwds)
     
     def __init__(self):
         QThread.__init__(self)
         
-        # I/O connection
-        self.io_conn = None
+        # I/O transport of the connection type, created when the instrument
+        # is known
+        self.transport = None
+        
+        # New data available notifier, and connection accepting data
+        # notifier while there are frames to write
+        self.notifier = None
+        self.write_notifier = None
+        
+        # packet framing engine, created when the instrument is known
+        self.framer = None
+        
+        # packets decoder, only when they are parsed in this thread instead
+        # of in the Parser thread (fused_parsing option)
+        self.codec = None
         
-        # bytearray() to store received packet bytes
-        self.packet = bytearray()
+        # writer of the raw data received to a capture file (if enabled)
+        self.capture = None
         
-        # bytearray() to store remaining data after receiving a complete packet
-        self.old_data = None
+        # frames waiting to be written to the instrument
+        self.tx_queue = TxQueue()
         
-        # last position in self.packet checked for packet end
-        # -1 means that packet start has not been found yet
-        self.last_index = -1
+        # router of the packets to the instruments sharing this connection,
+        # if it is a shared link (see SharedLink)
+        self.demux = None
         
         # flag for exiting the read_data iteration
         self.exiting = False
         
-        # flag for when a new packet is found in the input buffer
-        self.packet_found = False
+        # whether the packets limit was reached with data left in the framer
+        self.packets_pending = False
+        
+        # time when the data being framed was received
+        self.receive_time = 0.0
         
-        # whether to stop reading input data when a packet has been found (default: True)
-        self.break_on_packet_found = True
+        # packets waiting to be emitted together, their receive times and
+        # timer to limit their wait
+        self.batch = []
+        self.batch_times = []
+        self.batch_timer = None
         
         # default logger
         self.log = logging.getLogger('GDAIS.Connection')
@@ -64,426 +102,617 @@ class Connection(QThread):
         # instrument description
         self.instrument = instrument
         
-        self.log.info("Connected: {0}".format(self.io_conn))
+        self.log = logging.getLogger('GDAIS.'+instrument.short_name+'.Connection')
+        self.transport = Transport.create(instrument, self.log)
+        if not self.open():
+            self.error_occurred.emit()
+            return
         
-        # input read buffer size
-        self.buffer_size = self.DEFAULT_BUFFER_SIZE
+        # bytes read at once (0 reads all the available data) and maximum
+        # packets handled on each data arrival (0 for no limit)
+        self.read_size = instrument.connection.read_size
+        self.max_frames = instrument.connection.max_frames
         
-        # auxiliary variables used in data reception
-        format = instrument.packet_format
-        if (not PacketFormat.FormatField.end_bytes in format.rx_format and
-            not PacketFormat.FormatField.start_bytes in format.rx_format and
-            not PacketFormat.FormatField.packet_num in format.rx_format):
-                # suppose all packets of the same length
-                packet = instrument.rx_packets.values()[0]
-                self.buffer_size = packet.struct.size # struct added by parser
-            
-        else:
-            if PacketFormat.FormatField.start_bytes in format.rx_format:
-                self.start_bytes = bytearray(format.start_bytes)
-                self.start_bytes_len = len(self.start_bytes)
-
-            if PacketFormat.FormatField.end_bytes in format.rx_format:
-                self.end_bytes = bytearray(format.end_bytes)
-                self.end_bytes_len = len(self.end_bytes)
-        
-        # auxiliary functions used in data reception
-        if PacketFormat.FormatField.start_bytes in format.rx_format:
-            self._find_packet_start = self._find_packet_start_mark
-        
-        if PacketFormat.FormatField.end_bytes in format.rx_format:
-            self._find_packet_end = self._find_packet_end_mark
-        elif PacketFormat.FormatField.start_bytes in format.rx_format:
-            if (PacketFormat.FormatField.packet_num in format.rx_format or
-                len(self.instrument.rx_packets) == 1):
-                self._find_packet_end = self._find_packet_end_next_start_or_len
-            else:
-                self._find_packet_end = self._find_packet_end_next_start
-        elif PacketFormat.FormatField.packet_num in format.rx_format:
-            self._find_packet_end = self._find_packet_end_len
+        # maximum packets emitted together (0 emits each packet on its own)
+        # and maximum time (ms) a packet waits for the batch to be completed
+        self.batch_size = instrument.connection.batch_size
+        self.batch_latency = instrument.connection.batch_latency
+        
+        # packet framing engine, with the compiled packet format
+        self.framer = Framer(instrument)
+        
+        # the packets of a shared link are parsed by each instrument parser
+        if instrument.connection.fused_parsing and not self.demux:
+            self.log.info("Parsing packets in the connection thread")
+            self.codec = Codec(instrument)
+        
+        self.capture = start_capture(instrument, self.framer, self.log)
         
         self.start()
     
+    def open(self):
+        """Open the transport, before starting the thread.
+        
+        Returns whether it has been opened.
+        """
+        return self.transport.open()
+    
     def run(self):
+        self.watch()
         self.exec_()
         self.log.debug("Ending connection thread")
     
+    def watch(self):
+        """Read the data when it arrives (in the connection thread)."""
+        self.notifier = QSocketNotifier(self.transport.fileno(), QSocketNotifier.Read)
+        self.notifier.activated.connect(self.read_data)
+    
+    def stop_watching(self):
+        """Stop waiting for the connection to be readable or writable."""
+        if self.notifier:
+            self.notifier.setEnabled(False)
+            self.notifier = None
+        if self.write_notifier:
+            self.write_notifier.setEnabled(False)
+            self.write_notifier = None
+    
     def quit(self):
         self.exiting = True
+        self.close()
         QThread.quit(self)
     
+    def close(self):
+        """Stop reading, close the transport and emit the packets left."""
+        self.stop_watching()
+        if self.transport:
+            self.transport.close()
+        if self.framer and self.framer.checksum:
+            txt = "Packets with right checksum: {0}, with wrong checksum: {1}"
+            self.log.info(txt.format(self.framer.accepted, self.framer.rejected))
+        if self.framer and self.framer.resyncs:
+            txt = "Packets discarded to resynchronize: {0}, bytes discarded: {1}"
+            self.log.info(txt.format(self.framer.resyncs, self.framer.discarded_bytes))
+        if self.batch:
+            self.emit_frames(self.batch, self.batch_times)
+            self.batch = []
+            self.batch_times = []
+        if self.demux:
+            self.log.info(self.demux.summary())
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+        if self.tx_queue.sent or self.tx_queue.dropped:
+            self.log.info(self.tx_queue.summary())
+    
     def send_data(self, data):
-        format = self.instrument.packet_format
-        raw_data = bytearray()
-        
-        if PacketFormat.FormatField.start_bytes in format.tx_format:
-            raw_data += bytearray(format.start_bytes)
+        raw_data = self.framer.frame(data)
         
-        raw_data += data
+        if self.log.isEnabledFor(logging.DEBUG):
+            txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in raw_data])
+            self.log.debug("Sending Raw Data: {0}".format(txt_raw))
         
-        if PacketFormat.FormatField.end_bytes in format.tx_format:
-            raw_data += bytearray(format.end_bytes)
-        
-        txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in raw_data])
-        self.log.debug("Sending Raw Data: {0}".format(txt_raw))
-        
-        # FIXME: Catch OSError exception (when disconnected)
-        self.io_conn.write(str(raw_data))
+        if self.transport.receiver:
+            self.transport.send_datagram(raw_data)
+            return
+        self.tx_queue.put(raw_data)
+        self.flush_tx()
+    
+    def flush_tx(self):
+        """Write the queued frames, as many as the connection accepts now."""
+        try:
+            while True:
+                data = self.tx_queue.data()
+                if not data:
+                    return
+                written = self.transport.write_some(data)
+                if not written:
+                    self.wait_writable()
+                    return
+                self.tx_queue.consume(written)
+        except (IOError, OSError, socket.error, serial.SerialException):
+            self.log.exception("Error writing to the connection")
+            self.error_occurred.emit()
+    
+    def wait_writable(self):
+        """Call flush_tx when the connection accepts more data."""
+        if not self.write_notifier:
+            self.write_notifier = QSocketNotifier(self.transport.fileno(), QSocketNotifier.Write)
+            self.write_notifier.activated.connect(self.on_writable)
+        self.write_notifier.setEnabled(True)
+    
+    def on_writable(self):
+        self.write_notifier.setEnabled(False)
+        self.flush_tx()
     
     def read_data(self):
+        if self.transport.receiver:
+            self.receive_datagrams()
+            return
+        
+        packets_read = 0
         while not self.exiting:
-            # FIXME: Catch OSError exception (when disconnected)
-            data = self.io_conn.read(self.buffer_size)
-            if not data:
+            try:
+                received = self._read()
+            except (IOError, OSError, socket.error, serial.SerialException):
+                self.log.exception("Error reading from the connection")
+                self.on_error()
+                break
+            if not received and not self.packets_pending:
+                if received == 0 and self.transport.EMPTY_READ_CLOSES:
+                    self.on_closed()
                 break
             
-            # DEBUG #
-            #if self.old_data:
-            #    debug_data = self.old_data + bytearray(data)
-            #else:
-            #    debug_data = bytearray(data)
-            #txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in debug_data])
-            #self.log.debug("0. input data: {0}".format(txt_raw))
-            # END DEBUG #
-            
-            #TODO: used when reading from file
-            #self.usleep(100)
+            max_packets = 0
+            if self.max_frames:
+                max_packets = self.max_frames - packets_read
             
-            if self.last_index == -1:
-                # no packet start has been found yet
-                if self.old_data:
-                    # use the remaining data from previous packet
-                    data = self.old_data + data
-                    self.old_data = None
-                self._find_packet_start(data)
+            if self.framer.record_size:
+                # all the records read are emitted together, in one block
+                records = self.framer.extract_records(max_packets)
+                if len(records):
+                    self.emit_records(bytearray(records), self.receive_time)
+                found = len(records) // self.framer.record_size
             else:
-                # already started a packet, append new data
-                self.packet += data
-            
-            # DEBUG #
-            #txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in self.packet])
-            #self.log.debug("1. packet after start: {0}".format(txt_raw))
-            # END DEBUG #
-            
-            # DEBUG #
-            #self.log.debug("last_index: {0}, self.packet: {1}".format(self.last_index, self.packet != bytearray()))
-            # END DEBUG #
+                packets = self.framer.extract(max_packets)
+                for packet_data in packets:
+                    # packets are views of the receive buffer, the emitted copy
+                    # is owned by the receiving thread
+                    self._new_packet_found(bytearray(packet_data))
+                found = len(packets)
+            packets_read += found
             
-            if self.last_index >= 0 and self.packet:
-                # packet start and some data already found, try to find its end
-                self._find_packet_end()
-            
-            # DEBUG #
-            #txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in self.packet])
-            #self.log.debug("2. packet after end: {0}".format(txt_raw))
-            # END DEBUG #
-            
-            if self.packet_found:
-                # DEBUG #
-                #txt_raw =  ' '.join(['0x{0:X}'.format(d) for d in self.old_data])
-                #self.log.debug("3. old data: {0}".format(txt_raw))
-                # END DEBUG #
-                
-                self.packet_found = False
-                if self.break_on_packet_found:
-                    break
-            
-            # DEBUG #
-            #self.log.debug("3. bytes in serial input buffer: {0}".format(self.io_conn.inWaiting()))
-            #self.log.debug("4. bytes in socket input buffer: {0}".format(self.io_conn.bytesAvailable()))
-            # END DEBUG #
-    
-    def _find_packet_start(self, data):
-        """Find a new packet start in the given data array.
-        
-        This is the default function for a new packet start. As it has no info
-        about packet format it just uses the given data as the beggining
-        of a new packet.
-        
-        See also: _find_packet_start_mark
-        """
-        self.packet += data
-        self.last_index = 0 # move index to the beginning of the packet
-    
-    def _find_packet_start_mark(self, data):
-        """Find a new packet start in the given data array, using a start mark.
-        
-        Search for packet start bytes marker in input data and, if found,
-        save it as the beginning of a new packet.
-        
-        See also: _find_packet_start
-        """
-        for i in range(len(data) - self.start_bytes_len + 1):
-            if data[i:i + self.start_bytes_len] == self.start_bytes:
-                # packet start bytes found, append new data without start bytes
-                self.packet += data[i + self.start_bytes_len:]
-                self.last_index = 0 # move index to the beginning of the packet
+            self.packets_pending = max_packets and found == max_packets
+            if self.packets_pending:
+                # let other events run, remaining data is handled afterwards
+                self.read_later()
                 break
         
-        if self.last_index == -1:
-            # start was not found, save data as it may contain part of the start sequence
-            self.old_data = data
+        self.schedule_batch()
     
-    def _find_packet_end(self):
-        """Find current packet end.
-        
-        This is the default function for packet end search. As it has no info
-        about packet format it just tries to get a fixed length of data bytes,
-        saves not used data and prepares for the next packet.
-        
-        See also: _find_packet_end_mark, _find_packet_end_len,
-                        _find_packet_end_next_start
-        """
-        if len(self.packet) >= self.buffer_size:
-            self._new_packet_found(
-               packet_data=self.packet[:self.buffer_size],
-               excess_data=self.packet[self.buffer_size:]
-            )
+    def read_later(self):
+        """Call read_data again, after the events waiting."""
+        QTimer.singleShot(0, self.read_data)
     
-    def _find_packet_end_mark(self):
-        """Find current packet end, using end bytes mark.
-        
-        Search for packet end bytes mark in the current packet input data. If
-        found, emit the new packet without end bytes, save exceding data and
-        prepare for the next packet.
+    def receive_datagrams(self):
+        # each datagram holds a whole frame, no stream framing is needed
+        try:
+            packets = self.transport.receive(self.framer, self.max_frames)
+        except socket.error:
+            self.log.exception("Error receiving datagrams")
+            self.error_occurred.emit()
+            return
+        self.receive_time = time.time()
+        # remaining datagrams (over max_frames) activate the notifier again
+        for packet_data in packets:
+            self._new_packet_found(packet_data)
         
-        See also: _find_packet_end
-        """
-        i = 0
-        for i in range(self.last_index, len(self.packet) - self.end_bytes_len + 1):
-            if self.packet[i:i + self.end_bytes_len] == self.end_bytes:
-                self._new_packet_found(
-                    packet_data=self.packet[:i],
-                    excess_data=self.packet[i + self.end_bytes_len:]
-                )
-                break
-        if self.last_index >= 0: # check packet end not found
-            self.last_index = i
+        self.schedule_batch()
     
-    def _find_packet_end_next_start(self):
-        """Find current packet end, using next packet start bytes mark.
-        
-        Search for next packet start bytes mark in the current packet input
-        data. If found, emit the new packet, save exceding data and prepare for
-        the next packet.
-        
-        Note that this method will lock the system when the instrument sends
-        a single packet and waits for the next command, as then there will not
-        be any packet after the current one to be detected. In this case, it
-        would be better to use _find_packet_end_next_start_or_len method.
-        
-        See also: _find_packet_end, _find_packet_end_next_start_or_len
-        """
-        i = 0
-        for i in range(self.last_index, len(self.packet) - self.start_bytes_len + 1):
-            if self.packet[i:i + self.start_bytes_len] == self.start_bytes:
-                self._new_packet_found(
-                    packet_data=self.packet[:i],
-                    excess_data=self.packet[i:]
-                )
-                break
-        if self.last_index >= 0: # check packet end not found
-            self.last_index = i
+    def on_closed(self):
+        # the producer is gone, no more data will be received
+        self.log.error("Connection closed by the other end")
+        self.on_error()
     
-    def _find_packet_end_len(self):
-        """Find current packet end, using its length.
-        
-        Get expected packet length from the instrument information, using the
-        current packet first byte as the packet number. If the current packet
-        data length is enough, emit the new packet, save exceding data and
-        prepare for the next packet.
-        
-        If the packet number is not in the instrument's packet list, but there
-        is only one packet defined, use its lenght. In other cases, emit the
-        current data as a new package and wait for the next one.
-        
-        Note that this method may lock the system when it is waiting for a
-        reply but some bytes are lost and the instrument does not send more
-        data. If packet format includes start bytes, it would be better to use
-        _find_packet_end_next_start_or_len method.
+    def on_error(self):
+        """Stop reading a failed connection and report the error."""
+        self.stop_watching()
+        self.error_occurred.emit()
+    
+    def schedule_batch(self):
+        """Emit the current batch now, or when its latency expires."""
+        if self.batch:
+            if not self.batch_latency:
+                self.flush_batch()
+            else:
+                if not self.batch_timer:
+                    self.batch_timer = QTimer()
+                    self.batch_timer.setSingleShot(True)
+                    self.batch_timer.timeout.connect(self.flush_batch)
+                if not self.batch_timer.isActive():
+                    self.batch_timer.start(self.batch_latency)
+    
+    def flush_batch(self):
+        """Emit the packets waiting in the current batch."""
+        if self.batch_timer and self.batch_timer.isActive():
+            self.batch_timer.stop()
+        if self.batch:
+            self.emit_frames(self.batch, self.batch_times)
+            self.batch = []
+            self.batch_times = []
+    
+    def emit_frames(self, frames, times):
+        """Emit a batch of packets, received at the given times.
         
-        See also: _find_packet_end, _find_packet_end_next_start_or_len
+        On a shared link, each instrument gets the packets belonging to it.
         """
-        if self.packet[0] in self.instrument.rx_packets:
-            packet_len = self.instrument.rx_packets[self.packet[0]].struct.size
-            packet_len += 1 # packet number
-            if len(self.packet) >= packet_len:
-                self._new_packet_found(
-                   packet_data=self.packet[:packet_len],
-                   excess_data=self.packet[packet_len:]
-                )
-        elif len(self.instrument.rx_packets) == 1:
-            # In case of having only a packet defined, we can know directly
-            # its length, even if there is no packet number to identify it
-            packet_len = self.instrument.rx_packets.values()[0].struct.size
-            if PacketFormat.FormatField.packet_num in format.rx_format:
-                packet_len += 1 # packet number
-            if len(self.packet) >= packet_len:
-                self._new_packet_found(
-                   packet_data=self.packet[:packet_len],
-                   excess_data=self.packet[packet_len:]
-                )
+        if self.demux:
+            for endpoint, endpoint_frames, endpoint_times in self.demux.split(frames, times):
+                endpoint.new_frames_received.emit(endpoint_frames, endpoint_times)
+        elif self.codec:
+            batches = self.codec.decode_frames(frames, self.log, times)
+            if batches:
+                self.new_packets_parsed.emit(batches)
         else:
-            # Packet number not in list of known packets, emit the unidentified
-            # packet and hope that the next packet will be recognized
-            self._new_packet_found(
-               packet_data=self.packet,
-               excess_data=None
-            )
-    
-    def _find_packet_end_next_start_or_len(self):
-        """Find current packet end, using start bytes mark or the length.
-        
-        Check if there is a new packet in the current input data bytes, first
-        searching for next packet start bytes and, if it is not found, using
-        the packet length if the packet number is known.
-        
-        See also: _find_packet_end, _find_packet_end_next_start,
-                        _find_packet_end_len
-        """
-        self._find_packet_end_next_start()
-        if not self.packet_found:
-            self._find_packet_end_len()
+            self.new_frames_received.emit(frames, times)
+    
+    def emit_records(self, records, timestamp):
+        """Emit a block of records (see Framer.extract_records), received at
+        the given time."""
+        if self.codec:
+            batch = self.codec.decode_records(records, timestamp)
+            if batch:
+                self.new_packets_parsed.emit([batch])
+        else:
+            self.new_records_received.emit(records, timestamp)
+    
+    def _read(self):
+        size = self.read_size or self.transport.bytes_available()
+        if size > 0:
+            received = self.framer.fill(self.transport.read_into, size)
+            if received:
+                self.receive_time = time.time()
+            return received
+        return 0
+    
+    def _new_packet_found(self, packet_data):
+        if not self.batch_size:
+            if self.demux:
+                endpoint, packet_data = self.demux.route(packet_data)
+                if endpoint:
+                    endpoint.new_data_received.emit(packet_data, self.receive_time)
+            elif self.codec:
+                parsed_packet = self.codec.parse(packet_data, self.receive_time)
+                if parsed_packet.info:
+                    self.log.info(parsed_packet.info)
+                else:
+                    self.new_packet_parsed.emit(parsed_packet)
+            else:
+                self.new_data_received.emit(packet_data, self.receive_time)
+        else:
+            self.batch.append(packet_data)
+            self.batch_times.append(self.receive_time)
+            if len(self.batch) >= self.batch_size:
+                self.flush_batch()
+
+
+class TCPConnection(Connection):
+    """Connection of a TCP client, opened again when it is lost."""
+    
+    def open(self):
+        # the socket is connected by the connection thread
+        return True
+    
+    def run(self):
+        self.connect_to_host()
+        self.exec_()
+        self.log.debug("Ending connection thread")
+    
+    def connect_to_host(self):
+        if self.exiting:
+            return
+        if not self.transport.open():
+            self.connection_lost()
+            return
+        # the connection is established when the socket is writable
+        self.write_notifier = QSocketNotifier(self.transport.fileno(), QSocketNotifier.Write)
+        self.write_notifier.activated.connect(self.connected)
+    
+    def connected(self):
+        self.stop_watching()
+        if not self.transport.finish_connect():
+            self.connection_lost()
+            return
+        self.watch()
+        self.flush_tx()
+    
+    def wait_writable(self):
+        # flush_tx is called once connected
+        if self.transport.connected:
+            Connection.wait_writable(self)
+    
+    def on_closed(self):
+        self.log.info("Connection closed by the other end")
+        if self.transport.reconnector.max_attempts:
+            self.connection_lost()
+        else:
+            self.stop_watching()
+    
+    def on_error(self):
+        self.connection_lost()
     
-    def _new_packet_found(self, packet_data, excess_data):
-        # emit the new packet data
-        self.new_data_received.emit(packet_data)
+    def connection_lost(self):
+        """Close the socket and open it again after the reconnection delay.
         
-        # store not used data and prepare for next packet
-        self.old_data = excess_data
-        self.packet = bytearray('')
-        self.last_index = -1
+        When no more attempts have to be made, the error is reported.
+        """
+        self.stop_watching()
+        delay = self.transport.lost()
+        # commands queued for the lost connection are stale
+        self.tx_queue.clear()
+        if delay is None:
+            self.error_occurred.emit()
+            return
         
-        # set new packet found flag
-        self.packet_found = True
+        # the partial packet received before the connection was lost is not valid
+        self.framer.reset()
+        QTimer.singleShot(int(delay * 1000), self.connect_to_host)
 
 
-class SerialConnection(Connection):
-    
-    # Serial Constants
-    BYTESIZE = {
-                    5: serial.FIVEBITS,
-                    6: serial.SIXBITS,
-                    7: serial.SEVENBITS,
-                    8: serial.EIGHTBITS
-                }
-    
-    PARITY = {
-                'N': serial.PARITY_NONE,
-                'E': serial.PARITY_EVEN,
-                'O': serial.PARITY_ODD
-            }
-    
-    STOPBITS = {
-                    1: serial.STOPBITS_ONE,
-                    2: serial.STOPBITS_TWO
-                }
+class FileConnection(Connection):
+    """Connection reading an input file, in the connection thread.
+    
+    The whole file is read (or replayed) by run, without an event loop, and
+    closed by the same thread. quit only stops the reading.
+    """
+    
+    # packets emitted together in fast replay mode, at least
+    REPLAY_BATCH_SIZE = 4096
     
     def __init__(self):
         Connection.__init__(self)
         
-        # New data available notifier
-        self.notifier = None
+        # set by quit, the thread waits for it once the file has been read
+        self.quit_requested = threading.Event()
+
+    def run(self):
+        replay_mode = instrument.FileConnectionCfg.ReplayMode
+        if self.instrument.connection.replay == replay_mode.fast:
+            self.replay_fast()
+        elif self.instrument.connection.replay == replay_mode.paced:
+            self.replay_paced()
+        else:
+            self.read_file()
+        # the file and the batch left are only used by this thread
+        self.close()
+        self.quit_requested.wait()
+        self.log.debug("Ending connection thread")
     
-    def begin(self,  instrument):
-        self.log = logging.getLogger('GDAIS.'+instrument.short_name+'.SerialConnection')
-        
-        self.io_conn = serial.Serial()
-        self.io_conn.port = instrument.connection.serial_port
-        self.io_conn.baudrate = instrument.connection.baudrate
-        self.io_conn.bytesize = self.BYTESIZE[instrument.connection.data_bits]
-        self.io_conn.parity = self.PARITY[instrument.connection.parity]
-        self.io_conn.stopbits = self.STOPBITS[instrument.connection.stop_bits]
-        self.io_conn.timeout = 0 # non-blocking mode (return immediately on read)
-        try:
-            self.io_conn.open()
-        except serial.SerialException:
-            self.log.exception("Serial device can not be found or configured")
-            self.error_occurred.emit()
+    def quit(self):
+        self.exiting = True
+        self.quit_requested.set()
+    
+    def read_file(self):
+        """Emit all the packets in the input file, read in blocks."""
+        while not self.exiting and self.transport.io_conn:
+            self.read_data()
+    
+    def read_later(self):
+        # read_file goes on reading
+        pass
+    
+    def schedule_batch(self):
+        # the thread event loop is not running, so batches can not wait
+        self.flush_batch()
+    
+    def replay_fast(self):
+        """Emit all the packets in the input file, in big batches."""
+        replay = FastReplay(self.transport.io_conn, self.framer)
+        batch_size = max(self.batch_size, self.REPLAY_BATCH_SIZE)
+        if self.framer.record_size:
+            for records in replay.record_blocks(batch_size):
+                if self.exiting:
+                    break
+                # the packets are received as they are read from the file
+                self.emit_records(records, time.time())
         else:
-            Connection.begin(self, instrument)
+            for frames in replay.batches(batch_size):
+                if self.exiting:
+                    break
+                self.emit_frames(frames, [time.time()] * len(frames))
+        self.log.info(replay.summary())
     
-    def run(self):
-        self.notifier = QSocketNotifier(self.io_conn.fileno(), QSocketNotifier.Read)
-        self.notifier.activated.connect(self.read_data)
-        
-        Connection.run(self)
+    def replay_paced(self):
+        """Emit the packets in the input file at the original pace."""
+        conn = self.instrument.connection
+        replay = PacedReplay(self.transport.io_conn, conn.replay_baudrate, conn.replay_speed)
+        elapsed = replay.run(self._replay_data, lambda: self.exiting, self.quit_requested.wait)
+        txt = "Replayed {0} bytes in {1:.3f} s (speed x{2:g})"
+        self.log.info(txt.format(replay.bytes, elapsed, replay.speed))
     
-    def quit(self):
-        if self.notifier and self.notifier.isEnabled():
-            self.notifier.setEnabled(False)
-        if self.io_conn and self.io_conn.isOpen():
-            self.log.debug("Clearing serial port buffers (In and Out)")
-            self.io_conn.flushOutput()
-            self.io_conn.flushInput()
-            self.log.info("Closing serial port")
-            self.io_conn.close()
-        Connection.quit(self)
+    def _replay_data(self, data):
+        self.receive_time = time.time()
+        if self.framer.record_size:
+            self.framer.append(data)
+            records = self.framer.extract_records()
+            if len(records):
+                self.emit_records(bytearray(records), self.receive_time)
+            return
+        for packet_data in self.framer.feed(data):
+            self._new_packet_found(bytearray(packet_data))
+        self.flush_batch()
+    
+    def on_closed(self):
+        self.log.info("End of input file")
+        self.transport.close()
+    
+    def on_error(self):
+        # read_file ends once the file is closed
+        self.transport.close()
+        self.error_occurred.emit()
+    
+    def send_data(self, data):
+        # file connection can not send data
+        raise NotImplementedError
 
 
-class TCPConnection(Connection):
+class ReactorThread(QThread):
+    """Thread running the I/O reactor shared by all the ReactorConnections."""
     
     def __init__(self):
-        Connection.__init__(self)
+        QThread.__init__(self)
         
-        # read all data in buffer before exiting self.read_data
-        self.break_on_packet_found = False
+        # reactor multiplexing all the instrument connections
+        self.reactor = Reactor()
+        
+        # default logger
+        self.log = logging.getLogger('GDAIS.ReactorThread')
     
-    def begin(self,  instrument):
-        self.log = logging.getLogger('GDAIS.'+instrument.short_name+'.TCPConnection')
-        self.instrument = instrument
+    def run(self):
+        self.reactor.run()
+        self.reactor.close()
+        self.log.debug("Ending reactor thread")
+    
+    def quit(self):
+        # pending calls (e.g.: closing the connections) are run before exiting
+        self.reactor.stop()
+
+
+class ReactorConnection(QObject):
+    """Instrument connection run by the shared reactor thread.
+    
+    It replaces the Connection and Parser threads of an instrument: data is
+    read, framed and parsed inline in the reactor thread (see Channel), and
+    the parsed packets of each read are emitted together.
+    """
+    
+    # Signal for new batch of packets parsed event (list of PacketBatch)
+    new_packets_parsed = pyqtSignal(list)
+    
+    # Signal for connection error event
+    error_occurred = pyqtSignal()
+    
+    def __init__(self, reactor, link_channel=None):
+        QObject.__init__(self)
         
-        self.io_conn = QTcpSocket()
-        self.io_conn.connected.connect(self.connected)
-        self.io_conn.error.connect(self.connection_error)
-        self.io_conn.connectToHost(instrument.connection.tcp_host,
-            instrument.connection.tcp_port)
+        # reactor running the connection
+        self.reactor = reactor
+        
+        # channel of the instrument on a shared link, if used (see SharedLink)
+        self.link_channel = link_channel
+        
+        # reactor connection, created when the instrument is known
+        self.channel = None
     
-    def connected(self):
-        self.io_conn.readyRead.connect(self.read_data)
-        Connection.begin(self, self.instrument)
+    def begin(self, instrument):
+        self.channel = self.link_channel or Channel.create(self.reactor, instrument)
+        self.channel.packets_handler = self.new_packets_parsed.emit
+        self.channel.error_handler = self.error_occurred.emit
+        self.reactor.call_soon(self.channel.open)
+    
+    def quit(self):
+        if self.channel:
+            self.reactor.call_soon(self.channel.close)
+    
+    def send_command(self, command):
+        self.reactor.call_soon(self.channel.send, command)
+
+
+class SharedLink(QObject):
+    """Physical link shared by several instruments of the equipment.
+    
+    A single connection (or reactor channel) reads and frames the link data,
+    and the packets of each instrument are handed to its endpoint, which
+    takes the place of the instrument connection (see demux).
+    """
     
-    def connection_error(self, socket_error):
-        if socket_error == QTcpSocket.RemoteHostClosedError:
-            self.log.info(self.io_conn.errorString())
+    # Signal for link error event
+    error_occurred = pyqtSignal()
+    
+    def __init__(self, link, instr_cfgs, reactor=None):
+        QObject.__init__(self)
+        
+        # name of the link
+        self.name = link.name
+        
+        # reactor running the link channel, if used
+        self.reactor = reactor
+        
+        # link connection run by its own thread or by the reactor
+        self.connection = None
+        self.channel = None
+        if reactor:
+            self.channel = Channel.create_link(reactor, link, instr_cfgs)
+            self.channel.error_handler = self.error_occurred.emit
         else:
-            self.log.error(self.io_conn.errorString())
-            self.error_occurred.emit()
+            self.instrument = link_instrument(link, instr_cfgs)
+            self.connection = Connection.create(self.instrument.connection)
+            self.connection.demux = Demultiplexer(link, self.instrument.packet_format,
+                                                 instr_cfgs)
+            self.connection.error_occurred.connect(self.error_occurred)
         
+        # default logger
+        self.log = logging.getLogger('GDAIS.'+link.name+'.SharedLink')
+    
+    def begin(self):
+        self.log.info("Opening shared link")
+        if self.reactor:
+            self.reactor.call_soon(self.channel.open)
+        else:
+            self.connection.begin(self.instrument)
+    
     def quit(self):
-        if self.io_conn and self.io_conn.state() == QTcpSocket.ConnectedState:
-            loop = QEventLoop()
-            self.io_conn.disconnected.connect(loop.quit)
-            self.io_conn.disconnectFromHost()
-            self.log.debug("Entered disconnect state...")
-            if self.io_conn.state() == QTcpSocket.ConnectedState:
-                loop.exec_()
-            self.log.info("Done")
-        Connection.quit(self)
-
+        if self.reactor:
+            self.reactor.call_soon(self.channel.close)
+        elif self.connection.isRunning():
+            self.log.debug("Closing shared link connection...")
+            self.connection.quit()
+            self.connection.wait()
+    
+    def endpoint(self, instr_cfg):
+        """Return the connection of the given instrument on this link."""
+        if self.reactor:
+            return ReactorConnection(self.reactor, LinkChannel(self.channel, instr_cfg))
+        return LinkEndpoint(self, instr_cfg)
 
-class FileConnection(Connection):
 
-    def begin(self,  instrument):
-        self.log = logging.getLogger("GDAIS."+instrument.short_name+".FileConnection")
-        try:
-            self.io_conn = open(instrument.connection.filename,  'rb')
-        except IOError:
-            self.log.exception("The input file does not exist")
-            self.error_occurred.emit()
-        else:
-            Connection.begin(self, instrument)
+class LinkEndpoint(QObject):
+    """Connection of an instrument sharing a link with other instruments.
     
-    def run(self):
-        self.read_data()
-        Connection.run(self)
+    It takes the place of the Connection thread of the instrument: the link
+    connection emits the packets of the instrument through its signals, and
+    the data sent is written to the link.
+    """
+    
+    # Signal for new data packet received event, with its receive time
+    new_data_received = pyqtSignal(bytearray, float)
+    
+    # Signal for new batch of data packets received event (list of bytearray
+    # and list of their receive times)
+    new_frames_received = pyqtSignal(list, list)
+    
+    # Signal for new block of data packets received event (never emitted,
+    # link packets are always framed one by one)
+    new_records_received = pyqtSignal(bytearray, float)
+    
+    # Signals for new packets parsed events (never emitted, link packets are
+    # parsed by the instrument Parser thread)
+    new_packet_parsed = pyqtSignal(ParsedPacket)
+    new_packets_parsed = pyqtSignal(list)
+    
+    # Signal for connection error event (link errors are emitted by SharedLink)
+    error_occurred = pyqtSignal()
+    
+    def __init__(self, link, instr_cfg):
+        QObject.__init__(self)
+        
+        # shared link and config of the instrument, with its address or
+        # packet ids in the link
+        self.link = link
+        self.instr_cfg = instr_cfg
+        
+        # whether the packets of the instrument are being received
+        self.attached = False
+        
+        # default logger
+        self.log = logging.getLogger('GDAIS.'+instr_cfg.instrument.short_name+'.LinkEndpoint')
+    
+    def begin(self, instrument):
+        self.log.info("Using shared link '{0}'".format(self.link.name))
+        self.link.connection.demux.add_route(self.instr_cfg, self)
+        self.attached = True
+    
+    def isRunning(self):
+        return self.attached
     
     def quit(self):
-        if self.io_conn:
-            self.log.info("Closing input file")
-            self.io_conn.close()
-        Connection.quit(self)
+        self.link.connection.demux.remove_route(self.instr_cfg, self)
+        self.attached = False
+    
+    def wait(self):
+        # there is no thread to wait for, the link connection is finished
+        # by its SharedLink
+        pass
     
     def send_data(self, data):
-        # file connection can not send data
-        raise NotImplementedError
+        connection = self.link.connection
+        connection.send_data(connection.demux.address_data(self.instr_cfg, data))
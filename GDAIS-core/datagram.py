@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the reception of instruments streaming datagrams, over
+UDP or Unix datagram sockets.
+
+Each datagram holds a whole frame, optionally preceded by a sequence counter
+(sequence_size bytes, in the instrument byte order) used to detect lost
+datagrams. Datagrams are received in batches, until the socket has no more
+data, into a preallocated buffer. It does not depend on Qt, so it is used
+by the UDP and Unix datagram transports.
+"""
+import errno
+import logging
+import os
+import socket
+import stat
+import struct
+
+from instrument import ConnectionCfg, PacketFormat
+
+
+class DatagramReceiver(object):
+
+    # biggest UDP payload (IPv4)
+    MAX_DATAGRAM_SIZE = 65507
+
+    # maximum datagrams received on each call
+    BATCH_SIZE = 256
+
+    # receive buffer requested to the system, to absorb bursts
+    SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, instrument):
+        # socket family, local address where datagrams are received and
+        # address where commands are sent (None: the last datagram sender)
+        conn = instrument.connection
+        if conn.type == ConnectionCfg.Type.unix:
+            self.family = socket.AF_UNIX
+            self.address = conn.socket_path
+            self.remote_address = conn.remote_path or None
+        else:
+            self.family = socket.AF_INET
+            self.address = (conn.udp_host, conn.udp_port)
+            self.remote_address = None
+            if conn.udp_remote_host:
+                self.remote_address = (conn.udp_remote_host, conn.udp_remote_port)
+
+        # preallocated receive buffer and its memoryview
+        self.buffer = bytearray(self.MAX_DATAGRAM_SIZE)
+        self.view = memoryview(self.buffer)
+
+        # sequence counter struct, its modulus and the next value expected
+        self.sequence = None
+        if conn.sequence_size:
+            self.sequence = struct.Struct(instrument.byte_order_char +
+                                          PacketFormat.SIZE_CODES[conn.sequence_size])
+            self.sequence_modulus = 1 << (8 * conn.sequence_size)
+        self.next_sequence = None
+
+        # address of the last datagram sender
+        self.sender = None
+
+        # number of datagrams received, dropped (not holding a valid frame),
+        # of sequence gaps found and of datagrams lost in them, and of
+        # datagrams received out of order or duplicated (sequence before the
+        # next one expected)
+        self.datagrams = 0
+        self.dropped = 0
+        self.gaps = 0
+        self.lost = 0
+        self.reordered = 0
+
+        # default logger
+        self.log = logging.getLogger('GDAIS.'+instrument.short_name+'.DatagramReceiver')
+
+    def open(self):
+        """Return a new non-blocking socket bound to the local address."""
+        sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        if self.family == socket.AF_UNIX:
+            # a socket file left by a previous run would make bind fail
+            self.unlink()
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
+        except socket.error:
+            self.log.warn("Can not set the socket receive buffer size")
+        sock.bind(self.address)
+        sock.setblocking(0)
+        return sock
+
+    def unlink(self):
+        """Remove the socket file of the local address (Unix sockets)."""
+        if self.family == socket.AF_UNIX:
+            try:
+                if stat.S_ISSOCK(os.stat(self.address).st_mode):
+                    os.unlink(self.address)
+            except OSError:
+                pass
+
+    def destination(self):
+        """Return the address where commands are sent, None if not known yet."""
+        return self.remote_address or self.sender or None
+
+    def receive(self, sock, framer, max_packets=0):
+        """Receive the datagrams waiting in sock, checking them with framer.
+
+        Returns the list of packets (bytearray, as Framer.unframe returns
+        them) found, with up to max_packets packets (BATCH_SIZE if 0).
+        """
+        packets = []
+        max_packets = max_packets or self.BATCH_SIZE
+        header_size = self.sequence.size if self.sequence else 0
+        while len(packets) < max_packets:
+            try:
+                size, self.sender = sock.recvfrom_into(self.buffer)
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            self.datagrams += 1
+
+            if size < header_size:
+                self.dropped += 1
+                continue
+            # the capture keeps the frame without the sequence header, so it
+            # is replayed as the stream it carries
+            if framer.tap:
+                framer.tap(self.view[header_size:size])
+            if self.sequence:
+                self._check_sequence(self.sequence.unpack_from(self.buffer)[0])
+
+            packet = framer.unframe(self.view[header_size:size])
+            if packet is None:
+                self.dropped += 1
+            else:
+                packets.append(packet)
+        return packets
+
+    def kernel_drops(self, sock):
+        """Return the datagrams dropped by the system for sock (Linux only).
+
+        Returns None when the count is not available.
+        """
+        if self.family != socket.AF_INET:
+            return None
+        inode = str(os.fstat(sock.fileno()).st_ino)
+        try:
+            with open('/proc/net/udp') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 12 and fields[9] == inode:
+                        return int(fields[-1])
+        except (IOError, ValueError):
+            pass
+        return None
+
+    def summary(self, sock=None):
+        """Return a text describing the datagrams received."""
+        txt = ("Datagrams received: {0}, dropped: {1}, sequence gaps: {2}, lost: {3}, "
+               "reordered: {4}")
+        text = txt.format(self.datagrams, self.dropped, self.gaps, self.lost, self.reordered)
+        drops = self.kernel_drops(sock) if sock else None
+        if drops is not None:
+            text += ", dropped by the system: {0}".format(drops)
+        return text
+
+    def _check_sequence(self, sequence):
+        if self.next_sequence is not None and sequence != self.next_sequence:
+            delta = (sequence - self.next_sequence) % self.sequence_modulus
+            if delta > self.sequence_modulus // 2:
+                # a late or duplicated datagram, the sequence goes on from
+                # the newest one
+                self.reordered += 1
+                return
+            self.gaps += 1
+            self.lost += delta
+        self.next_sequence = (sequence + 1) % self.sequence_modulus
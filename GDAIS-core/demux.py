@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the demultiplexing of shared links.
+
+Several logical instruments of an equipment can share one physical link
+(serial port, TCP connection...): a single connection reads and frames the
+link data, and each packet is handed to the instrument it belongs to, which
+is found by:
+
+- packet id: each instrument uses its own range of packet numbers.
+- address: an address byte in the packet, at the same position for all the
+  instruments. It is removed from the received packets and added to the
+  sent ones, so the instruments are described without it. The link packets
+  have to be delimited by marks, as their lengths are not known.
+
+All the instruments of a link share the packet format of the first one. It
+does not depend on Qt, so it is used by SharedLink and the reactor channels.
+"""
+import copy
+
+from equipment import LinkConfig
+from framer import Framer
+from instrument import PacketFormat
+
+
+class Demultiplexer(object):
+    """Router of the packets of a shared link to its logical instruments."""
+
+    # number of values of the packet number and address bytes
+    KEYS = 256
+
+    def __init__(self, link, packet_format, instr_cfgs):
+        # whether the packets have an address byte, removed before handing them
+        self.has_address = link.demux == LinkConfig.DemuxMode.address
+
+        # position of the byte identifying the instrument of each packet
+        rx_format = packet_format.rx_format
+        if self.has_address:
+            has_marks = (PacketFormat.FormatField.start_bytes in rx_format or
+                         PacketFormat.FormatField.end_bytes in rx_format)
+            if not has_marks or PacketFormat.FormatField.length in rx_format:
+                txt = "Link '{0}': address demultiplexing needs packets delimited by marks"
+                raise ValueError(txt.format(link.name))
+            self.offset = link.address_offset
+        else:
+            if PacketFormat.FormatField.packet_num not in rx_format:
+                txt = "Link '{0}': packet id demultiplexing needs a packet number"
+                raise ValueError(txt.format(link.name))
+            self.offset = packet_format.field_offset(rx_format,
+                                                PacketFormat.FormatField.packet_num)
+
+        # check the packet numbers or addresses of the instruments. After a DLE
+        # start mark, the DLE and ETX bytes would be taken as marks
+        reserved = []
+        if self.has_address and packet_format.byte_stuffing == PacketFormat.ByteStuffing.dle:
+            reserved = [0x03, 0x10]
+        for instr_cfg in instr_cfgs:
+            keys = self.keys(instr_cfg)
+            if any(key < 0 or key >= self.KEYS or key in reserved for key in keys):
+                txt = "Link '{0}': invalid address or packet ids of instrument '{1}'"
+                raise ValueError(txt.format(link.name, instr_cfg.instrument.short_name))
+
+        # handler and instrument short name of each packet number or address
+        # (None if not routed)
+        self.routes = [None] * self.KEYS
+
+        # packets handed to each handler and packets without handler
+        self.routed = {}
+        self.unrouted = 0
+
+    def keys(self, instr_cfg):
+        """Packet numbers or addresses of the given instrument configuration."""
+        if self.has_address:
+            key, field = [instr_cfg.link_address], 'address'
+        else:
+            key, field = instr_cfg.link_packet_ids, 'packet_ids'
+        if key is None or None in key:
+            txt = "Link '{0}': instrument '{1}' has no {2}"
+            raise ValueError(txt.format(instr_cfg.link, instr_cfg.instrument.short_name, field))
+        if self.has_address:
+            return key
+        first, last = key
+        return range(first, last + 1)
+
+    def add_route(self, instr_cfg, handler):
+        """Hand the packets of the given instrument configuration to handler."""
+        route = (handler, instr_cfg.instrument.short_name)
+        for key in self.keys(instr_cfg):
+            self.routes[key] = route
+        self.routed.setdefault(instr_cfg.instrument.short_name, 0)
+
+    def remove_route(self, instr_cfg, handler):
+        """Stop handing packets to handler, if it still handles them."""
+        for key in self.keys(instr_cfg):
+            if self.routes[key] and self.routes[key][0] is handler:
+                self.routes[key] = None
+
+    def route(self, packet):
+        """Return the handler of a packet and its data for the instrument.
+
+        The returned data is a bytearray owned by the caller, without the
+        address byte. The handler is None if the packet is not routed.
+        """
+        data = packet if isinstance(packet, bytearray) else bytearray(packet)
+        if len(data) <= self.offset:
+            self.unrouted += 1
+            return None, data
+        route = self.routes[data[self.offset]]
+        if route is None:
+            self.unrouted += 1
+            return None, data
+        handler, short_name = route
+        if self.has_address:
+            del data[self.offset]
+        self.routed[short_name] += 1
+        return handler, data
+
+    def split(self, packets, times):
+        """Return the routed packets grouped by handler, with their receive
+        times (times of packets): [(handler, [data], [time])]."""
+        groups = []
+        by_handler = {}
+        for packet, receive_time in zip(packets, times):
+            handler, data = self.route(packet)
+            if handler is not None:
+                if handler not in by_handler:
+                    by_handler[handler] = ([], [])
+                    groups.append((handler, ) + by_handler[handler])
+                by_handler[handler][0].append(data)
+                by_handler[handler][1].append(receive_time)
+        return groups
+
+    def address_data(self, instr_cfg, data):
+        """Return the data of a packet sent by the given instrument configuration."""
+        if self.has_address:
+            data = bytearray(data)
+            data.insert(self.offset, instr_cfg.link_address)
+        return data
+
+    def summary(self):
+        """Return a text describing the packets demultiplexed."""
+        routed = ', '.join("{0}: {1}".format(name, count)
+                           for name, count in sorted(self.routed.iteritems()))
+        return "Packets routed ({0}), unrouted: {1}".format(routed, self.unrouted)
+
+
+def link_instrument(link, instr_cfgs):
+    """Return the instrument description used to open and frame a shared link.
+
+    It is the first instrument of the link with the link connection, and the
+    packets of all the instruments (packet id) or no packets (address).
+    """
+    first = instr_cfgs[0].instrument
+    instr = copy.copy(first)
+    instr.filename = ""
+    instr.short_name = link.name
+    instr.name = "Link {0}".format(link.name)
+    instr.connection = link.connection
+    instr.tx_packets = {}
+    if link.demux == LinkConfig.DemuxMode.address:
+        # the packet lengths include the address byte, so they are unknown
+        framer = Framer(first)
+        instr.packet_format = copy.copy(first.packet_format)
+        if framer.max_packet_size:
+            address_size = 2 if framer.stuffed_dle else 1
+            instr.packet_format.max_packet_size = framer.max_packet_size + address_size
+        instr.rx_packets = {}
+    else:
+        instr.rx_packets = {}
+        for instr_cfg in instr_cfgs:
+            instr.rx_packets.update(instr_cfg.instrument.rx_packets)
+    return instr
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the headless acquisition engine.
+
+The engine runs the same stages as GDAIS (connections, parsers, instrument
+controllers and data recorder) without loading Qt. All of them run in a
+single thread on the I/O reactor: data is framed and parsed inline by the
+instrument channels, and the instrument controllers are coroutines
+(generators) that yield what they wait for, a delay or a reply:
+
+    python engine.py conf/equips/smigol.json
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+
+from channel import Channel, LinkChannel
+from codec import format_values
+from equipment import Equipment, InstrumentConfig, LinkNotFoundError
+from instrument import WrongCountFieldError
+from reactor import Reactor
+from storage import DataFile
+
+
+class Sleep(object):
+    """Coroutine request to be resumed after delay seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def schedule(self, task):
+        return task.reactor.call_later(self.delay, task.step)
+
+
+class Reply(object):
+    """Coroutine request to be resumed with the next packet received.
+
+    The coroutine gets None if no packet is received in timeout seconds.
+    """
+
+    def __init__(self, controller, timeout):
+        self.controller = controller
+        self.timeout = timeout
+        self.task = None
+        self.timer = None
+
+    def schedule(self, task):
+        self.task = task
+        self.timer = task.reactor.call_later(self.timeout, self.resolve, None)
+        self.controller.waiting_reply = self
+        return self
+
+    def resolve(self, packet):
+        self.cancel()
+        self.task.step(packet)
+
+    def cancel(self):
+        self.timer.cancel()
+        if self.controller.waiting_reply is self:
+            self.controller.waiting_reply = None
+
+
+class Task(object):
+    """Coroutine run by the reactor.
+
+    The coroutine yields requests (Sleep or Reply), and it is resumed when
+    they are fulfilled. The finished function is called with whether the
+    coroutine ended with an error.
+    """
+
+    def __init__(self, reactor, coroutine, finished=None):
+        self.reactor = reactor
+        self.coroutine = coroutine
+        self.finished = finished
+
+        # request being waited for (it has a cancel method)
+        self.pending = None
+
+        # default logger
+        self.log = logging.getLogger('GDAIS.Task')
+
+    def start(self):
+        self.reactor.call_soon(self.step)
+
+    def step(self, value=None):
+        self.pending = None
+        try:
+            request = self.coroutine.send(value)
+        except StopIteration:
+            self._finish(False)
+        except Exception:
+            self.log.exception("Error in task {0}".format(self.coroutine))
+            self._finish(True)
+        else:
+            self.pending = request.schedule(self)
+
+    def cancel(self):
+        if self.pending:
+            self.pending.cancel()
+            self.pending = None
+        self.coroutine.close()
+
+    def _finish(self, error):
+        if self.finished:
+            self.finished(error)
+
+
+class InitializationError(Exception):
+    """Exception raised when an init command reply is not received."""
+    pass
+
+
+class InstrumentController(object):
+
+    # seconds to wait for a reply in blocking sequences and initialization
+    RX_TIMEOUT = 2.0
+
+    def __init__(self, reactor, instrument_config, data_file, link_channel=None):
+        # logging instance
+        self.log = logging.getLogger('GDAIS.'+instrument_config.instrument.short_name)
+
+        # config of the instrument this controller is connected to
+        self.instr_cfg = instrument_config
+
+        # reactor running the controller and data file to record packets
+        self.reactor = reactor
+        self.data_file = data_file
+
+        # connection with the instrument, which also parses the packets. It
+        # uses the channel of the link if shared with other instruments
+        if link_channel:
+            self.channel = LinkChannel(link_channel, instrument_config)
+        else:
+            self.channel = Channel.create(reactor, instrument_config.instrument)
+        self.channel.packets_handler = self.on_new_packets_parsed
+
+        # running coroutines
+        self.tasks = []
+
+        # Reply request waiting for the next packet
+        self.waiting_reply = None
+
+        # whether initialization has finished and packets are recorded
+        self.operating = False
+
+        # function called when an error occurs
+        self.error_handler = None
+
+    def begin(self):
+        self.channel.error_handler = self.on_error
+        self.reactor.call_soon(self.channel.open)
+
+        if self.instr_cfg.init_commands:
+            self.log.info("Starting instrument initialization")
+            self._start_task(self.initialization(), self.on_initialization_finished)
+        else:
+            txt = "Instrument '{0}' has no initial configuration"
+            self.log.info(txt.format(self.instr_cfg.instrument.name))
+            self.start_operation()
+
+    def quit(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        self.channel.close()
+
+    def start_operation(self):
+        self.log.info("Starting!")
+        self.operating = True
+
+        om = InstrumentConfig.OperationMode
+        commands = self.instr_cfg.operation_commands
+        if self.instr_cfg.operation_mode == om.periodic:
+            for command in commands:
+                self.log.debug("Creating task for '{0}' command".format(command.name))
+                self._start_task(self.periodic_command(command))
+        elif self.instr_cfg.operation_mode == om.sequences:
+            self._start_task(self.time_sequence(commands))
+        elif self.instr_cfg.operation_mode == om.blocking:
+            self._start_task(self.blocking_sequence(commands))
+        else:
+            txt = "Instrument's operation mode {0} type not implemented"
+            raise Exception(txt.format(self.instr_cfg.operation_mode))
+
+    def periodic_command(self, command):
+        while True:
+            self.channel.send(command)
+            yield Sleep(command.param / 1000.0)
+
+    def time_sequence(self, commands):
+        while True:
+            for command in commands:
+                self.channel.send(command)
+                yield Sleep(command.param / 1000.0)
+
+    def blocking_sequence(self, commands):
+        while True:
+            for command in commands:
+                for i in xrange(command.param):
+                    self.channel.send(command)
+                    packet = yield Reply(self, self.RX_TIMEOUT)
+                    if packet is None:
+                        self.log.warn("Timeout! response packet not received")
+
+    def initialization(self):
+        for command in self.instr_cfg.init_commands:
+            self.channel.send(command)
+            packet = yield Reply(self, self.RX_TIMEOUT)
+            if packet is None:
+                self.log.error("Timeout! init command reply not received")
+                raise InitializationError(command.name)
+
+            self.log.debug("Received packet:")
+            self.log_new_packet_parsed(packet)
+        self.log.info("All init commands sent correctly, ending initialization")
+
+    def on_initialization_finished(self, error):
+        if error:
+            self.log.error("Ending initialization as there has been an error")
+            self.on_error()
+        else:
+            self.start_operation()
+
+    def on_new_packets_parsed(self, batches):
+        if self.operating:
+            for batch in batches:
+                self.log_new_batch_parsed(batch)
+            self.data_file.append_batches(batches)
+
+        if self.waiting_reply:
+            # only one command waits for its reply, the other packets of the
+            # batches are late replies of commands sent again on timeout
+            self.waiting_reply.resolve(batches[-1].packet(-1))
+
+    def log_new_packet_parsed(self, packet):
+        # log the event
+        self.log.info("New '{0}' packet received".format(packet.instrument_packet.name))
+        if packet.data and self.log.isEnabledFor(logging.DEBUG):
+            fields = [str(f.name) for f in packet.instrument_packet.fields]
+            self.log.debug("({0})".format(format_values(fields, packet.data)))
+
+    def log_new_batch_parsed(self, batch):
+        # log the event, with the fields of the last packet only
+        txt = "New {0} '{1}' packets received"
+        self.log.info(txt.format(len(batch), batch.instrument_packet.name))
+        if batch.data.dtype.names and self.log.isEnabledFor(logging.DEBUG):
+            str_fields = format_values(batch.data.dtype.names, batch.data[-1].tolist())
+            self.log.debug("(last: {0})".format(str_fields))
+
+    def on_error(self):
+        self.log.error("Error occurred!")
+        if self.error_handler:
+            self.error_handler()
+
+    def _start_task(self, coroutine, finished=None):
+        task = Task(self.reactor, coroutine, finished)
+        self.tasks.append(task)
+        task.start()
+
+
+class Engine(object):
+
+    BASE_PATH = '/home/pau/feina/UPC/projecte/code/GDAIS/GDAIS-core'
+
+    def __init__(self, equipment_file):
+        self.equipment_file = equipment_file
+
+        # reactor running all the engine stages
+        self.reactor = Reactor()
+
+        # HDF-5 data file
+        self.data_file = DataFile()
+
+        # instrument controllers and channels of the shared links
+        self.instrument_controllers = []
+        self.link_channels = {}
+
+        # whether exit sequence has started
+        self.exiting = False
+
+        # logging instance
+        self.log = logging.getLogger("GDAIS")
+
+    def run(self):
+        """Run the engine until quit is called or a signal is received."""
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self.reactor.add_signal_handler(signum, self.quit)
+
+        self.reactor.call_soon(self.start)
+        self.reactor.run()
+        self.reactor.close()
+
+    def start(self):
+        # load equipment from given file
+        self.log.debug("Equipment file: '{0}'".format(self.equipment_file))
+        try:
+            equipment = Equipment(self.equipment_file)
+        except (IOError, LinkNotFoundError, WrongCountFieldError):
+            self.log.exception("Couldn't load equipment file")
+            self.quit()
+            return
+
+        self.data_file.open(equipment)
+
+        for name, link in equipment.links.iteritems():
+            instr_cfgs = equipment.get_link_instrument_configs(name)
+            if instr_cfgs:
+                try:
+                    link_channel = Channel.create_link(self.reactor, link, instr_cfgs)
+                except ValueError:
+                    self.log.exception("Couldn't create shared link")
+                    self.quit()
+                    return
+                link_channel.error_handler = self.on_error
+                self.link_channels[name] = link_channel
+                self.reactor.call_soon(link_channel.open)
+
+        for instrument_config in equipment.instruments:
+            link_channel = self.link_channels.get(instrument_config.link)
+            instr_ctrl = InstrumentController(self.reactor, instrument_config, self.data_file,
+                                              link_channel)
+            instr_ctrl.error_handler = self.on_error
+            self.instrument_controllers.append(instr_ctrl)
+            instr_ctrl.begin()
+
+    def on_error(self):
+        # quit once the running callback (maybe a controller task) returns
+        self.reactor.call_soon(self.quit)
+
+    def quit(self):
+        if not self.exiting:
+            self.exiting = True
+            self.log.info("Exiting!")
+
+            for instr_ctrl in self.instrument_controllers:
+                instr_ctrl.quit()
+
+            for link_channel in self.link_channels.itervalues():
+                link_channel.close()
+
+            self.log.debug("Closing data file...")
+            self.data_file.close()
+
+            self.log.info("Goodbye!")
+            self.reactor.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='GDAIS headless acquisition engine (without Qt)')
+    parser.add_argument('equipment',  help='Equipment file (.json) to work with')
+    parser.add_argument('-q', action='store_true', default=False, dest='quiet',
+                                        help='Do not send log output to console')
+    args = parser.parse_args()
+
+    # output logging
+    logging.basicConfig(
+                        level=logging.DEBUG,
+                        format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
+                        filename=os.path.join(Engine.BASE_PATH, 'debug.log'),
+                        filemode='w')
+    if not args.quiet:
+        consoleHandler = logging.StreamHandler()
+        consoleHandler.setLevel(logging.DEBUG)
+        logging.getLogger("GDAIS").addHandler(consoleHandler)
+
+    logging.getLogger("GDAIS").info("Welcome to GDAIS! (headless engine)")
+    engine = Engine(os.path.abspath(args.equipment))
+    engine.run()
+    sys.exit(0)
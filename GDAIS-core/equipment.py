@@ -5,7 +5,7 @@ Module implementing the equipment model.
 """
 import json, logging
 
-from instrument import Instrument
+from instrument import ConnectionCfg, Instrument
 
 class Equipment(object):
     
@@ -20,14 +20,25 @@ class Equipment(object):
             self.short_name = equip['short_name']
             self.name = equip['name']
             
+            # physical links shared by several instruments, by name
+            self.links = {}
+            for link in equip.get('links', []):
+                self.links[link['name']] = LinkConfig(link)
+            
             self.instruments = []
             for instr in equip['instruments']:
-                self.instruments.append(InstrumentConfig(instr))
+                instr_cfg = InstrumentConfig(instr)
+                if instr_cfg.link:
+                    if instr_cfg.link not in self.links:
+                        raise LinkNotFoundError(instr_cfg.link)
+                    instr_cfg.link_cfg = self.links[instr_cfg.link]
+                self.instruments.append(instr_cfg)
         
         else:
             self.filename = ""
             self.short_name = "new_equipment"
             self.name = "New Equipment"
+            self.links = {}
             self.instruments = []
     
     def add_instrument_config(self, filename):
@@ -49,18 +60,59 @@ class Equipment(object):
                 return instr_cfg
         return None
     
+    def get_link_instrument_configs(self, name):
+        """Configurations of the instruments sharing the given link."""
+        return [instr_cfg for instr_cfg in self.instruments if instr_cfg.link == name]
+    
     def dump(self):
-        return {
+        equip = {
                     'name': self.name,
                     'short_name': self.short_name,
                     'instruments': [instr.dump() for instr in self.instruments]
                 }
+        if self.links:
+            equip['links'] = [link.dump() for link in self.links.itervalues()]
+        return equip
     
     def to_file(self, filename):
         with open(filename, "w") as fp:
             json.dump(self.dump(), fp, indent=True)
 
 
+class LinkConfig(object):
+    """Physical link (connection) shared by several instruments.
+    
+    The instruments are told apart by their packet ids or by an address
+    byte in the packets (see demux).
+    """
+    
+    # Demultiplexing modes
+    class DemuxMode:
+        packet_id = "Packet id"
+        address = "Address"
+    
+    DEFAULT_DEMUX_MODE = DemuxMode.packet_id
+    
+    # position of the address byte in the packets, after the start bytes
+    DEFAULT_ADDRESS_OFFSET = 0
+    
+    def __init__(self, link):
+        self.name = link['name']
+        self.connection = ConnectionCfg.create(link['connection'])
+        self.demux = link.get('demux', self.DEFAULT_DEMUX_MODE)
+        self.address_offset = link.get('address_offset', self.DEFAULT_ADDRESS_OFFSET)
+    
+    def dump(self):
+        link = {
+                    'name': self.name,
+                    'connection': self.connection.dump(),
+                    'demux': self.demux
+                }
+        if self.demux == self.DemuxMode.address:
+            link['address_offset'] = self.address_offset
+        return link
+
+
 class InstrumentConfig(object):
     
     # Operation modes
@@ -74,6 +126,14 @@ class InstrumentConfig(object):
     def __init__(self,  instr):
         self.log = logging.getLogger('GDAIS.InstrumentConfig')
         
+        # name and config of the shared link used instead of the instrument
+        # connection (None if not shared), and the address or packet ids
+        # [first, last] of the instrument in it
+        self.link = None
+        self.link_cfg = None
+        self.link_address = None
+        self.link_packet_ids = None
+        
         if type(instr) is str:
             self.instrument = Instrument(instr)
             self.init_commands = []
@@ -94,6 +154,11 @@ class InstrumentConfig(object):
             if 'operation_commands' in instr:
                 for c in instr['operation_commands']:
                     self.add_operation_command(c)
+            
+            if 'link' in instr:
+                self.link = instr['link']['name']
+                self.link_address = instr['link'].get('address')
+                self.link_packet_ids = instr['link'].get('packet_ids')
         
         else:
             self.log.error("Unknown parameter type, can't initialize InstrumentConfig")
@@ -154,12 +219,20 @@ class InstrumentConfig(object):
             return True
     
     def dump(self):
-        return {
+        instr = {
                     'filename': self.instrument.filename,
                     'init_commands': [c.dump() for c in self.init_commands],
                     'operation_mode': self.operation_mode, 
                     'operation_commands': [c.dump() for c in self.operation_commands]
                 }
+        if self.link:
+            link = {'name': self.link}
+            if self.link_address is not None:
+                link['address'] = self.link_address
+            if self.link_packet_ids is not None:
+                link['packet_ids'] = self.link_packet_ids
+            instr['link'] = link
+        return instr
 
 
 class Command(object):
@@ -250,3 +323,18 @@ class InstrumentConfigAlreadyExistsError(Exception):
     
     def __str__(self):
         return repr(self.name)
+
+
+class LinkNotFoundError(Exception):
+    """
+    Exception raised when an instrument uses a link not defined in the equipment.
+    
+    Attributes:
+        name -- name of the link
+    """
+    
+    def __init__(self, name):
+        self.name = name
+    
+    def __str__(self):
+        return repr(self.name)
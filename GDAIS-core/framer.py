@@ -0,0 +1,685 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the packet framing engine.
+
+The framer splits the byte stream received from an instrument into packets,
+and builds the packets sent to it. The instrument packet format is compiled
+when the framer is created (marks, field positions, packet lengths and the
+search functions used), so no format lookups are done for each packet.
+It does not depend on Qt, so it can be used both inside a Connection thread
+and offline (e.g.: to reprocess a raw capture file):
+
+    framer = Framer(instrument)
+    for packet in framer.feed(data):
+        ...
+
+Packets made only of their fields, all of the same length (no marks,
+packet number, length or checksum), are a packed array of records. For
+them the framer has a record mode (see record_size), where extract_records
+returns all the complete records received as a single block, so they can be
+decoded at once (see Codec.decode_records) instead of packet by packet.
+"""
+import struct
+
+from checksum import Checksum
+from instrument import PacketFormat
+
+
+class RingBuffer(object):
+    """Preallocated receive buffer.
+
+    Data is written after the tail and consumed from the head, so reads can
+    land directly in it and packets can be handed out as memoryview slices.
+    Consumed space is reclaimed by moving the head: when all data has been
+    consumed the buffer restarts from the beginning without copying, and
+    only when the free space at the end runs out the unconsumed remainder
+    (usually part of a packet) is moved to the front. If it does not fit the
+    buffer grows to a new bytearray, so views handed out before stay valid.
+    """
+
+    DEFAULT_SIZE = 65536
+
+    def __init__(self, size=DEFAULT_SIZE):
+        # preallocated data storage and its memoryview
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+
+        # position of the first byte not consumed yet
+        self.head = 0
+
+        # position after the last byte written
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def reserve(self, size):
+        """Make room for size bytes after the tail.
+
+        Returns how many positions the buffered data has been moved back,
+        so positions kept by the caller can be updated.
+        """
+        used = self.tail - self.head
+        if used and self.tail + size <= len(self.data):
+            # enough free space after the tail
+            return 0
+
+        shift = self.head
+        if used + size > len(self.data):
+            # grow, the old storage is kept alive by the views handed out
+            data = bytearray(max(2 * len(self.data), used + size))
+            data[:used] = self.view[self.head:self.tail]
+            self.data = data
+            self.view = memoryview(data)
+        elif used:
+            self.data[:used] = self.data[self.head:self.tail]
+        # when everything is consumed restart from the beginning without copying
+        self.head = 0
+        self.tail = used
+        return shift
+
+    def writable(self, size):
+        """Return a view of the free space after the tail (see reserve)."""
+        return self.view[self.tail:self.tail + size]
+
+    def commit(self, size):
+        """Mark size bytes written in the writable view as received."""
+        self.tail += size
+
+
+class Framer(object):
+
+    # number of values of the packet number field
+    PACKET_NUMS = 256
+
+    def __init__(self, instrument):
+        # instrument description
+        self.instrument = instrument
+        format = instrument.packet_format
+        rx_format = format.rx_format
+
+        # receive buffer, its head is the first byte not consumed yet
+        self.buffer = RingBuffer()
+
+        # function called with a memoryview of each block of data received,
+        # before framing it (e.g.: CaptureWriter.write)
+        self.tap = None
+
+        # position in self.buffer where the current packet data starts
+        # -1 means that packet start has not been found yet
+        self.packet_start = -1
+
+        # position in self.buffer where the next mark search resumes, every
+        # byte before it has already been checked
+        self.search_index = 0
+
+        # which format fields the received packets have
+        has_start_bytes = PacketFormat.FormatField.start_bytes in rx_format
+        has_end_bytes = PacketFormat.FormatField.end_bytes in rx_format
+        has_length = PacketFormat.FormatField.length in rx_format
+        self.has_packet_num = PacketFormat.FormatField.packet_num in rx_format
+
+        # packet marks
+        self.start_bytes = bytearray(format.start_bytes if has_start_bytes else [])
+        self.end_bytes = bytearray(format.end_bytes if has_end_bytes else [])
+
+        # position of the packet number
+        self.packet_num_offset = 0
+        if self.has_packet_num:
+            self.packet_num_offset = format.field_offset(rx_format,
+                                                PacketFormat.FormatField.packet_num)
+
+        # size of the format fields before and after the packet fields
+        self.header_size = format.header_size(rx_format)
+        self.trailer_size = format.trailer_size(rx_format)
+
+        # size of the packet fields by packet number (the maximum one for
+        # packets with variable length arrays) and sizes of the packets of
+        # fixed length, the variable ones need an end mark or a length field
+        packet_sizes = dict((num, struct.calcsize(instrument.byte_order_char +
+                                                    packet.struct_format()))
+                                for num, packet in instrument.rx_packets.iteritems())
+        fixed_sizes = dict((num, size) for num, size in packet_sizes.iteritems()
+                                if not instrument.rx_packets[num].is_variable())
+        if len(fixed_sizes) < len(packet_sizes) and not (has_length or has_end_bytes):
+            raise ValueError("Packets with variable length arrays need an end mark "
+                             "or a length field")
+
+        # packet length (from its start to the end of its fields) by packet
+        # number, 0 when the packet is unknown. When there is only a packet
+        # defined, its length is used even if there is no packet number
+        self.packet_lengths = [0] * self.PACKET_NUMS
+        if len(packet_sizes) == 1 and fixed_sizes:
+            packet_len = self.header_size + fixed_sizes.values()[0] + self.trailer_size
+            self.packet_lengths = [packet_len] * self.PACKET_NUMS
+        if self.has_packet_num:
+            for num, size in fixed_sizes.iteritems():
+                if 0 <= num < self.PACKET_NUMS:
+                    self.packet_lengths[num] = self.header_size + size + self.trailer_size
+
+        # packet length used when the packet format has no marks, all the
+        # packets are supposed to be of the same length
+        self.packet_size = 0
+        if fixed_sizes:
+            self.packet_size = (self.header_size + fixed_sizes.values()[0] +
+                                self.trailer_size)
+
+        # record size when the packets are just their fields (record mode),
+        # 0 otherwise
+        self.record_size = 0
+        if (list(rx_format) == [PacketFormat.FormatField.packet_fields] and
+                len(fixed_sizes) == 1):
+            self.record_size = self.packet_size
+
+        # position and decoder of the length field
+        self.length_offset = 0
+        self.length_struct = None
+        if has_length:
+            self.length_offset = format.field_offset(rx_format,
+                                                PacketFormat.FormatField.length)
+            self.length_struct = struct.Struct(instrument.byte_order_char +
+                                                PacketFormat.SIZE_CODES[format.length_size])
+
+        # packets checksum and position of its field from the packet end
+        self.checksum = None
+        self.checksum_end_offset = 0
+        if PacketFormat.FormatField.checksum in rx_format:
+            self.checksum = Checksum.create(instrument)
+            self.checksum_end_offset = format.field_end_offset(rx_format,
+                                                PacketFormat.FormatField.checksum)
+
+        # DLE byte stuffing: escape byte (the start mark) and its doubled form
+        self.dle = None
+        self.stuffed_dle = None
+        if format.byte_stuffing == PacketFormat.ByteStuffing.dle:
+            self.dle = bytearray(format.start_bytes[:1])
+            self.stuffed_dle = self.dle * 2
+
+        # maximum packet size, from the packet start to the end of its end
+        # mark. If it is not given, use the biggest packet instrument can send
+        self.max_packet_size = format.max_packet_size
+        if not self.max_packet_size and packet_sizes:
+            self.max_packet_size = (self.header_size + max(packet_sizes.itervalues()) +
+                                    self.trailer_size)
+            if self.stuffed_dle:
+                # in the worst case every byte is stuffed
+                self.max_packet_size *= 2
+            self.max_packet_size += len(format.end_bytes)
+
+        # number of packets found with right and wrong checksum
+        self.accepted = 0
+        self.rejected = 0
+
+        # number of bytes discarded while looking for packets, and number of
+        # times a packet has been discarded to look for the next packet start
+        self.discarded_bytes = 0
+        self.resyncs = 0
+
+        # functions used to find the packet start and end, depending on the
+        # packet format
+        self.find_packet_start = self.find_packet_start_any
+        if has_start_bytes:
+            if self.stuffed_dle:
+                self.find_packet_start = self.find_packet_start_dle
+            else:
+                self.find_packet_start = self.find_packet_start_mark
+
+        self.find_packet_end = self.find_packet_end_size
+        if has_length:
+            self.find_packet_end = self.find_packet_end_length
+        elif has_end_bytes:
+            if self.stuffed_dle:
+                self.find_packet_end = self.find_packet_end_dle
+            else:
+                self.find_packet_end = self.find_packet_end_mark
+        elif has_start_bytes:
+            if self.has_packet_num or len(packet_sizes) == 1:
+                self.find_packet_end = self.find_packet_end_next_start_or_len
+            else:
+                self.find_packet_end = self.find_packet_end_next_start
+        elif self.has_packet_num:
+            self.find_packet_end = self.find_packet_end_len
+
+        # bytes buffered from the packet start before its end is taken as
+        # lost. When the end is the next packet start, a packet of maximum
+        # size is only found when that whole mark is received
+        self.max_buffered_size = self.max_packet_size
+        if self.max_packet_size and self.find_packet_end in (self.find_packet_end_next_start,
+                                                             self.find_packet_end_next_start_or_len):
+            self.max_buffered_size += len(self.start_bytes) - 1
+
+        # marks added to the sent packets
+        tx_format = format.tx_format
+        self.tx_prefix = bytearray()
+        if PacketFormat.FormatField.start_bytes in tx_format:
+            self.tx_prefix = bytearray(format.start_bytes)
+        self.tx_suffix = bytearray()
+        if PacketFormat.FormatField.end_bytes in tx_format:
+            self.tx_suffix = bytearray(format.end_bytes)
+
+        # checksum of sent packets and position of its field from the packet end
+        self.tx_checksum = None
+        self.tx_checksum_end_offset = 0
+        if PacketFormat.FormatField.checksum in tx_format:
+            self.tx_checksum = Checksum.create(instrument)
+            self.tx_checksum_end_offset = format.field_end_offset(tx_format,
+                                                PacketFormat.FormatField.checksum)
+
+    def frame(self, data):
+        """Return the packet to be sent with the given data.
+
+        Data must include the format fields placed between the start and
+        end bytes (e.g.: packet number, length or checksum placeholder). The
+        checksum is filled and the data stuffed if the packet format says so.
+        """
+        packet = self.tx_prefix + data
+        start = len(self.tx_prefix)
+        if self.tx_checksum:
+            self.tx_checksum.fill(packet, start, len(packet) - self.tx_checksum_end_offset)
+        if self.stuffed_dle:
+            packet[start:] = packet[start:].replace(self.dle, self.stuffed_dle)
+        packet += self.tx_suffix
+        return packet
+
+    def feed(self, data, max_packets=0):
+        """Append received data and return the list of complete packets.
+
+        See extract for the returned packets.
+        """
+        self.append(data)
+        return self.extract(max_packets)
+
+    def append(self, data):
+        """Append received data, without looking for packets in it."""
+        self._reserve(len(data))
+        buf = self.buffer
+        buf.writable(len(data))[:] = data
+        buf.commit(len(data))
+        if self.tap:
+            self.tap(buf.view[buf.tail - len(data):buf.tail])
+
+    def fill(self, read_into, size):
+        """Receive up to size bytes directly into the buffer.
+
+        The read_into function gets a writable memoryview and returns the
+        number of bytes written into it (or None if there is no data, as
+        non-blocking sockets). Returns that number of bytes.
+        """
+        self._reserve(size)
+        buf = self.buffer
+        received = read_into(buf.writable(size))
+        if received:
+            buf.commit(received)
+            if self.tap:
+                self.tap(buf.view[buf.tail - received:buf.tail])
+        return received
+
+    def extract(self, max_packets=0):
+        """Return the list of complete packets in the buffered data.
+
+        Packets are returned without their start and end marks, as views of
+        the receive buffer that are only valid until more data is received
+        (copy them to keep them). Data after the last packet found is kept
+        and used when more data is received. Each byte is checked only once
+        for each mark.
+
+        If max_packets is given, at most that number of packets is returned
+        and the remaining data is kept for the next call.
+        """
+        buf = self.buffer
+
+        packets = []
+        while not max_packets or len(packets) < max_packets:
+            if self.packet_start < 0 and not self.find_packet_start():
+                break
+
+            end = self.find_packet_end()
+            if end is None:
+                if self.packet_start < 0:
+                    # packet discarded, look for the next one
+                    continue
+                if self.max_buffered_size and \
+                        buf.tail - self.packet_start > self.max_buffered_size:
+                    # packet end lost, jump to the next packet start
+                    self.discard_packet()
+                    continue
+                break
+
+            packet_end, next_start = end
+            if (self.stuffed_dle and
+                    buf.data.find(self.stuffed_dle, self.packet_start, packet_end) >= 0):
+                # un-escape the doubled DLE bytes, in a new bytearray. It is
+                # checked after the start mark, as the checksum may include it
+                packet = buf.data[self.packet_start:packet_end].replace(self.stuffed_dle,
+                                                                        self.dle)
+                data, packet_start = self.start_bytes + packet, len(self.start_bytes)
+            else:
+                packet = buf.view[self.packet_start:packet_end]
+                data, packet_start = buf.data, self.packet_start
+
+            if self.checksum and not self.checksum.check(data, packet_start,
+                                        packet_start + len(packet) - self.checksum_end_offset):
+                # corrupted packet, look for the next one
+                self.rejected += 1
+                self.discard_packet()
+                continue
+
+            self.accepted += 1
+            packets.append(packet)
+
+            # prepare for the next packet, consumed space is reclaimed
+            buf.head = self.search_index = next_start
+            self.packet_start = -1
+
+        return packets
+
+    def extract_records(self, max_records=0):
+        """Return all the complete records in the buffered data (record mode).
+
+        The records are returned together, as a view of the receive buffer
+        that is only valid until more data is received (copy it to keep it).
+        The partial record after them is kept and used when more data is
+        received. If max_records is given, at most that number of records
+        is returned.
+        """
+        buf = self.buffer
+        if self.packet_start >= 0:
+            # a packet search was left by extract, records restart from it
+            buf.head = self.packet_start
+            self.packet_start = -1
+        count = (buf.tail - buf.head) // self.record_size
+        if max_records:
+            count = min(count, max_records)
+        start = buf.head
+        buf.head = self.search_index = start + count * self.record_size
+        self.accepted += count
+        return buf.view[start:buf.head]
+
+    def unframe(self, data):
+        """Return the packet in data, which holds a whole frame (e.g.: a datagram).
+
+        data is a bytearray or a memoryview of one (e.g.: of a receive
+        buffer). The packet is returned as extract does (a bytearray without
+        its marks and with DLE bytes un-escaped), or None if data is not a
+        valid frame: wrong marks, too big or wrong checksum. It is counted as
+        accepted or rejected.
+        """
+        start = len(self.start_bytes)
+        end = len(data) - len(self.end_bytes)
+        if (end < start or data[:start] != self.start_bytes or
+                data[end:] != self.end_bytes or
+                (self.max_packet_size and len(data) - start > self.max_packet_size)):
+            self.rejected += 1
+            return None
+
+        packet = data[start:end]
+        if not isinstance(packet, bytearray):
+            # the only copy of the frame, owned by the caller
+            packet = bytearray(packet)
+        if self.stuffed_dle and packet.find(self.stuffed_dle) >= 0:
+            packet = packet.replace(self.stuffed_dle, self.dle)
+        if self.checksum:
+            # the checksum may include part of the start mark (negative
+            # checksum offset)
+            checked, packet_start = packet, 0
+            if self.checksum.offset < 0:
+                checked, packet_start = self.start_bytes + packet, start
+            if not self.checksum.check(checked, packet_start,
+                                       packet_start + len(packet) - self.checksum_end_offset):
+                self.rejected += 1
+                return None
+
+        self.accepted += 1
+        return packet
+
+    def discard_packet(self):
+        """Discard the current packet start and look for a new one after it."""
+        next_start = self.packet_start
+        if not self.start_bytes:
+            # without start mark, move at least one byte forward
+            next_start += 1
+        self.resyncs += 1
+        self.discard(next_start)
+        self.packet_start = -1
+
+    def discard(self, position):
+        """Discard the buffered data before position, already checked."""
+        self.discarded_bytes += position - self.buffer.head
+        self.buffer.head = self.search_index = position
+
+    def reset(self):
+        """Discard all buffered data and wait for a new packet start."""
+        self.buffer.head = self.buffer.tail = 0
+        self.search_index = 0
+        self.packet_start = -1
+
+    def _reserve(self, size):
+        shift = self.buffer.reserve(size)
+        if shift:
+            self.search_index -= shift
+            if self.packet_start >= 0:
+                self.packet_start -= shift
+
+    def find_packet_start_any(self):
+        """Find a new packet start in the buffered data.
+
+        This is the default function for a new packet start. As it has no info
+        about packet format it just uses the buffered data as the beggining
+        of a new packet.
+
+        See also: find_packet_start_mark
+        """
+        self.packet_start = self.search_index = self.buffer.head
+        return True
+
+    def find_packet_start_mark(self):
+        """Find a new packet start in the buffered data, using a start mark.
+
+        Search for packet start bytes marker in buffered data and, if found,
+        set the beginning of a new packet just after it. Otherwise, discard
+        the data checked except the bytes that may contain part of the mark.
+
+        See also: find_packet_start_any
+        """
+        buf = self.buffer
+        i = buf.data.find(self.start_bytes, self.search_index, buf.tail)
+        if i < 0:
+            # start was not found, keep data that may contain part of the mark
+            self.discard(max(self.search_index, buf.tail - len(self.start_bytes) + 1))
+            return False
+
+        self.discard(i)
+        self.packet_start = self.search_index = i + len(self.start_bytes)
+        return True
+
+    def find_packet_start_dle(self):
+        """Find a new packet start in the buffered data, with DLE stuffing.
+
+        The start mark is a DLE byte not followed by another DLE (a stuffed
+        data byte) or by the last end byte (the end of a packet, e.g.: ETX).
+
+        See also: find_packet_start_mark, find_packet_end_dle
+        """
+        buf = self.buffer
+        data = buf.data
+        dle = self.dle[0]
+        etx = self.end_bytes[-1]
+        i = data.find(self.dle, self.search_index, buf.tail)
+        while i >= 0:
+            if i + 1 >= buf.tail:
+                # wait for the next byte, keeping the DLE
+                self.discard(i)
+                return False
+            if data[i + 1] != dle and data[i + 1] != etx:
+                self.discard(i)
+                self.packet_start = self.search_index = i + 1
+                return True
+            # skip the escaped pair
+            i = data.find(self.dle, i + 2, buf.tail)
+
+        self.discard(buf.tail)
+        return False
+
+    def find_packet_end_size(self):
+        """Find current packet end, using a fixed packet size.
+
+        This is the default function for packet end search. As it has no info
+        about packet format it just tries to get a fixed length of data bytes.
+
+        Returns a tuple with the packet end and the next packet start
+        positions in the buffer, or None if the packet is not complete.
+
+        See also: find_packet_end_mark, find_packet_end_len,
+                        find_packet_end_next_start
+        """
+        end = self.packet_start + self.packet_size
+        if self.buffer.tail >= end:
+            return end, end
+        return None
+
+    def find_packet_end_mark(self):
+        """Find current packet end, using end bytes mark.
+
+        Search for packet end bytes mark in the current packet data, starting
+        where the previous search stopped.
+
+        See also: find_packet_end_size
+        """
+        buf = self.buffer
+        i = buf.data.find(self.end_bytes, self.search_index, buf.tail)
+        if i < 0:
+            self.search_index = max(self.search_index,
+                                    buf.tail - len(self.end_bytes) + 1)
+            return None
+        return i, i + len(self.end_bytes)
+
+    def find_packet_end_dle(self):
+        """Find current packet end, using end bytes mark with DLE stuffing.
+
+        Search for packet end bytes mark in the current packet data, as in
+        find_packet_end_mark, but skip the marks whose DLE is escaped: an
+        end mark is only valid if it is preceded by an even number of DLEs.
+
+        See also: find_packet_end_mark, find_packet_start_dle
+        """
+        buf = self.buffer
+        data = buf.data
+        dle = self.dle[0]
+        i = data.find(self.end_bytes, self.search_index, buf.tail)
+        while i >= 0:
+            j = i
+            while j > self.packet_start and data[j - 1] == dle:
+                j -= 1
+            if (i - j) % 2 == 0:
+                return i, i + len(self.end_bytes)
+            i = data.find(self.end_bytes, i + 1, buf.tail)
+
+        self.search_index = max(self.search_index,
+                                buf.tail - len(self.end_bytes) + 1)
+        return None
+
+    def find_packet_end_next_start(self):
+        """Find current packet end, using next packet start bytes mark.
+
+        Search for next packet start bytes mark in the current packet data,
+        starting where the previous search stopped. The mark is kept in the
+        buffer as the start of the next packet.
+
+        Note that this method will lock the system when the instrument sends
+        a single packet and waits for the next command, as then there will not
+        be any packet after the current one to be detected. In this case, it
+        would be better to use find_packet_end_next_start_or_len method.
+
+        See also: find_packet_end_size, find_packet_end_next_start_or_len
+        """
+        buf = self.buffer
+        i = buf.data.find(self.start_bytes, self.search_index, buf.tail)
+        if i < 0:
+            self.search_index = max(self.search_index,
+                                    buf.tail - len(self.start_bytes) + 1)
+            return None
+        return i, i
+
+    def find_packet_end_len(self):
+        """Find current packet end, using its length.
+
+        Get expected packet length from the instrument information, using the
+        current packet first byte as the packet number.
+
+        If the packet number is not in the instrument's packet list, but there
+        is only one packet defined, use its lenght. In other cases, use the
+        current data as a new package and wait for the next one.
+
+        Note that this method may lock the system when it is waiting for a
+        reply but some bytes are lost and the instrument does not send more
+        data. If packet format includes start bytes, it would be better to use
+        find_packet_end_next_start_or_len method.
+
+        See also: find_packet_end_size, find_packet_end_next_start_or_len
+        """
+        buf = self.buffer
+        if buf.tail <= self.packet_start + self.packet_num_offset:
+            return None
+
+        # In case of having only a packet defined, its length is in every
+        # position of the table, even if there is no packet number
+        packet_len = self.packet_lengths[buf.data[self.packet_start + self.packet_num_offset]]
+        if not packet_len:
+            # Packet number not in list of known packets, use the unidentified
+            # packet and hope that the next packet will be recognized
+            return buf.tail, buf.tail
+
+        end = self.packet_start + packet_len
+        if buf.tail >= end:
+            return end, end
+        return None
+
+    def find_packet_end_length(self):
+        """Find current packet end, using the length field of the packet.
+
+        Read the length field at its position in the packet and jump
+        straight to the packet end. If the packet format has end bytes,
+        check that they are found there; if not, the length is wrong and the
+        packet is discarded.
+
+        The length field value is the size of the packet fields, without
+        the format fields (e.g.: packet number or checksum).
+
+        See also: find_packet_end_size, find_packet_end_len
+        """
+        buf = self.buffer
+        start = self.packet_start
+        if buf.tail < start + self.header_size:
+            return None
+
+        length = self.length_struct.unpack_from(buf.data, start + self.length_offset)[0]
+        end = start + self.header_size + length + self.trailer_size
+        end_len = len(self.end_bytes)
+        if self.max_packet_size and end + end_len - start > self.max_packet_size:
+            # corrupted length, do not wait for the packet end
+            self.discard_packet()
+            return None
+        if buf.tail < end + end_len:
+            return None
+
+        if end_len and not buf.data.startswith(self.end_bytes, end):
+            # corrupted packet or wrong length
+            self.discard_packet()
+            return None
+        return end, end + end_len
+
+    def find_packet_end_next_start_or_len(self):
+        """Find current packet end, using start bytes mark or the length.
+
+        Check if there is a new packet in the current data, first searching
+        for next packet start bytes and, if it is not found, using the packet
+        length if the packet number is known.
+
+        See also: find_packet_end_size, find_packet_end_next_start,
+                        find_packet_end_len
+        """
+        end = self.find_packet_end_next_start()
+        if end is None:
+            end = self.find_packet_end_len()
+        return end
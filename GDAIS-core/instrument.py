@@ -118,6 +118,8 @@ class ConnectionCfg(object):
         file = "File"
         serial = "Serial"
         tcp = "TCP"
+        udp = "UDP"
+        unix = "Unix"
 
     @staticmethod
     def create(conn=None, *args, **kwds):
@@ -136,7 +138,9 @@ class ConnectionCfg(object):
                 connection = {
                     ConnectionCfg.Type.file:     FileConnectionCfg,
                     ConnectionCfg.Type.serial: SerialConnectionCfg,
-                    ConnectionCfg.Type.tcp:    TCPConnectionCfg
+                    ConnectionCfg.Type.tcp:    TCPConnectionCfg, 
+                    ConnectionCfg.Type.udp:    UDPConnectionCfg, 
+                    ConnectionCfg.Type.unix:   UnixConnectionCfg
                 }.get(conn_type, None)
                 
                 if not connection:
@@ -148,29 +152,73 @@ class ConnectionCfg(object):
         
         return connection(conn, *args, **kwds)
     
+    # Reception options common to all connection types and their defaults
+    OPTIONS = {
+        'read_size': 0,     # bytes read at once, 0 reads all the available data
+        'max_frames': 0,    # packets handled on each data arrival, 0 for no limit
+        'batch_size': 0,    # packets delivered together, 0 delivers each on its own
+        'batch_latency': 0, # ms a packet may wait for its batch, 0 for no wait
+        'fused_parsing': False, # parse the packets in the connection thread
+        'capture': False    # record the raw data received to a capture file
+    }
+    
     def __init__(self, conn=None):
         # ConnectionCfg can't be initialized, use factory method create()
         raise NotImplementedError
+    
+    def load_options(self, conn):
+        for name, default in self.OPTIONS.iteritems():
+            if conn and type(conn) is dict:
+                setattr(self, name, conn.get(name, default))
+            else:
+                setattr(self, name, default)
+    
+    def dump_options(self, conn):
+        for name in self.OPTIONS:
+            conn[name] = getattr(self, name)
+        return conn
 
 
 class FileConnectionCfg(ConnectionCfg):
     
+    # Replay modes of the input file
+    class ReplayMode:
+        stream = ''     # read in blocks, as data from a device
+        fast = 'fast'   # memory-mapped and framed in bulk, as fast as possible
+        paced = 'paced' # at the original pace (capture times or baud rate)
+    
+    # Default baud rate of paced replays of files without receive times
+    DEFAULT_REPLAY_BAUDRATE = 9600
+    
     def __init__(self, conn):
         self.type = ConnectionCfg.Type.file
         if conn and type(conn) is dict:
             self.filename = conn['filename']
+            self.replay = conn.get('replay', self.ReplayMode.stream)
+            self.replay_baudrate = conn.get('replay_baudrate', self.DEFAULT_REPLAY_BAUDRATE)
+            self.replay_speed = conn.get('replay_speed', 1.0)
         else:
             self.filename = ''
+            self.replay = self.ReplayMode.stream
+            self.replay_baudrate = self.DEFAULT_REPLAY_BAUDRATE
+            self.replay_speed = 1.0
+        self.load_options(conn)
     
     def dump(self):
-        return {
+        return self.dump_options({
                 'type': self.type, 
-                'filename': self.filename
-            }
+                'filename': self.filename, 
+                'replay': self.replay, 
+                'replay_baudrate': self.replay_baudrate, 
+                'replay_speed': self.replay_speed
+            })
 
 
 class SerialConnectionCfg(ConnectionCfg):
     
+    # Default VMIN, the reader is woken up as soon as a byte arrives
+    DEFAULT_VMIN = 1
+    
     def __init__(self, conn):
         self.type = ConnectionCfg.Type.serial
         if conn and type(conn) is dict:
@@ -179,6 +227,11 @@ class SerialConnectionCfg(ConnectionCfg):
             self.data_bits = conn['data_bits']
             self.parity = conn['parity']
             self.stop_bits = conn['stop_bits']
+            # input latency: termios VMIN (bytes) and VTIME (tenths of second)
+            # and kernel low latency mode (see serialport module)
+            self.vmin = conn.get('vmin', self.DEFAULT_VMIN)
+            self.vtime = conn.get('vtime', 0)
+            self.low_latency = conn.get('low_latency', False)
         else:
             # load defaults
             self.serial_port = "/dev/ttyS0"
@@ -186,36 +239,130 @@ class SerialConnectionCfg(ConnectionCfg):
             self.data_bits = 8
             self.parity = 'N'
             self.stop_bits = 1
+            self.vmin = self.DEFAULT_VMIN
+            self.vtime = 0
+            self.low_latency = False
+        self.load_options(conn)
     
     def dump(self):
-            return {
+            return self.dump_options({
                     'type': self.type, 
                     'port': self.serial_port, 
                     'baudrate': self.baudrate, 
                     'data_bits': self.data_bits, 
                     'parity': self.parity, 
-                    'stop_bits': self.stop_bits
-                }
+                    'stop_bits': self.stop_bits, 
+                    'vmin': self.vmin, 
+                    'vtime': self.vtime, 
+                    'low_latency': self.low_latency
+                })
 
 
 class TCPConnectionCfg(ConnectionCfg):
     
+    # Default reconnection policy: consecutive attempts (0 disables it), delay
+    # before the first one and maximum delay (seconds), doubled on each attempt
+    DEFAULT_RECONNECT_ATTEMPTS = 10
+    DEFAULT_RECONNECT_DELAY = 0.5
+    DEFAULT_RECONNECT_MAX_DELAY = 30.0
+    
     def __init__(self, conn):
         self.type = ConnectionCfg.Type.tcp
         if conn and type(conn) is dict:
             self.tcp_host = conn['host']
             self.tcp_port = conn['port']
+            self.reconnect_attempts = conn.get('reconnect_attempts', self.DEFAULT_RECONNECT_ATTEMPTS)
+            self.reconnect_delay = conn.get('reconnect_delay', self.DEFAULT_RECONNECT_DELAY)
+            self.reconnect_max_delay = conn.get('reconnect_max_delay',
+                                                self.DEFAULT_RECONNECT_MAX_DELAY)
         else:
             # load defaults
             self.tcp_host = "localhost"
             self.tcp_port = 80
+            self.reconnect_attempts = self.DEFAULT_RECONNECT_ATTEMPTS
+            self.reconnect_delay = self.DEFAULT_RECONNECT_DELAY
+            self.reconnect_max_delay = self.DEFAULT_RECONNECT_MAX_DELAY
+        self.load_options(conn)
 
     def dump(self):
-            return {
+            return self.dump_options({
                     'type': self.type, 
                     'host': self.tcp_host, 
-                    'port': self.tcp_port
-                }
+                    'port': self.tcp_port, 
+                    'reconnect_attempts': self.reconnect_attempts, 
+                    'reconnect_delay': self.reconnect_delay, 
+                    'reconnect_max_delay': self.reconnect_max_delay
+                })
+
+
+class UDPConnectionCfg(ConnectionCfg):
+    
+    def __init__(self, conn):
+        self.type = ConnectionCfg.Type.udp
+        if conn and type(conn) is dict:
+            # local address where the datagrams are received
+            self.udp_host = conn['host']
+            self.udp_port = conn['port']
+            # address where commands are sent (empty host: the sender of
+            # the last datagram received)
+            self.udp_remote_host = conn.get('remote_host', '')
+            self.udp_remote_port = conn.get('remote_port', 0)
+            # size of the sequence counter before the frame in each datagram
+            # (0 if datagrams have no sequence counter)
+            self.sequence_size = conn.get('sequence_size', 0)
+        else:
+            # load defaults
+            self.udp_host = "0.0.0.0"
+            self.udp_port = 5000
+            self.udp_remote_host = ''
+            self.udp_remote_port = 0
+            self.sequence_size = 0
+        self.load_options(conn)
+
+    def dump(self):
+            return self.dump_options({
+                    'type': self.type, 
+                    'host': self.udp_host, 
+                    'port': self.udp_port, 
+                    'remote_host': self.udp_remote_host, 
+                    'remote_port': self.udp_remote_port, 
+                    'sequence_size': self.sequence_size
+                })
+
+
+class UnixConnectionCfg(ConnectionCfg):
+    
+    # Socket types
+    class SocketType:
+        stream = "stream"       # connected to the path where the producer listens
+        datagram = "datagram"   # bound to the path, a frame in each datagram
+    
+    def __init__(self, conn):
+        self.type = ConnectionCfg.Type.unix
+        if conn and type(conn) is dict:
+            self.socket_path = conn['path']
+            self.socket_type = conn.get('socket_type', self.SocketType.stream)
+            # datagram sockets: path where commands are sent (empty: the
+            # sender of the last datagram received, if bound) and size of
+            # the sequence counter before the frame in each datagram
+            self.remote_path = conn.get('remote_path', '')
+            self.sequence_size = conn.get('sequence_size', 0)
+        else:
+            # load defaults
+            self.socket_path = "/tmp/gdais.sock"
+            self.socket_type = self.SocketType.stream
+            self.remote_path = ''
+            self.sequence_size = 0
+        self.load_options(conn)
+
+    def dump(self):
+            return self.dump_options({
+                    'type': self.type, 
+                    'path': self.socket_path, 
+                    'socket_type': self.socket_type, 
+                    'remote_path': self.remote_path, 
+                    'sequence_size': self.sequence_size
+                })
 
 
 class PacketFormat(object):
@@ -230,25 +377,116 @@ class PacketFormat(object):
         checksum = 'Checksum'
         end_bytes = 'End bytes'
     
+    # Checksum algorithms
+    class ChecksumType:
+        none = ''
+        sum8 = 'sum8'
+        xor8 = 'xor8'
+        crc16 = 'crc16'
+        crc32 = 'crc32'
+    
+    # Byte stuffing schemes
+    class ByteStuffing:
+        none = ''
+        dle = 'DLE' # start byte doubled inside the packet (e.g.: Trimble TSIP)
+    
+    # Size (bytes) of the checksum field, by checksum type
+    CHECKSUM_SIZE = {
+                        ChecksumType.sum8: 1, 
+                        ChecksumType.xor8: 1, 
+                        ChecksumType.crc16: 2, 
+                        ChecksumType.crc32: 4
+                    }
+    
+    # Struct codes of the unsigned integer format fields, by size
+    SIZE_CODES = {
+                    1: 'B', 
+                    2: 'H', 
+                    4: 'I'
+                }
+    
+    # Default size (bytes) of the length and checksum fields
+    DEFAULT_LENGTH_SIZE = 1
+    DEFAULT_CHECKSUM_SIZE = 1
+    
     def __init__(self,  packet_format=None):
         if packet_format:
             self.rx_format = packet_format['rx_format']
             self.tx_format = packet_format['tx_format']
             self.start_bytes = packet_format['start_bytes']
             self.end_bytes = packet_format['end_bytes']
+            self.length_size = packet_format.get('length_size', self.DEFAULT_LENGTH_SIZE)
+            self.checksum_type = packet_format.get('checksum_type', self.ChecksumType.none)
+            self.checksum_offset = packet_format.get('checksum_offset', 0)
+            self.checksum_size = packet_format.get('checksum_size',
+                    self.CHECKSUM_SIZE.get(self.checksum_type, self.DEFAULT_CHECKSUM_SIZE))
+            self.byte_stuffing = packet_format.get('byte_stuffing', self.ByteStuffing.none)
+            self.max_packet_size = packet_format.get('max_packet_size', 0)
         else:
             self.rx_format = []
             self.tx_format = []
             self.start_bytes = []
             self.end_bytes = []
+            self.length_size = self.DEFAULT_LENGTH_SIZE
+            self.checksum_type = self.ChecksumType.none
+            self.checksum_offset = 0
+            self.checksum_size = self.DEFAULT_CHECKSUM_SIZE
+            self.byte_stuffing = self.ByteStuffing.none
+            self.max_packet_size = 0
     
     def dump(self):
         return {
                     'rx_format': self.rx_format, 
                     'tx_format': self.tx_format, 
                     'start_bytes': self.start_bytes, 
-                    'end_bytes': self.end_bytes
+                    'end_bytes': self.end_bytes, 
+                    'length_size': self.length_size, 
+                    'checksum_type': self.checksum_type, 
+                    'checksum_offset': self.checksum_offset, 
+                    'checksum_size': self.checksum_size, 
+                    'byte_stuffing': self.byte_stuffing, 
+                    'max_packet_size': self.max_packet_size
                 }
+    
+    def field_size(self, field):
+        """Size (bytes) of a format field inside the packet data.
+        
+        Start and end bytes are not part of the packet data (they are removed
+        by the connection) and the size of the packet fields depends on the
+        packet, so their size is 0.
+        """
+        return {
+                    self.FormatField.packet_num: 1, 
+                    self.FormatField.length: self.length_size, 
+                    self.FormatField.checksum: self.checksum_size
+                }.get(field, 0)
+    
+    def field_offset(self, format, field):
+        """Position of a format field placed before the packet fields."""
+        offset = 0
+        for f in format:
+            if f == field:
+                return offset
+            offset += self.field_size(f)
+        raise ValueError("'{0}' not in packet format".format(field))
+    
+    def field_end_offset(self, format, field):
+        """Bytes from a format field placed after the packet fields to the packet end."""
+        i = format.index(field)
+        return sum(self.field_size(f) for f in format[i:])
+    
+    def header_size(self, format):
+        """Size (bytes) of the format fields placed before the packet fields."""
+        if self.FormatField.packet_fields in format:
+            return self.field_offset(format, self.FormatField.packet_fields)
+        return sum(self.field_size(f) for f in format)
+    
+    def trailer_size(self, format):
+        """Size (bytes) of the format fields placed after the packet fields."""
+        if self.FormatField.packet_fields in format:
+            i = format.index(self.FormatField.packet_fields)
+            return sum(self.field_size(f) for f in format[i + 1:])
+        return 0
 
 
 class Packet(object):
@@ -262,6 +500,7 @@ class Packet(object):
             self.name = packet['name']
             if 'fields' in packet:
                 self.fields = [Field(**f) for f in packet['fields']]
+                self.check_count_fields()
     
     def dump(self):
         fields = []
@@ -282,31 +521,164 @@ class Packet(object):
             if f.name != Field.EMPTY_FIELD:
                 types.append(f.type_desc())
         return types
+    
+    def has_arrays(self):
+        """Whether some field of the packet is an array."""
+        return any(f.is_array() for f in self.fields)
+    
+    def is_variable(self):
+        """Whether some array of the packet has a variable length (count_field)."""
+        return any(f.count_field for f in self.fields)
+    
+    def check_count_fields(self):
+        """Check the count fields of the variable length arrays.
+        
+        They have to be scalar integer fields placed before the array.
+        Raises WrongCountFieldError otherwise.
+        """
+        previous = {}
+        for f in self.fields:
+            if f.count_field:
+                count_field = previous.get(f.count_field)
+                if (not count_field or count_field.is_array() or
+                        dtype(str(count_field.type)).kind not in 'iu'):
+                    raise WrongCountFieldError(f.name, f.count_field)
+            previous[f.name] = f
+    
+    def structured_dtype(self, byte_order_char=''):
+        """NumPy structured dtype of the packet fields data (see types()).
+        
+        Empty fields are skipped using the offsets of the other fields, so
+        its item size is the size of the whole packet fields data. Array
+        fields are sub-arrays, with their maximum length if it is variable.
+        """
+        names, formats, offsets = [], [], []
+        offset = 0
+        for f in self.fields:
+            field_type = f.element_dtype(byte_order_char)
+            if f.name != Field.EMPTY_FIELD:
+                names.append(f.type_desc()[0])
+                if f.is_array():
+                    formats.append(dtype((field_type, (f.count, ))))
+                else:
+                    formats.append(field_type)
+                offsets.append(offset)
+            offset += field_type.itemsize * f.count
+        return dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                      'itemsize': offset})
+    
+    def field_layout(self, byte_order_char=''):
+        """Layout of the packet fields, to decode them one after the other.
+        
+        Returns a list with a tuple for each field: its name in the
+        structured dtype (None for empty fields), its element dtype, its
+        number of elements (None for scalars) and the name of the field
+        with its length (None if it is not variable).
+        """
+        names = dict((f.name, f.type_desc()[0]) for f in self.fields)
+        layout = []
+        for f in self.fields:
+            name = f.type_desc()[0] if f.name != Field.EMPTY_FIELD else None
+            count = f.count if f.is_array() else None
+            layout.append((name, f.element_dtype(byte_order_char), count,
+                           names.get(f.count_field)))
+        return layout
 
 class Field(object):
     
     EMPTY_FIELD = "EMPTY_FIELD"
     
-    def __init__(self,  name,  type):
+    def __init__(self,  name,  type, count=1, count_field=None):
         self.name = name
         self.type = type
+        
+        # number of elements of array fields (1 for scalars). If the length
+        # of the array is the value of a previous field (count_field), it is
+        # the maximum number of elements
+        self.count = count
+        self.count_field = count_field
+    
+    @staticmethod
+    def from_text(name, type_text):
+        """Create a field from its type as shown by type_text()."""
+        type_text = type_text.strip()
+        if not type_text.endswith(']'):
+            return Field(name, type_text)
+        
+        type, count = type_text[:-1].split('[', 1)
+        count_field = None
+        if ',' in count:
+            count_field, count = count.rsplit(',', 1)
+            count_field = count_field.strip()
+        return Field(name, type.strip(), int(count), count_field)
     
     def dump(self):
-        return {
+        field = {
                     'name': self.name,
                     'type': self.type
                 }
+        if self.is_array():
+            field['count'] = self.count
+        if self.count_field:
+            field['count_field'] = self.count_field
+        return field
+    
+    def is_array(self):
+        return self.count != 1 or bool(self.count_field)
+    
+    def element_dtype(self, byte_order_char=''):
+        """NumPy dtype of the field, or of its elements if it is an array."""
+        field_type = dtype(str(self.type))
+        if byte_order_char:
+            field_type = field_type.newbyteorder(byte_order_char)
+        return field_type
     
     def struct_format(self):
+        field_type = dtype(str(self.type))
         if self.name == self.EMPTY_FIELD:
-            return str(dtype(str(self.type)).itemsize) + 'x'
+            return str(field_type.itemsize * self.count) + 'x'
+        elif self.is_array():
+            return str(self.count) + field_type.char
         else:
-            return dtype(str(self.type)).char
+            return field_type.char
     
     def type_desc(self):
-        return (str(self.name.lower().replace(' ','_')), str(self.type))
+        name = str(self.name.lower().replace(' ','_'))
+        if self.is_array():
+            return (name, str(self.type), (self.count, ))
+        return (name, str(self.type))
+    
+    def type_text(self):
+        """Type of the field as shown by the instrument editor.
+        
+        Arrays are shown as 'int16[256]', and variable length arrays with
+        the field giving their length as 'int16[Samples, 256]'.
+        """
+        if self.count_field:
+            return "{0}[{1}, {2}]".format(self.type, self.count_field, self.count)
+        if self.is_array():
+            return "{0}[{1}]".format(self.type, self.count)
+        return self.type
 
 
+class WrongCountFieldError(Exception):
+    """
+    Exception raised when the length of an array is given by a wrong field.
+    
+    Attributes:
+        field_name -- name of the array field
+        count_field -- name of the field giving its length
+    """
+    
+    def __init__(self, field_name, count_field):
+        self.field_name = field_name
+        self.count_field = count_field
+    
+    def __str__(self):
+        txt = "The length of array '{0}' can not be given by field '{1}', it must be " \
+              "a previous integer field"
+        return txt.format(self.field_name, self.count_field)
+
 class WrongPacketTypeError(Exception):
     """
     Exception raised when an unknown packet type is provided.
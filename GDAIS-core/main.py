@@ -9,8 +9,10 @@ import re
 import os
 import sys
 
-from connection import Connection
-from equipment import Equipment, InstrumentConfig, Command
+from codec import format_values
+from connection import Connection, ReactorConnection, ReactorThread, SharedLink
+from equipment import Equipment, InstrumentConfig, Command, LinkNotFoundError
+from instrument import WrongCountFieldError
 from parser import Parser, ParsedPacket
 from recorder import Recorder
 
@@ -32,6 +34,8 @@ class GDAIS(QCoreApplication):
         parser.add_argument('--no-http-logging', action='store_false', default=True,
                                             dest='http_logging',
                                             help='Log messages to GDAIS-control HTTP server')
+        parser.add_argument('--reactor', action='store_true', default=False, dest='reactor',
+                                            help='Handle all instrument connections in a single I/O thread')
         
         args = parser.parse_args()
         self.equipment_file = os.path.abspath(args.equipment)
@@ -66,10 +70,18 @@ class GDAIS(QCoreApplication):
         # lists to store instrument controller and initialization threads
         self.instrument_init_controllers = []
         self.instrument_controllers = []
+        
+        # links shared by several instruments, by name
+        self.links = {}
 
         # create data recorder thread
         self.recorder = Recorder()
         
+        # I/O reactor thread shared by all instrument connections, if used
+        self.reactor_thread = None
+        if args.reactor:
+            self.reactor_thread = ReactorThread()
+        
         # whether exit sequence has started
         self.exiting = False
         
@@ -87,7 +99,7 @@ class GDAIS(QCoreApplication):
         self.log.debug("Equipment file: '{0}'".format(self.equipment_file))
         try:
             equipment = Equipment(self.equipment_file)
-        except IOError:
+        except (IOError, LinkNotFoundError, WrongCountFieldError):
             self.log.exception("Couldn't load equipment file")
             QTimer.singleShot(0, self.quit) # exit GDAIS
             return
@@ -111,10 +123,35 @@ class GDAIS(QCoreApplication):
         # start data recorder thread
         self.recorder.begin(equipment)
         
+        # start I/O reactor thread
+        reactor = None
+        if self.reactor_thread:
+            self.log.info("Using a single I/O reactor thread for all instruments")
+            reactor = self.reactor_thread.reactor
+            self.reactor_thread.start()
+        
+        # open the links shared by several instruments
+        for name, link_cfg in equipment.links.iteritems():
+            instr_cfgs = equipment.get_link_instrument_configs(name)
+            if instr_cfgs:
+                try:
+                    link = SharedLink(link_cfg, instr_cfgs, reactor)
+                except ValueError:
+                    self.log.exception("Couldn't create shared link")
+                    QTimer.singleShot(0, self.quit) # exit GDAIS
+                    return
+                link.error_occurred.connect(self.quit)
+                self.links[name] = link
+                link.begin()
+        
         for instrument_config in equipment.instruments:
+                # link used by the instrument, if shared with other instruments
+                link = self.links.get(instrument_config.link)
+                
                 # create instrument controller thread
-                instr_ctrl = InstrumentController.create(instrument_config)
+                instr_ctrl = InstrumentController.create(instrument_config, reactor, link)
                 instr_ctrl.new_packet.connect(self.recorder.on_new_packet)
+                instr_ctrl.new_packets.connect(self.recorder.on_new_packets)
                 instr_ctrl.error_ocurred.connect(self.quit)
                 
                 # store the instrument controller instance
@@ -122,7 +159,7 @@ class GDAIS(QCoreApplication):
 
                 # initialize instrument if needed
                 if instrument_config.init_commands:
-                    instr_init = InstrumentInitialization(instrument_config)
+                    instr_init = InstrumentInitialization(instrument_config, reactor, link)
                     instr_init.initialization_finished.connect(instr_ctrl.begin)
                     instr_init.error_ocurred.connect(self.quit)
                 
@@ -146,16 +183,26 @@ class GDAIS(QCoreApplication):
 
             # finish all running instrument initialization threads
             for init_ctrl in self.instrument_init_controllers:
-                if init_ctrl.isRunning():
+                if init_ctrl.is_active():
                     init_ctrl.quit()
                     init_ctrl.wait()
             
             # finish all running instrument controller threads
             for instr_ctrl in self.instrument_controllers:
-                if instr_ctrl.isRunning():
+                if instr_ctrl.is_active():
                     instr_ctrl.quit()
                     instr_ctrl.wait()
             
+            # finish the shared links, once their instruments have finished
+            for link in self.links.itervalues():
+                link.quit()
+            
+            # finish the I/O reactor thread, after closing its connections
+            if self.reactor_thread and self.reactor_thread.isRunning():
+                self.log.debug("Closing I/O reactor...")
+                self.reactor_thread.quit()
+                self.reactor_thread.wait()
+            
             # finish the data recorder thread if running
             if self.recorder.isRunning():
                 self.log.debug("Closing data recorder...")
@@ -308,6 +355,9 @@ class InstrumentController(QThread):
 
     # Signal for new packet received event
     new_packet = pyqtSignal(ParsedPacket)
+    
+    # Signal for new batch of packets received event (list of PacketBatch)
+    new_packets = pyqtSignal(list)
 
     # Signal for new command ready to send event
     new_command = pyqtSignal(Command)
@@ -330,7 +380,7 @@ class InstrumentController(QThread):
 
         return controller(instrument_config, *args, **kwds)
 
-    def __init__(self, instrument_config):
+    def __init__(self, instrument_config, reactor=None, link=None):
         QThread.__init__(self)
 
         # logging instance
@@ -339,13 +389,31 @@ class InstrumentController(QThread):
         # config of the instrument this controller is connected to
         self.instr_cfg = instrument_config
         
-        self.log.debug("Creating connection and parser...")
+        # I/O reactor shared with the other instruments, if used
+        self.reactor = reactor
+        
+        if reactor:
+            self.log.debug("Creating reactor connection...")
+            
+            # connection run by the reactor thread, which also parses the data
+            self.parser = None
+            if link:
+                self.connection = link.endpoint(instrument_config)
+            else:
+                self.connection = ReactorConnection(reactor)
         
-        # parser thread
-        self.parser = Parser()
+        else:
+            self.log.debug("Creating connection and parser...")
+            
+            # parser thread
+            self.parser = Parser()
 
-        # connection thread
-        self.connection = Connection.create(self.instr_cfg.instrument.connection)
+            # connection thread, or endpoint of the link shared with other
+            # instruments (the link connection thread feeds all of them)
+            if link:
+                self.connection = link.endpoint(instrument_config)
+            else:
+                self.connection = Connection.create(self.instr_cfg.instrument.connection)
         
         # wether quit() has been called, so we are exiting the thread
         self.exiting = False
@@ -354,8 +422,37 @@ class InstrumentController(QThread):
         self.errors = 0
 
     def begin(self):
+        if self.reactor:
+            self.log.info("Preparing reactor connection...")
+            # rx signal (connection -> self), packets of each read together
+            self.connection.new_packets_parsed.connect(self.on_new_packets_parsed)
+            # tx signal (self -> connection)
+            self.new_command.connect(self.connection.send_command)
+            # connection errors
+            self.connection.error_occurred.connect(self.on_error)
+            
+            self.connection.begin(self.instr_cfg.instrument)
+        
+        else:
+            self.begin_threads()
+
+        if self.errors == 0 and not self.exiting:
+            self.log.info("Starting!")
+            if self.reactor:
+                # no thread needed, commands are sent from the current one
+                self.start_operation()
+            else:
+                self.start()
+        else:
+            self.log.info("Not starting as there has been an error")
+
+    def begin_threads(self):
+        # packets may be delivered one by one or in batches, and parsed by the
+        # parser thread or by the connection thread (fused_parsing), depending
+        # on the connection configuration (only one of the signals is emitted)
         self.log.info("Preparing parser...")
-        # rx signal (parser -> self)
+        # rx signals (parser -> self)
+        self.parser.new_packets_parsed.connect(self.on_new_packets_parsed)
         self.parser.new_packet_parsed.connect(self.log_new_packet_parsed)
         self.parser.new_packet_parsed.connect(self.on_new_packet_parsed)
         # tx signal (self -> parser)
@@ -364,8 +461,14 @@ class InstrumentController(QThread):
         self.parser.begin(self.instr_cfg.instrument)
 
         self.log.info("Preparing connection...")
-        # rx signal (connection -> parser)
+        # rx signals (connection -> parser)
+        self.connection.new_frames_received.connect(self.parser.on_new_frames_received)
+        self.connection.new_records_received.connect(self.parser.on_new_records_received)
         self.connection.new_data_received.connect(self.parser.on_new_data_received)
+        # fused rx signals (connection -> self)
+        self.connection.new_packets_parsed.connect(self.on_new_packets_parsed)
+        self.connection.new_packet_parsed.connect(self.log_new_packet_parsed)
+        self.connection.new_packet_parsed.connect(self.on_new_packet_parsed)
         # tx signal (parser -> connection)
         self.parser.new_data_ready.connect(self.connection.send_data)
         # connection errors
@@ -373,22 +476,38 @@ class InstrumentController(QThread):
         
         self.connection.begin(self.instr_cfg.instrument)
 
-        if self.errors == 0 and not self.exiting:
-            self.log.info("Starting!")
-            self.start()
-        else:
-            self.log.info("Not starting as there has been an error")
+    def run(self):
+        self.start_operation()
+        QThread.run(self)
+
+    def start_operation(self):
+        """Start sending the operation commands to the instrument.
+        
+        It is called from the controller thread, or from the thread calling
+        begin when the connection is run by the reactor.
+        """
+        pass
+
+    def is_active(self):
+        """Whether the controller has been started and not finished yet."""
+        if self.reactor:
+            return self.connection.channel is not None and not self.exiting
+        return self.isRunning()
 
     def quit(self):
         if not self.exiting:
             self.exiting = True
             
-            if self.connection.isRunning():
+            if self.reactor:
+                self.log.debug("Closing reactor connection...")
+                self.connection.quit()
+            
+            elif self.connection.isRunning():
                 self.log.debug("Closing connection...")
                 self.connection.quit()
                 self.connection.wait()
             
-            if self.parser.isRunning():
+            if self.parser and self.parser.isRunning():
                 self.log.debug("Closing parser...")
                 self.parser.quit()
                 self.parser.wait()
@@ -403,13 +522,26 @@ class InstrumentController(QThread):
         # inform new packet received to the listening classes (e.g.: Recorder)
         self.new_packet.emit(packet)
 
+    def on_new_packets_parsed(self, batches):
+        for batch in batches:
+            self.log_new_batch_parsed(batch)
+        # inform new packets received to the listening classes (e.g.: Recorder)
+        self.new_packets.emit(batches)
+
     def log_new_packet_parsed(self, packet):
         # log the event
         self.log.info("New '{0}' packet received".format(packet.instrument_packet.name))
         if packet.data:
             fields = [str(f.name) for f in packet.instrument_packet.fields]
-            str_fields = ', '.join(["{0}: {1:g}".format(f, d) for f, d in zip(fields, packet.data)])
-            self.log.debug("({0})".format(str_fields))
+            self.log.debug("({0})".format(format_values(fields, packet.data)))
+    
+    def log_new_batch_parsed(self, batch):
+        # log the event, with the fields of the last packet only
+        txt = "New {0} '{1}' packets received"
+        self.log.info(txt.format(len(batch), batch.instrument_packet.name))
+        if batch.data.dtype.names and self.log.isEnabledFor(logging.DEBUG):
+            str_fields = format_values(batch.data.dtype.names, batch.data[-1].tolist())
+            self.log.debug("(last: {0})".format(str_fields))
     
     def on_error(self):
         self.log.error("Error occurred!")
@@ -421,8 +553,8 @@ class BlockingInstrumentController(InstrumentController):
 
     RX_TIMEOUT = 2000
 
-    def __init__(self, instrument_config):
-        InstrumentController.__init__(self, instrument_config)
+    def __init__(self, instrument_config, reactor=None, link=None):
+        InstrumentController.__init__(self, instrument_config, reactor, link)
 
         # circular list of operation commands
         self.commands = deque([command
@@ -432,7 +564,7 @@ class BlockingInstrumentController(InstrumentController):
         self.rx_timeout = QTimer()
         self.rx_timeout.setSingleShot(True)
     
-    def run(self):
+    def start_operation(self):
         # define a timeout, if response not received send the command again
         self.rx_timeout.timeout.connect(self.send_command_timeout)
         self.rx_timeout.start(self.RX_TIMEOUT)
@@ -440,7 +572,7 @@ class BlockingInstrumentController(InstrumentController):
         # send the first command
         self.send_next_command()
 
-        InstrumentController.run(self)
+        InstrumentController.start_operation(self)
     
     def quit(self):
         self.rx_timeout.stop()
@@ -450,6 +582,12 @@ class BlockingInstrumentController(InstrumentController):
         InstrumentController.on_new_packet_parsed(self, packet)
         self.send_next_command()
     
+    def on_new_packets_parsed(self, batches):
+        InstrumentController.on_new_packets_parsed(self, batches)
+        # only one command waits for its reply, the other packets of the
+        # batches are late replies of commands sent again on timeout
+        self.send_next_command()
+    
     def send_next_command(self):
         self.new_command.emit(self.commands[0])
 
@@ -471,8 +609,8 @@ class InstrumentInitialization(BlockingInstrumentController):
     # Signal to inform that the instrument initialization has been completed correctly
     initialization_finished = pyqtSignal()
 
-    def __init__(self, instrument_config):
-        BlockingInstrumentController.__init__(self, instrument_config)
+    def __init__(self, instrument_config, reactor=None, link=None):
+        BlockingInstrumentController.__init__(self, instrument_config, reactor, link)
         self.log = logging.getLogger('GDAIS.'+instrument_config.instrument.short_name+'.Init')
 
         # list of init commands
@@ -510,6 +648,11 @@ class InstrumentInitialization(BlockingInstrumentController):
         else:
             self.log.warn("Received packet while exiting initialization")
     
+    def on_new_packets_parsed(self, batches):
+        # the reply of the command sent is the last packet received (see
+        # BlockingInstrumentController.on_new_packets_parsed)
+        self.on_new_packet_parsed(batches[-1].packet(-1))
+    
     def log_new_packet_parsed(self, packet):
         pass # TODO: really??
 
@@ -546,13 +689,13 @@ class NonBlockingInstrumentController(InstrumentController):
 
 class PeriodicInstrumentController(NonBlockingInstrumentController):
 
-    def __init__(self, instrument_config):
-        NonBlockingInstrumentController.__init__(self, instrument_config)
+    def __init__(self, instrument_config, reactor=None, link=None):
+        NonBlockingInstrumentController.__init__(self, instrument_config, reactor, link)
         
         self.mapper = QSignalMapper()
         self.timers = []
     
-    def run(self):
+    def start_operation(self):
         # create and start periodic timers for each command
         for i, command in enumerate(self.instr_cfg.operation_commands):
             self.log.debug("Creating timer for '{0}' command".format(command.name))
@@ -564,7 +707,7 @@ class PeriodicInstrumentController(NonBlockingInstrumentController):
 
         self.mapper.mapped.connect(self.send_command)
         
-        NonBlockingInstrumentController.run(self)
+        NonBlockingInstrumentController.start_operation(self)
     
     def quit(self):
         for timer in self.timers:
@@ -577,8 +720,8 @@ class PeriodicInstrumentController(NonBlockingInstrumentController):
 
 class SequenceInstrumentController(NonBlockingInstrumentController):
 
-    def __init__(self, instrument_config):
-        NonBlockingInstrumentController.__init__(self, instrument_config)
+    def __init__(self, instrument_config, reactor=None, link=None):
+        NonBlockingInstrumentController.__init__(self, instrument_config, reactor, link)
 
         # circular list of command sequence
         self.commands = deque(instrument_config.operation_commands)
@@ -586,14 +729,14 @@ class SequenceInstrumentController(NonBlockingInstrumentController):
         self.tx_timer = QTimer()
         self.tx_timer.setSingleShot(True)
 
-    def run(self):
+    def start_operation(self):
         # define the timer used to wait for the next command
         self.tx_timer.timeout.connect(self.send_command)
 
         # send the first command
         self.send_command()
 
-        NonBlockingInstrumentController.run(self)
+        NonBlockingInstrumentController.start_operation(self)
     
     def quit(self):
         self.tx_timer.stop()
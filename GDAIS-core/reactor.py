@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the I/O reactor.
+
+A single reactor waits for the file descriptors of all the instrument
+connections (serial ports, sockets...) with epoll (or select where epoll is
+not available) and runs the callback of each one as its data arrives, along
+with the timers and the calls scheduled from other threads. It does not
+depend on Qt.
+"""
+from collections import deque
+import errno
+import fcntl
+import heapq
+import logging
+import os
+import select
+import signal
+import threading
+import time
+
+
+class Poller(object):
+    """Wait for events in a set of file descriptors."""
+
+    # events
+    READ = 1
+    WRITE = 2
+
+    @staticmethod
+    def create():
+        """Return the best poller available in the running system."""
+        if hasattr(select, 'epoll'):
+            return EpollPoller()
+        return SelectPoller()
+
+    def register(self, fd, events):
+        """Wait for the given events in fd (0 stops waiting for it)."""
+        raise NotImplementedError
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds (None for no limit) for some events.
+
+        Returns a list of (fd, events) tuples.
+        """
+        raise NotImplementedError
+
+
+class EpollPoller(Poller):
+
+    def __init__(self):
+        self.epoll = select.epoll()
+        self.fds = {}
+
+    def register(self, fd, events):
+        mask = 0
+        if events & self.READ:
+            mask |= select.EPOLLIN | select.EPOLLPRI
+        if events & self.WRITE:
+            mask |= select.EPOLLOUT
+
+        if not mask:
+            if fd in self.fds:
+                del self.fds[fd]
+                self.epoll.unregister(fd)
+        elif fd in self.fds:
+            self.epoll.modify(fd, mask)
+        else:
+            self.epoll.register(fd, mask)
+        if mask:
+            self.fds[fd] = events
+
+    def poll(self, timeout):
+        if timeout is None:
+            timeout = -1
+        ready = []
+        for fd, mask in self.epoll.poll(timeout):
+            events = 0
+            # errors and hang ups are reported to the reader, which gets them
+            # when reading (and to the writer if there is no reader)
+            if mask & (select.EPOLLIN | select.EPOLLPRI | select.EPOLLERR | select.EPOLLHUP):
+                events |= self.READ
+            if mask & (select.EPOLLOUT | select.EPOLLERR | select.EPOLLHUP):
+                events |= self.WRITE
+            ready.append((fd, events & self.fds.get(fd, 0)))
+        return ready
+
+
+class SelectPoller(Poller):
+
+    def __init__(self):
+        self.readers = set()
+        self.writers = set()
+
+    def register(self, fd, events):
+        for events_set, event in ((self.readers, self.READ), (self.writers, self.WRITE)):
+            if events & event:
+                events_set.add(fd)
+            else:
+                events_set.discard(fd)
+
+    def poll(self, timeout):
+        readable, writable, _ = select.select(self.readers, self.writers, [], timeout)
+        ready = dict((fd, self.READ) for fd in readable)
+        for fd in writable:
+            ready[fd] = ready.get(fd, 0) | self.WRITE
+        return ready.items()
+
+
+class Timer(object):
+    """Call scheduled by the reactor, it can be cancelled before it runs."""
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return self.when < other.when
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Reactor(object):
+
+    def __init__(self):
+        # file descriptors poller and callbacks of each one (reader, writer)
+        self.poller = Poller.create()
+        self.handlers = {}
+
+        # heap of pending timers
+        self.timers = []
+
+        # calls to be run on the next iteration, they may be added from
+        # other threads
+        self.ready = deque()
+        self.lock = threading.Lock()
+
+        # pipe used to wake the reactor up from other threads
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        for fd in (self.wakeup_read, self.wakeup_write):
+            self._set_non_blocking(fd)
+        self.add_reader(self.wakeup_read, self._read_wakeup)
+
+        # callbacks of the signals handled and signal numbers received, not
+        # handled yet (see add_signal_handler)
+        self.signal_handlers = {}
+        self.signals_received = []
+
+        # whether the reactor loop is running
+        self.running = False
+
+        # thread running the reactor loop
+        self.thread = None
+
+        # default logger
+        self.log = logging.getLogger('GDAIS.Reactor')
+
+    def add_reader(self, fd, callback):
+        """Call callback when fd has data to be read."""
+        self._set_handler(fd, 0, callback)
+
+    def remove_reader(self, fd):
+        self._set_handler(fd, 0, None)
+
+    def add_writer(self, fd, callback):
+        """Call callback when data can be written to fd."""
+        self._set_handler(fd, 1, callback)
+
+    def remove_writer(self, fd):
+        self._set_handler(fd, 1, None)
+
+    def call_soon(self, callback, *args):
+        """Call callback in the reactor thread as soon as possible.
+
+        This is the only method that can be called from other threads.
+        """
+        with self.lock:
+            self.ready.append((callback, args))
+        if threading.current_thread() is not self.thread:
+            self._wakeup()
+
+    def add_signal_handler(self, signum, callback):
+        """Call callback in the reactor loop when signal signum is received.
+
+        The signal handler only records the signal and wakes the reactor
+        up, as it may interrupt the main thread anywhere (e.g.: holding the
+        lock of call_soon).
+        """
+        self.signal_handlers[signum] = callback
+        signal.signal(signum, self._on_signal)
+
+    def call_later(self, delay, callback, *args):
+        """Call callback after delay seconds, returns a cancellable Timer."""
+        timer = Timer(time.time() + delay, callback, args)
+        heapq.heappush(self.timers, timer)
+        return timer
+
+    def run(self):
+        """Run the reactor loop until stop is called."""
+        self.thread = threading.current_thread()
+        self.running = True
+        while self.running:
+            self.run_once()
+        self.log.debug("Reactor loop finished")
+
+    def run_once(self, timeout=None):
+        """Wait for events up to timeout seconds and run their callbacks."""
+        if self.ready:
+            timeout = 0
+        elif self.timers:
+            delay = max(0, self.timers[0].when - time.time())
+            timeout = delay if timeout is None else min(timeout, delay)
+
+        try:
+            events = self.poller.poll(timeout)
+        except (IOError, OSError, select.error) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            events = []
+
+        while self.signals_received:
+            self._run(self.signal_handlers[self.signals_received.pop(0)])
+
+        for fd, mask in events:
+            handlers = self.handlers.get(fd)
+            if not handlers:
+                continue
+            if mask & Poller.READ and handlers[0]:
+                self._run(handlers[0])
+            if mask & Poller.WRITE and handlers[1] and fd in self.handlers:
+                self._run(handlers[1])
+
+        now = time.time()
+        while self.timers and self.timers[0].when <= now:
+            timer = heapq.heappop(self.timers)
+            if not timer.cancelled:
+                self._run(timer.callback, *timer.args)
+
+        # only the calls already scheduled, new ones wait for the next round
+        with self.lock:
+            ready, self.ready = self.ready, deque()
+        for callback, args in ready:
+            self._run(callback, *args)
+
+    def stop(self):
+        """Stop the reactor loop, it can be called from any thread."""
+        self.call_soon(self._stop)
+
+    def close(self):
+        """Release the reactor resources, once the loop has finished."""
+        for fd in (self.wakeup_read, self.wakeup_write):
+            os.close(fd)
+        self.handlers.clear()
+
+    def _stop(self):
+        self.running = False
+
+    def _run(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            self.log.exception("Error in reactor callback {0}".format(callback))
+
+    def _set_handler(self, fd, index, callback):
+        handlers = self.handlers.setdefault(fd, [None, None])
+        handlers[index] = callback
+        events = ((Poller.READ if handlers[0] else 0) |
+                  (Poller.WRITE if handlers[1] else 0))
+        if not events:
+            del self.handlers[fd]
+        self.poller.register(fd, events)
+
+    def _on_signal(self, signum, frame):
+        self.signals_received.append(signum)
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            os.write(self.wakeup_write, b'\0')
+        except OSError as e:
+            # the pipe is full, so the reactor will wake up anyway
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _read_wakeup(self):
+        try:
+            while os.read(self.wakeup_read, 4096):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    @staticmethod
+    def _set_non_blocking(fd):
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
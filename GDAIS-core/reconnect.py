@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the reconnection policy of network connections.
+
+When the connection with an instrument is lost, it is opened again after a
+delay that doubles on each failed attempt (exponential backoff), up to a
+maximum number of consecutive attempts. Only when they are exhausted the
+connection reports an error, so a network blip only pauses the affected
+instrument. The first connection is not retried: if it fails (e.g.: a wrong
+address or the instrument is off) the error is reported at once. It does
+not depend on Qt, so it is used by the TCP transport.
+"""
+import time
+
+
+class Reconnector(object):
+    """Exponential backoff reconnection policy, with its metrics."""
+
+    def __init__(self, conn):
+        # consecutive attempts (0 disables reconnection), delay before the
+        # first one and maximum delay (seconds)
+        self.max_attempts = conn.reconnect_attempts
+        self.delay = conn.reconnect_delay
+        self.max_delay = conn.reconnect_max_delay
+
+        # consecutive failed attempts of the current reconnection
+        self.attempts = 0
+
+        # number of successful reconnections and total time disconnected
+        # (seconds), and when the current disconnection started
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.lost_time = None
+
+        # whether the connection has been established once
+        self.was_connected = False
+
+    def lost(self):
+        """The connection (or a reconnection attempt) has failed.
+
+        Returns the delay (seconds) before the next attempt, or None if no
+        more attempts have to be made (always before the first connection).
+        """
+        if self.lost_time is None:
+            self.lost_time = time.time()
+        if not self.was_connected or self.attempts >= self.max_attempts:
+            return None
+        delay = min(self.delay * 2 ** self.attempts, self.max_delay)
+        self.attempts += 1
+        return delay
+
+    def connected(self):
+        """The connection has been established.
+
+        Returns the seconds it has been down if it is a reconnection, or
+        None if it is the first connection.
+        """
+        self.attempts = 0
+        if not self.was_connected:
+            self.was_connected = True
+            self.lost_time = None
+            return None
+
+        downtime = time.time() - self.lost_time if self.lost_time is not None else 0.0
+        self.downtime += downtime
+        self.lost_time = None
+        self.reconnects += 1
+        return downtime
+
+    def summary(self):
+        """Return a text describing the reconnections done."""
+        downtime = self.downtime
+        if self.lost_time is not None and self.was_connected:
+            # still disconnected
+            downtime += time.time() - self.lost_time
+        return "Reconnections: {0}, downtime: {1:.1f} s".format(self.reconnects, downtime)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the replay of raw capture files.
+
+Captures are replayed through the instrument framer, as data received from
+the instrument, so the packets recorded can be regenerated from them. It
+does not depend on Qt.
+"""
+import mmap
+import os
+import time
+
+from capture import CaptureReader, is_capture, monotonic
+
+
+class FastReplay(object):
+    """Replay of a whole capture file as fast as possible.
+
+    The file is memory-mapped (or its records joined, in capture files) and
+    fed to the framer in big chunks, so the packets of a whole chunk are
+    found at once, and they are handed out in big batches.
+    """
+
+    # bytes fed to the framer at once
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, fp, framer):
+        # capture file and framer splitting it into packets
+        self.fp = fp
+        self.framer = framer
+
+        # number of packets and bytes replayed, and time it took (seconds)
+        self.frames = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def batches(self, batch_size):
+        """Generate the lists of packets (bytearray) found in the capture.
+
+        Each list has up to batch_size packets. The elapsed time includes
+        the time spent handling them between iterations.
+        """
+        start = time.time()
+        try:
+            for chunk in self._chunks():
+                self.bytes += len(chunk)
+
+                # packets are views of the framer buffer, copy them
+                packets = [bytearray(packet) for packet in self.framer.feed(chunk)]
+                for i in xrange(0, len(packets), batch_size):
+                    batch = packets[i:i + batch_size]
+                    self.frames += len(batch)
+                    yield batch
+                    self.elapsed = time.time() - start
+        finally:
+            self.elapsed = time.time() - start
+
+    def record_blocks(self, batch_size):
+        """Generate the blocks of records (bytearray) found in the capture.
+
+        It is used instead of batches when the framer is in record mode (see
+        Framer.extract_records), each block has up to batch_size records.
+        """
+        start = time.time()
+        framer = self.framer
+        try:
+            for chunk in self._chunks():
+                self.bytes += len(chunk)
+                framer.append(chunk)
+                while True:
+                    # records are a view of the framer buffer, copy them
+                    records = bytearray(framer.extract_records(batch_size))
+                    if not records:
+                        break
+                    self.frames += len(records) // framer.record_size
+                    yield records
+                    self.elapsed = time.time() - start
+        finally:
+            self.elapsed = time.time() - start
+
+    def _chunks(self):
+        # chunks of raw files are buffers of the file mapping, without copying
+        # it: they are only valid until the next chunk is requested
+        if is_capture(self.fp):
+            chunk = []
+            chunk_size = 0
+            for _, data in CaptureReader(self.fp):
+                chunk.append(data)
+                chunk_size += len(data)
+                if chunk_size >= self.CHUNK_SIZE:
+                    yield b''.join(chunk)
+                    chunk = []
+                    chunk_size = 0
+            if chunk:
+                yield b''.join(chunk)
+            return
+
+        size = os.fstat(self.fp.fileno()).st_size
+        if not size:
+            # empty files can not be mapped
+            return
+
+        mapping = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for position in xrange(0, size, self.CHUNK_SIZE):
+                yield buffer(mapping, position, self.CHUNK_SIZE)
+        finally:
+            mapping.close()
+
+    def summary(self):
+        """Return a text describing the replay throughput."""
+        elapsed = self.elapsed or 1e-9
+        txt = "Replayed {0} frames, {1} bytes in {2:.3f} s ({3:.0f} frames/s, {4:.2f} MB/s)"
+        return txt.format(self.frames, self.bytes, self.elapsed,
+                          self.frames / elapsed, self.bytes / elapsed / 1e6)
+
+
+class PacedReplay(object):
+    """Replay of a capture file at its original pace.
+
+    Capture files are replayed with the receive times of their records.
+    Raw files are replayed at the byte rate of the given baud rate (as an
+    asynchronous serial line, with start and stop bits). Both are scaled by
+    speed (e.g.: 10 replays 10 times faster).
+    """
+
+    # time between chunks of raw files (seconds)
+    TICK = 0.01
+
+    # bits sent on a serial line for each byte
+    BITS_PER_BYTE = 10
+
+    def __init__(self, fp, baudrate, speed=1.0):
+        self.fp = fp
+        self.speed = float(speed)
+
+        # bytes per second replayed from raw files
+        self.byte_rate = float(baudrate) / self.BITS_PER_BYTE * self.speed
+
+        # number of bytes replayed
+        self.bytes = 0
+
+    def chunks(self):
+        """Generate the (time, data) chunks to be replayed.
+
+        Time is the number of seconds from the replay start when the chunk
+        data has to be delivered.
+        """
+        if is_capture(self.fp):
+            first = None
+            for timestamp, data in CaptureReader(self.fp):
+                if first is None:
+                    first = timestamp
+                self.bytes += len(data)
+                yield (timestamp - first) / self.speed, data
+
+        else:
+            chunk_size = max(1, int(self.byte_rate * self.TICK))
+            while True:
+                data = self.fp.read(chunk_size)
+                if not data:
+                    break
+                due = self.bytes / self.byte_rate
+                self.bytes += len(data)
+                yield due, data
+
+    def run(self, deliver, exiting=lambda: False, sleep=time.sleep):
+        """Deliver all the chunks at their time, in the calling thread.
+
+        This is a single timer loop sleeping until each chunk is due, so
+        the replay does not drift. The sleep function may return early (e.g.:
+        Event.wait) so that exiting is checked without waiting for the next
+        chunk. Returns the elapsed time (seconds).
+        """
+        start = monotonic()
+        for due, data in self.chunks():
+            if exiting():
+                break
+            delay = start + due - monotonic()
+            if delay > 0:
+                sleep(delay)
+            if exiting():
+                break
+            deliver(data)
+        return monotonic() - start
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the input latency settings of serial ports.
+
+Besides the line settings, the latency of the data received from a serial
+port depends on when the reader is woken up:
+
+- termios VMIN and VTIME: the port is reported readable (poll, select,
+  QSocketNotifier) once VMIN bytes have arrived, or as soon as one byte has
+  arrived if VTIME is not 0. Bigger VMIN values mean fewer wake ups but a
+  higher latency, VMIN 1 wakes the reader up for each byte.
+- kernel low latency mode (Linux ASYNC_LOW_LATENCY): the driver hands the
+  received data to the line discipline immediately, instead of deferring
+  it (e.g.: USB adapters reduce their latency timer to 1 ms).
+
+It does not depend on Qt, so it is used by the serial transport.
+"""
+import array
+import fcntl
+import termios
+
+
+# serial_struct ioctls and low latency flag (linux/serial.h)
+TIOCGSERIAL = getattr(termios, 'TIOCGSERIAL', 0x541E)
+TIOCSSERIAL = getattr(termios, 'TIOCSSERIAL', 0x541F)
+ASYNC_LOW_LATENCY = 0x2000
+
+# position of the flags in serial_struct, read as an array of ints
+SERIAL_STRUCT_FLAGS = 4
+
+
+def set_read_timing(fd, vmin, vtime):
+    """Set the termios VMIN (bytes) and VTIME (tenths of second) of fd."""
+    attrs = termios.tcgetattr(fd)
+    attrs[6][termios.VMIN] = vmin
+    attrs[6][termios.VTIME] = vtime
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+
+def set_low_latency(fd, enabled=True):
+    """Set the kernel low latency mode of the serial port fd.
+
+    Raises IOError if the port driver does not support it (e.g.: ptys).
+    """
+    serial_struct = array.array('i', [0] * 32)
+    fcntl.ioctl(fd, TIOCGSERIAL, serial_struct)
+    if enabled:
+        serial_struct[SERIAL_STRUCT_FLAGS] |= ASYNC_LOW_LATENCY
+    else:
+        serial_struct[SERIAL_STRUCT_FLAGS] &= ~ASYNC_LOW_LATENCY
+    fcntl.ioctl(fd, TIOCSSERIAL, serial_struct)
+
+
+def configure_latency(io_conn, conn, log):
+    """Apply the latency settings of conn (SerialConnectionCfg) to io_conn.
+
+    io_conn is an open serial.Serial. The settings not supported by the port
+    are logged and skipped, the port is still usable with its defaults.
+    """
+    fd = io_conn.fileno()
+    try:
+        set_read_timing(fd, conn.vmin, conn.vtime)
+    except termios.error:
+        log.exception("Can not set serial port VMIN/VTIME")
+    else:
+        log.debug("Serial port VMIN: {0}, VTIME: {1}".format(conn.vmin, conn.vtime))
+
+    if conn.low_latency:
+        try:
+            set_low_latency(fd)
+        except IOError:
+            log.warn("Serial port does not support low latency mode")
+        else:
+            log.debug("Serial port low latency mode enabled")
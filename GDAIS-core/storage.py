@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the HDF5 data file of an equipment.
+
+It does not depend on Qt, so it is used both by the Recorder thread and by
+the headless engine.
+"""
+from datetime import datetime
+from numpy import dtype, array, empty
+import logging
+import os
+from tables import *
+
+
+class DataFile(object):
+    
+    BASE_PATH = '/home/pau/feina/UPC/projecte/code/GDAIS/GDAIS-core'
+    DATA_PATH = os.path.join(BASE_PATH, 'data')
+
+    def __init__(self):
+        # HDF-5 data object
+        self.h5file = None
+        
+        # default logger
+        self.log = logging.getLogger('GDAIS.DataFile')
+
+    def open(self, equipment):
+        dir = os.path.join(self.DATA_PATH, equipment.short_name)
+        self.log.info("Data output directory: '{0}'".format(dir))
+        if not os.path.exists(dir):
+            # XXX: race condition if directory created between the two calls, quite unprobable
+            os.makedirs(dir)
+        
+        txt = "{0}_{1}.h5"
+        filename = txt.format(equipment.short_name, datetime.utcnow().strftime("%Y%m%d_%H%M%S"))
+        self.filepath = os.path.join(dir, filename)
+        try:
+            self.h5file = openFile(self.filepath, mode = "w", title = "{0} data file".format(equipment.name))
+
+        except IOError:
+            self.log.error("Error creating HDF5 file: '{0}'".format(self.filepath))
+            raise
+        
+        else:
+            for instrument_config in equipment.instruments:
+                instrument = instrument_config.instrument
+                group = self.h5file.createGroup(self.h5file.root, instrument.short_name, instrument.name)
+                for packet in instrument.rx_packets.itervalues():
+                    format = array([], dtype(packet.types() + [("timestamp", "float64")]))
+                    short_name = packet.name.lower().replace(' ','_')
+                    packet.table = self.h5file.createTable(group, short_name, format, packet.name)
+
+    def close(self):
+        if self.h5file:
+            self.h5file.close()
+            self.h5file = None
+    
+    def append_packet(self,  packet):
+        if packet.data:
+            packet.instrument_packet.table.append([packet.data + (packet.timestamp, )])
+            packet.instrument_packet.table.flush()
+    
+    def append_batches(self, batches):
+        # each batch (PacketBatch) is appended to its table as a whole, the
+        # fields are converted column by column to the table byte order
+        for batch in batches:
+            if not batch.data.dtype.names:
+                continue
+            table = batch.instrument_packet.table
+            rows = empty(len(batch), table.dtype)
+            for name in batch.data.dtype.names:
+                rows[name] = batch.data[name]
+            rows['timestamp'] = batch.timestamps
+            table.append(rows)
+            table.flush()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Simulated serial instrument on a pseudo-terminal, to test serial connections.
+
+The simulated instrument sends the frames of an input file (raw or capture)
+through the master side of a pty, paced at the serial line byte rate, and a
+serial connection reads them from the slave side as from a real port. The
+receive latency of each frame (from the end of its write to its framing) and
+the throughput are measured, without any hardware:
+
+    python test/serial_sim.py conf/instruments/gps.json test/LOF06.bin \\
+        --baudrate 115200 --vmin 1
+
+By default the connection is a Channel run by the I/O reactor, --qt uses
+a Connection thread instead. With --parsed the latency is measured
+until the parsed packets reach the main thread (as the instrument controller)
+through the Parser thread, and with --fused they are parsed by the connection
+thread itself (fused_parsing option), both imply --qt:
+
+    python test/serial_sim.py conf/instruments/gps.json test/LOF06.bin --parsed
+    python test/serial_sim.py conf/instruments/gps.json test/LOF06.bin --fused
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from instrument import Instrument
+from udp_sender import datagrams as frames
+
+
+class SimulatedInstrument(object):
+    """Instrument sending frames through the master side of a pty."""
+
+    # bits sent on a serial line for each byte
+    BITS_PER_BYTE = 10
+
+    def __init__(self, frames, baudrate, speed=1.0):
+        self.frames = frames
+        self.byte_rate = float(baudrate) / self.BITS_PER_BYTE * speed
+
+        # pty, the slave is kept open so the master does not get EIO
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+
+        # time when each frame was completely written, and bytes sent
+        self.sent_times = []
+        self.bytes = 0
+
+        self.thread = threading.Thread(target=self._run, name='SimulatedInstrument')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _run(self):
+        start = time.time()
+        for frame in self.frames:
+            # the frame is sent when the line would have finished sending it
+            delay = start + (self.bytes + len(frame)) / self.byte_rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            data = str(frame)
+            while data:
+                data = data[os.write(self.master, data):]
+            self.sent_times.append(time.time())
+            self.bytes += len(frame)
+
+
+def run_channel(instrument, received_times, finished, opened):
+    from channel import Channel
+    from reactor import Reactor
+
+    reactor = Reactor()
+    channel = Channel.create(reactor, instrument)
+    handle_frames = channel.handle_frames
+    handle_records = channel.handle_records
+
+    def on_frames(packets):
+        # time packets as framed, also the ones the codec can not parse
+        now = time.time()
+        received_times.extend([now] * len(packets))
+        handle_frames(packets)
+    channel.handle_frames = on_frames
+
+    def on_records(records):
+        received_times.extend([time.time()] * (len(records) // channel.framer.record_size))
+        handle_records(records)
+    channel.handle_records = on_records
+
+    def check():
+        if finished():
+            channel.close()
+            reactor.stop()
+        else:
+            reactor.call_later(0.1, check)
+
+    reactor.call_soon(channel.open)
+    reactor.call_soon(opened)
+    reactor.call_soon(check)
+    reactor.run()
+    reactor.close()
+
+
+def run_connection(instrument, received_times, finished, opened, parsed=False):
+    from PyQt4.QtCore import QCoreApplication, QObject, QTimer
+    from connection import Connection
+    from parser import Parser
+
+    app = QCoreApplication(sys.argv)
+    connection = Connection.create(instrument.connection)
+
+    parser = None
+    if parsed:
+        class Receiver(QObject):
+            # lives in the main thread, so parsed packets are queued to it
+
+            def on_packet(self, packet):
+                received_times.append(time.time())
+
+            def on_packets(self, batches):
+                received_times.extend([time.time()] * sum(len(batch) for batch in batches))
+
+        # packets are parsed by the parser thread, or emitted already parsed
+        # by the connection thread (only one of the signals is emitted)
+        receiver = Receiver()
+        parser = Parser()
+        parser.new_packet_parsed.connect(receiver.on_packet)
+        parser.new_packets_parsed.connect(receiver.on_packets)
+        connection.new_packet_parsed.connect(receiver.on_packet)
+        connection.new_packets_parsed.connect(receiver.on_packets)
+        connection.new_data_received.connect(parser.on_new_data_received)
+        connection.new_frames_received.connect(parser.on_new_frames_received)
+        connection.new_records_received.connect(parser.on_new_records_received)
+        parser.begin(instrument)
+    else:
+        # emitted from the connection thread, timed there (direct connection)
+        on_packet = lambda packet, timestamp: received_times.append(time.time())
+        on_frames = lambda packets, times: received_times.extend([time.time()] * len(packets))
+        on_records = lambda records, timestamp: received_times.extend(
+                            [time.time()] * (len(records) // connection.framer.record_size))
+        connection.new_data_received.connect(on_packet)
+        connection.new_frames_received.connect(on_frames)
+        connection.new_records_received.connect(on_records)
+
+    def check():
+        if finished():
+            connection.quit()
+            connection.wait()
+            if parser:
+                parser.quit()
+                parser.wait()
+            app.quit()
+    timer = QTimer()
+    timer.timeout.connect(check)
+    timer.start(100)
+
+    connection.begin(instrument)
+    opened()
+    app.exec_()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure serial receive latency with a '
+                                                 'simulated instrument on a pty')
+    parser.add_argument('instrument', help='Instrument file (.json) of the frames')
+    parser.add_argument('input', help='Input file (raw or capture)')
+    parser.add_argument('--baudrate', type=int, default=115200, help='Simulated line baud rate')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Send speed multiplier over the line rate')
+    parser.add_argument('--frames', type=int, default=0,
+                        help='Frames to send (0: all the frames in the input file)')
+    parser.add_argument('--vmin', type=int, default=1, help='Serial port VMIN')
+    parser.add_argument('--vtime', type=int, default=0, help='Serial port VTIME')
+    parser.add_argument('--read-size', type=int, default=0, help='Bytes read at once')
+    parser.add_argument('--qt', action='store_true', default=False,
+                        help='Use a Connection thread instead of a reactor Channel')
+    parser.add_argument('--parsed', action='store_true', default=False,
+                        help='Measure until the packets parsed by the Parser thread are received')
+    parser.add_argument('--fused', action='store_true', default=False,
+                        help='Measure until the packets parsed by the connection thread '
+                             'are received')
+    args = parser.parse_args()
+
+    instrument = Instrument(os.path.abspath(args.instrument))
+    frame_list = list(frames(instrument, args.input, 0))
+    if args.frames:
+        frame_list = frame_list[:args.frames]
+
+    simulator = SimulatedInstrument(frame_list, args.baudrate, args.speed)
+    instrument.set_conn_type('Serial')
+    conn = instrument.connection
+    conn.serial_port = simulator.port
+    conn.baudrate = args.baudrate
+    conn.vmin = args.vmin
+    conn.vtime = args.vtime
+    conn.read_size = args.read_size
+    conn.fused_parsing = args.fused
+
+    received_times = []
+    idle = [None, 0]
+    def finished():
+        # all frames sent and nothing received for a while
+        if not simulator.thread.is_alive() and len(received_times) == idle[1]:
+            if idle[0] is None:
+                idle[0] = time.time()
+            return time.time() - idle[0] > 0.5
+        idle[0], idle[1] = None, len(received_times)
+        return False
+
+    # the port input is flushed when it is opened, start sending afterwards
+    start = []
+    def opened():
+        start.append(time.time())
+        simulator.start()
+
+    if args.qt or args.parsed or args.fused:
+        run_connection(instrument, received_times, finished, opened,
+                       args.parsed or args.fused)
+    else:
+        run_channel(instrument, received_times, finished, opened)
+    elapsed = simulator.sent_times[-1] - start[0] if simulator.sent_times else 0
+    simulator.close()
+
+    count = min(len(received_times), len(simulator.sent_times))
+    latencies = sorted((received_times[i] - simulator.sent_times[i]) * 1000
+                       for i in xrange(count))
+    print "Frames sent: {0}, received: {1}".format(len(simulator.sent_times), len(received_times))
+    if latencies:
+        txt = "Latency (ms) mean: {0:.3f}, p50: {1:.3f}, p99: {2:.3f}, max: {3:.3f}"
+        print txt.format(sum(latencies) / count, percentile(latencies, 0.5),
+                         percentile(latencies, 0.99), latencies[-1])
+    if elapsed:
+        txt = "Throughput: {0:.0f} frames/s, {1:.1f} kB/s"
+        print txt.format(len(received_times) / elapsed, simulator.bytes / elapsed / 1000)
+
+
+if __name__ == "__main__":
+    main()
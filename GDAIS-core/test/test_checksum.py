@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checks of the packet checksum algorithms against known vectors.
+
+Each algorithm is checked with the standard "123456789" check input, inside
+a packet so that the range start and end are used, and its field has to be
+filled and checked in the instrument byte order:
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from checksum import (Checksum, CRC16Checksum, CRC32Checksum, Sum8Checksum,
+                      Xor8Checksum)
+from instrument import Instrument, PacketFormat
+
+from test_framer import MTIG_INSTRUMENT
+
+CHECK_DATA = bytearray('123456789')
+
+
+class ChecksumTest(unittest.TestCase):
+
+    # checksum type, class and value of CHECK_DATA
+    VECTORS = [
+        (PacketFormat.ChecksumType.sum8, Sum8Checksum, 0x23),
+        (PacketFormat.ChecksumType.xor8, Xor8Checksum, 0x31),
+        (PacketFormat.ChecksumType.crc16, CRC16Checksum, 0x29B1),
+        (PacketFormat.ChecksumType.crc32, CRC32Checksum, 0xCBF43926)
+    ]
+
+    def setUp(self):
+        # big-endian instrument
+        self.instrument = Instrument(MTIG_INSTRUMENT)
+
+    def checksum(self, checksum_type, offset=0):
+        format = self.instrument.packet_format
+        format.checksum_type = checksum_type
+        format.checksum_size = PacketFormat.CHECKSUM_SIZE[checksum_type]
+        format.checksum_offset = offset
+        return Checksum.create(self.instrument)
+
+    def test_create(self):
+        for checksum_type, checksum_class, _ in self.VECTORS:
+            self.assertIsInstance(self.checksum(checksum_type), checksum_class)
+        self.instrument.packet_format.checksum_type = PacketFormat.ChecksumType.none
+        self.assertIsNone(Checksum.create(self.instrument))
+        self.instrument.packet_format.checksum_type = 'md5'
+        self.assertRaises(Exception, Checksum.create, self.instrument)
+
+    def test_vectors(self):
+        data = bytearray('ab') + CHECK_DATA + bytearray('cd')
+        for checksum_type, _, value in self.VECTORS:
+            checksum = self.checksum(checksum_type)
+            self.assertEqual(checksum.compute(data, 2, 2 + len(CHECK_DATA)), value,
+                             checksum_type)
+
+    def test_empty(self):
+        self.assertEqual(self.checksum(PacketFormat.ChecksumType.sum8).compute(CHECK_DATA, 3, 3), 0)
+        self.assertEqual(self.checksum(PacketFormat.ChecksumType.xor8).compute(CHECK_DATA, 3, 3), 0)
+        self.assertEqual(self.checksum(PacketFormat.ChecksumType.crc16).compute(CHECK_DATA, 3, 3),
+                         0xFFFF)
+        self.assertEqual(self.checksum(PacketFormat.ChecksumType.crc32).compute(CHECK_DATA, 3, 3), 0)
+
+    def test_fill_check(self):
+        # a start byte, the check data and the checksum field
+        for checksum_type, _, value in self.VECTORS:
+            checksum = self.checksum(checksum_type, offset=1)
+            size = checksum.struct.size
+            packet = bytearray([0xFA]) + CHECK_DATA + bytearray(size)
+            position = len(packet) - size
+            checksum.fill(packet, 0, position)
+            self.assertEqual(packet[position:],
+                             bytearray.fromhex('{0:0{1}X}'.format(value, size * 2)),
+                             checksum_type)
+            self.assertTrue(checksum.check(packet, 0, position), checksum_type)
+            packet[3] ^= 0x01
+            self.assertFalse(checksum.check(packet, 0, position), checksum_type)
+
+    def test_negative_offset(self):
+        # MTi-G: the checksum includes the last start byte, data and
+        # checksum add up to 0
+        checksum = self.checksum(PacketFormat.ChecksumType.sum8, offset=-1)
+        frame = bytearray([0xFA, 0xFF, 0x30, 0x00, 0xD1])
+        self.assertTrue(checksum.check(frame, 2, 4))
+        self.assertFalse(checksum.check(frame, 1, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checks of the decoding of packets with array fields.
+
+Fixed arrays are decoded with the packet dtype. Variable length arrays
+(count_field) are decoded field by field, the fields after the array
+following its actual length, and the packets whose count is beyond the
+maximum or whose length does not match their fields have to be rejected.
+The count field has to be a previous integer field:
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from codec import Codec
+from framer import Framer
+from instrument import Instrument, Packet, WrongCountFieldError
+
+from test_framer import MTIG_INSTRUMENT, mtig_frame
+
+# packets with a fixed array and with a variable length array (up to 8
+# samples), followed by a scalar field
+SAMPLES = Packet({'name': 'Samples', 'fields': [
+    {'name': 'Seq', 'type': 'uint16'},
+    {'name': 'EMPTY_FIELD', 'type': 'uint8', 'count': 2},
+    {'name': 'Data', 'type': 'int16', 'count': 4},
+    {'name': 'Temp', 'type': 'float32'}]})
+BURST = Packet({'name': 'Burst', 'fields': [
+    {'name': 'Seq', 'type': 'uint16'},
+    {'name': 'Num Samples', 'type': 'uint8'},
+    {'name': 'Data', 'type': 'int16', 'count': 8, 'count_field': 'Num Samples'},
+    {'name': 'Temp', 'type': 'float32'}]})
+
+
+def burst_data(seq, samples, temp=2.5, count=None):
+    """Return the fields data of a Burst packet."""
+    if count is None:
+        count = len(samples)
+    return bytearray(struct.pack('>HB%dhf' % len(samples), seq, count, *(samples + [temp])))
+
+
+class ArrayFieldsTest(unittest.TestCase):
+
+    def setUp(self):
+        # MTi-G packets, whose length field delimits the variable ones
+        self.instrument = Instrument(MTIG_INSTRUMENT)
+        self.instrument.rx_packets = {1: SAMPLES, 2: BURST}
+        self.framer = Framer(self.instrument)
+        self.codec = Codec(self.instrument)
+
+    def packet(self, mid, fields_data):
+        """Return the packet found by the framer in an MTi-G frame."""
+        return self.framer.unframe(mtig_frame(mid, fields_data))
+
+    def test_fixed_array(self):
+        data = bytearray(struct.pack('>H2x4hf', 7, 1, -2, 3, -4, 1.5))
+        parsed = self.codec.parse(self.packet(1, data), 10.0)
+        self.assertEqual(parsed.info, '')
+        seq, samples, temp = parsed.data
+        self.assertEqual((seq, list(samples), temp), (7, [1, -2, 3, -4], 1.5))
+        self.assertEqual(parsed.timestamp, 10.0)
+
+    def test_variable_array(self):
+        for samples in ([], [5], [1, -2, 3, -4, 5, -6, 7, -8]):
+            parsed = self.codec.parse(self.packet(2, burst_data(3, samples)))
+            self.assertEqual(parsed.info, '')
+            seq, count, data, temp = parsed.data
+            self.assertEqual((seq, count, temp), (3, len(samples), 2.5))
+            # the elements after the actual length are zero
+            self.assertEqual(list(data), samples + [0] * (8 - len(samples)))
+
+    def test_count_beyond_maximum(self):
+        # too long for the framer, which knows the maximum packet size
+        data = burst_data(3, [1] * 9)
+        self.assertIsNone(self.packet(2, data))
+        parsed = self.codec.parse(bytearray([2, len(data)]) + data + bytearray(1))
+        self.assertIsNone(parsed.data)
+        self.assertTrue(parsed.info.startswith("Wrong packet length"), parsed.info)
+        parsed = self.codec.parse(self.packet(2, burst_data(3, [1, 2], count=9)))
+        self.assertIsNone(parsed.data)
+        self.assertEqual(parsed.info, "Wrong 'data' array length: 9, maximum: 8")
+
+    def test_wrong_length(self):
+        # the count does not match the fields data received
+        for count in (1, 3):
+            parsed = self.codec.parse(self.packet(2, burst_data(3, [1, 2], count=count)))
+            self.assertIsNone(parsed.data)
+            self.assertTrue(parsed.info.startswith("Wrong packet length"), parsed.info)
+
+    def test_decode_frames(self):
+        frames = [self.packet(2, burst_data(0, [1, 2, 3])),
+                  self.packet(1, bytearray(struct.pack('>H2x4hf', 1, 1, 2, 3, 4, 0.5))),
+                  self.packet(2, burst_data(2, [4, 5], count=9)),
+                  self.packet(2, burst_data(3, [6]))]
+        batches = self.codec.decode_frames(frames, times=[1.0, 2.0, 3.0, 4.0])
+        self.assertEqual([batch.instrument_packet.name for batch in batches], ['Burst', 'Samples'])
+        burst = batches[0]
+        # the wrong packet is skipped, and its row is used by the next one
+        self.assertEqual(burst.data['seq'].tolist(), [0, 3])
+        self.assertEqual(burst.data['num_samples'].tolist(), [3, 1])
+        self.assertEqual(burst.data['data'].tolist(), [[1, 2, 3, 0, 0, 0, 0, 0],
+                                                       [6, 0, 0, 0, 0, 0, 0, 0]])
+        self.assertEqual(burst.timestamps.tolist(), [1.0, 4.0])
+        self.assertEqual(burst.frames, [frames[0], frames[3]])
+        self.assertEqual(batches[1].data['data'].tolist(), [[1, 2, 3, 4]])
+
+    def test_decode_variable(self):
+        frames = [self.packet(2, burst_data(0, [1], count=9)),
+                  self.packet(2, burst_data(1, [2, 3]))]
+        rows, decoded = self.codec.decode_variable(BURST, frames)
+        self.assertEqual(decoded, [1])
+        self.assertEqual(rows['data'].tolist(), [[2, 3, 0, 0, 0, 0, 0, 0]])
+
+
+class CountFieldTest(unittest.TestCase):
+
+    def packet(self, fields):
+        return Packet({'name': 'Burst', 'fields': fields})
+
+    def test_valid(self):
+        packet = self.packet([{'name': 'N', 'type': 'uint8'},
+                              {'name': 'A', 'type': 'int16', 'count': 4, 'count_field': 'N'}])
+        self.assertTrue(packet.is_variable())
+
+    def test_wrong_count_fields(self):
+        for count_field in ([{'name': 'N', 'type': 'float32'}],
+                            [{'name': 'N', 'type': 'uint8', 'count': 2}],
+                            [{'name': 'M', 'type': 'uint8'}],
+                            []):
+            fields = count_field + [{'name': 'A', 'type': 'int16', 'count': 4,
+                                     'count_field': 'N'}]
+            self.assertRaises(WrongCountFieldError, self.packet, fields)
+
+    def test_later_count_field(self):
+        fields = [{'name': 'A', 'type': 'int16', 'count': 4, 'count_field': 'N'},
+                  {'name': 'N', 'type': 'uint8'}]
+        with self.assertRaises(WrongCountFieldError) as context:
+            self.packet(fields)
+        self.assertEqual((context.exception.field_name, context.exception.count_field),
+                         ('A', 'N'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checks of the datagrams received by DatagramReceiver on a local UDP socket.
+
+Each datagram holds an MTi-G frame after a sequence counter. The counters
+of the receiver have to tell the datagrams dropped (not holding a valid
+frame), the sequence gaps with the datagrams lost in them, and the
+datagrams received late or duplicated:
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+import os
+import select
+import socket
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from datagram import DatagramReceiver
+from framer import Framer
+from instrument import ConnectionCfg, Instrument
+
+from test_framer import MTIG_INSTRUMENT, mtig_frame
+
+
+class DatagramReceiverTest(unittest.TestCase):
+
+    # seconds to wait for the datagrams sent
+    TIMEOUT = 2.0
+
+    def setUp(self):
+        self.instrument = Instrument(MTIG_INSTRUMENT)
+        self.instrument.connection = ConnectionCfg.create({
+            'type': ConnectionCfg.Type.udp, 'host': '127.0.0.1', 'port': 0,
+            'sequence_size': 1})
+        self.framer = Framer(self.instrument)
+        self.receiver = DatagramReceiver(self.instrument)
+        self.sock = self.receiver.open()
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.sock.close()
+        self.sender.close()
+
+    def frame(self, number):
+        return mtig_frame(50, bytearray(struct.pack('>I', number)))
+
+    def send(self, sequences):
+        """Send a datagram with a frame for each sequence number."""
+        for sequence in sequences:
+            datagram = bytearray([sequence]) + self.frame(sequence)
+            self.sender.sendto(str(datagram), self.sock.getsockname())
+
+    def receive(self, count):
+        """Receive count datagrams, returning the packets found."""
+        packets = []
+        while self.receiver.datagrams < count:
+            readable, _, _ = select.select([self.sock], [], [], self.TIMEOUT)
+            self.assertTrue(readable, "Datagrams not received")
+            packets += self.receiver.receive(self.sock, self.framer)
+        return packets
+
+    def counters(self):
+        receiver = self.receiver
+        return (receiver.datagrams, receiver.dropped, receiver.gaps,
+                receiver.lost, receiver.reordered)
+
+    def test_in_order(self):
+        self.send(range(5))
+        packets = self.receive(5)
+        self.assertEqual(packets, [self.framer.unframe(self.frame(i)) for i in range(5)])
+        self.assertEqual(self.counters(), (5, 0, 0, 0, 0))
+
+    def test_gap(self):
+        self.send([0, 1, 4, 5, 9])
+        self.assertEqual(len(self.receive(5)), 5)
+        self.assertEqual(self.counters(), (5, 0, 2, 5, 0))
+
+    def test_reorder(self):
+        # 2 arrives before 1, which is not lost but counted late
+        self.send([0, 2, 1, 3, 4])
+        self.assertEqual(len(self.receive(5)), 5)
+        self.assertEqual(self.counters(), (5, 0, 1, 1, 1))
+        self.assertEqual(self.receiver.next_sequence, 5)
+
+    def test_duplicate(self):
+        self.send([0, 1, 1, 2])
+        self.assertEqual(len(self.receive(4)), 4)
+        self.assertEqual(self.counters(), (4, 0, 0, 0, 1))
+
+    def test_wrap_around(self):
+        self.send([254, 255, 0, 1])
+        self.assertEqual(len(self.receive(4)), 4)
+        self.assertEqual(self.counters(), (4, 0, 0, 0, 0))
+
+    def test_drop(self):
+        wrong = bytearray([1]) + self.frame(1)
+        wrong[-1] ^= 0xFF
+        self.send([0])
+        self.sender.sendto(str(wrong), self.sock.getsockname())
+        self.sender.sendto('', self.sock.getsockname())
+        self.send([2])
+        packets = self.receive(4)
+        self.assertEqual(packets, [self.framer.unframe(self.frame(i)) for i in (0, 2)])
+        # the wrong frame keeps its sequence, the empty datagram has none
+        self.assertEqual(self.counters(), (4, 2, 0, 0, 0))
+        self.assertEqual(self.framer.rejected, 1)
+
+    def test_tap(self):
+        # the capture gets the frames without the sequence counter
+        tapped = []
+        self.framer.tap = lambda data: tapped.append(data.tobytes())
+        self.send([0, 1])
+        self.receive(2)
+        self.assertEqual(tapped, [str(self.frame(0)), str(self.frame(1))])
+
+
+if __name__ == "__main__":
+    unittest.main()
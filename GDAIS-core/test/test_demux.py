@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checks of the demultiplexing of shared links.
+
+The packets of a link have to be routed to the handler of their instrument,
+by address (removing the address byte) or by packet id, keeping the
+packets with an unknown address or id out and counting them. Links that
+can not be demultiplexed have to be rejected:
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from demux import Demultiplexer
+from equipment import InstrumentConfig, LinkConfig
+from instrument import PacketFormat
+
+from test_framer import BASE_PATH, MTIG_INSTRUMENT
+
+GPS_INSTRUMENT = os.path.join(BASE_PATH, 'conf', 'instruments', 'SMIGOL', 'gps_1.json')
+
+
+def link_config(demux):
+    return LinkConfig({'name': 'bus', 'demux': demux,
+                       'connection': {'type': 'TCP', 'host': '127.0.0.1', 'port': 20000}})
+
+
+def instrument_config(filename, **link):
+    link['name'] = 'bus'
+    return InstrumentConfig({'filename': filename, 'operation_mode': 'Periodic Commands',
+                             'link': link})
+
+
+class AddressDemuxTest(unittest.TestCase):
+
+    def setUp(self):
+        # packets of the GPS instruments: packet number (first byte) and
+        # fields, with the address byte before them in the link
+        self.link = link_config(LinkConfig.DemuxMode.address)
+        self.cfgs = [instrument_config(GPS_INSTRUMENT, address=1),
+                     instrument_config(GPS_INSTRUMENT, address=2)]
+        self.demux = Demultiplexer(self.link, self.cfgs[0].instrument.packet_format, self.cfgs)
+        self.handlers = [object(), object()]
+        for cfg, handler in zip(self.cfgs, self.handlers):
+            self.demux.add_route(cfg, handler)
+
+    def test_route(self):
+        handler, data = self.demux.route(bytearray([2, 90, 7, 8]))
+        self.assertIs(handler, self.handlers[1])
+        self.assertEqual(data, bytearray([90, 7, 8]))
+        self.assertEqual(self.demux.routed, {'smigol_gps_1': 1})
+
+    def test_unknown_address(self):
+        handler, _ = self.demux.route(bytearray([3, 90, 7, 8]))
+        self.assertIsNone(handler)
+        handler, _ = self.demux.route(bytearray())
+        self.assertIsNone(handler)
+        self.assertEqual(self.demux.unrouted, 2)
+        self.assertEqual(self.demux.routed, {'smigol_gps_1': 0})
+
+    def test_remove_route(self):
+        # the routes of another handler are kept
+        self.demux.remove_route(self.cfgs[0], self.handlers[1])
+        self.assertIs(self.demux.route(bytearray([1, 90]))[0], self.handlers[0])
+        self.demux.remove_route(self.cfgs[0], self.handlers[0])
+        self.assertIsNone(self.demux.route(bytearray([1, 90]))[0])
+        self.assertEqual(self.demux.unrouted, 1)
+
+    def test_split(self):
+        packets = [bytearray([2, 90]), bytearray([1, 92]), bytearray([9, 90]),
+                   bytearray([2, 92])]
+        groups = self.demux.split(packets, [1.0, 2.0, 3.0, 4.0])
+        # grouped in the order their first packet was received
+        self.assertEqual(groups, [
+            (self.handlers[1], [bytearray([90]), bytearray([92])], [1.0, 4.0]),
+            (self.handlers[0], [bytearray([92])], [2.0])])
+        self.assertEqual(self.demux.unrouted, 1)
+
+    def test_address_data(self):
+        data = self.demux.address_data(self.cfgs[1], bytearray([90, 7]))
+        self.assertEqual(data, bytearray([2, 90, 7]))
+
+    def test_reserved_address(self):
+        # DLE and ETX would be taken as marks after a DLE start mark
+        cfgs = [instrument_config(GPS_INSTRUMENT, address=0x10)]
+        self.assertRaises(ValueError, Demultiplexer, self.link,
+                          cfgs[0].instrument.packet_format, cfgs)
+
+    def test_missing_address(self):
+        cfgs = [instrument_config(GPS_INSTRUMENT)]
+        self.assertRaises(ValueError, Demultiplexer, self.link,
+                          cfgs[0].instrument.packet_format, cfgs)
+
+    def test_length_field(self):
+        # packets with a length field would include the address in it
+        cfgs = [instrument_config(MTIG_INSTRUMENT, address=1)]
+        self.assertRaises(ValueError, Demultiplexer, self.link,
+                          cfgs[0].instrument.packet_format, cfgs)
+
+
+class PacketIdDemuxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.link = link_config(LinkConfig.DemuxMode.packet_id)
+        self.cfgs = [instrument_config(GPS_INSTRUMENT, packet_ids=[90, 91]),
+                     instrument_config(GPS_INSTRUMENT, packet_ids=[92, 92])]
+        self.demux = Demultiplexer(self.link, self.cfgs[0].instrument.packet_format, self.cfgs)
+        self.handlers = [object(), object()]
+        for cfg, handler in zip(self.cfgs, self.handlers):
+            self.demux.add_route(cfg, handler)
+
+    def test_route(self):
+        for packet, handler in ((bytearray([90, 7]), self.handlers[0]),
+                                (bytearray([91, 7]), self.handlers[0]),
+                                (bytearray([92, 7]), self.handlers[1])):
+            routed, data = self.demux.route(packet)
+            self.assertIs(routed, handler)
+            # the packets are handed as they are
+            self.assertEqual(data, packet)
+        self.assertEqual(self.demux.routed, {'smigol_gps_1': 3})
+
+    def test_unknown_id(self):
+        self.assertEqual(self.demux.split([bytearray([93, 7]), bytearray([89])], [0.0, 0.0]), [])
+        self.assertEqual(self.demux.unrouted, 2)
+        self.assertEqual(self.demux.summary(),
+                         "Packets routed (smigol_gps_1: 0), unrouted: 2")
+
+    def test_missing_packet_ids(self):
+        cfgs = [instrument_config(GPS_INSTRUMENT)]
+        self.assertRaises(ValueError, Demultiplexer, self.link,
+                          cfgs[0].instrument.packet_format, cfgs)
+
+    def test_invalid_packet_ids(self):
+        cfgs = [instrument_config(GPS_INSTRUMENT, packet_ids=[250, 260])]
+        self.assertRaises(ValueError, Demultiplexer, self.link,
+                          cfgs[0].instrument.packet_format, cfgs)
+
+    def test_no_packet_num(self):
+        packet_format = self.cfgs[0].instrument.packet_format
+        packet_format.rx_format = [field for field in packet_format.rx_format
+                                   if field != PacketFormat.FormatField.packet_num]
+        self.assertRaises(ValueError, Demultiplexer, self.link, packet_format, self.cfgs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checks of the packets found by the framer.
+
+MTi-G packets have a negative checksum offset: the checksum includes the
+last start byte (BID). It has to be checked the same way in whole frames
+(datagrams) and in the stream, also after DLE un-stuffing. Packets of the
+maximum size have to be found when their end is the next packet start:
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from framer import Framer
+from instrument import Instrument, PacketFormat
+
+BASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MTIG_INSTRUMENT = os.path.join(BASE_PATH, 'conf', 'instruments', 'MTi-G.json')
+
+
+def mtig_frame(mid, fields_data):
+    """Return an MTi-G frame: preamble, BID, MID, length, data and checksum."""
+    data = bytearray([0xFF, mid, len(fields_data)]) + fields_data
+    return bytearray([0xFA]) + data + bytearray([-sum(data) & 0xFF])
+
+
+class MTiGChecksumTest(unittest.TestCase):
+
+    def setUp(self):
+        self.instrument = Instrument(MTIG_INSTRUMENT)
+        self.fields_data = bytearray(struct.pack('>9f', *range(9)))
+        self.frame = mtig_frame(50, self.fields_data)
+
+    def test_unframe(self):
+        framer = Framer(self.instrument)
+        packet = framer.unframe(self.frame)
+        self.assertEqual(packet, bytearray([50, len(self.fields_data)]) +
+                                 self.fields_data + self.frame[-1:])
+        self.assertEqual((framer.accepted, framer.rejected), (1, 0))
+
+    def test_unframe_wrong_checksum(self):
+        framer = Framer(self.instrument)
+        self.frame[-1] ^= 0xFF
+        self.assertIsNone(framer.unframe(self.frame))
+        self.assertEqual((framer.accepted, framer.rejected), (0, 1))
+
+    def test_extract(self):
+        framer = Framer(self.instrument)
+        packets = [bytearray(p) for p in framer.feed(self.frame * 3)]
+        self.assertEqual(len(packets), 3)
+        self.assertEqual((framer.accepted, framer.rejected), (3, 0))
+
+    def test_extract_dle(self):
+        # packets delimited by DLE marks, with DLE bytes to un-escape
+        format = self.instrument.packet_format
+        format.start_bytes = [0x10]
+        format.end_bytes = [0x10, 0x03]
+        format.byte_stuffing = PacketFormat.ByteStuffing.dle
+        format.rx_format = [field for field in format.rx_format
+                            if field != PacketFormat.FormatField.length]
+        format.rx_format.append(PacketFormat.FormatField.end_bytes)
+        data = bytearray([50, 0x10, 0x01, 0x10, 0x02])
+        checksum = -(0x10 + sum(data)) & 0xFF
+        packet = data + bytearray([checksum])
+        frame = (bytearray([0x10]) + packet.replace(bytearray([0x10]), bytearray([0x10, 0x10])) +
+                 bytearray([0x10, 0x03]))
+
+        framer = Framer(self.instrument)
+        packets = [bytearray(p) for p in framer.feed(frame * 2)]
+        self.assertEqual(packets, [packet, packet])
+        self.assertEqual((framer.accepted, framer.rejected), (2, 0))
+
+        framer = Framer(self.instrument)
+        self.assertEqual(framer.unframe(frame), packet)
+
+
+class MaxPacketSizeTest(unittest.TestCase):
+
+    def setUp(self):
+        # packets only delimited by the start mark of the next packet
+        self.instrument = Instrument(MTIG_INSTRUMENT)
+        format = self.instrument.packet_format
+        format.rx_format = [PacketFormat.FormatField.start_bytes,
+                            PacketFormat.FormatField.packet_fields]
+        format.max_packet_size = 16
+        self.frame = bytearray([0xFA, 0xFF]) + bytearray(range(16))
+
+    def test_next_start_split(self):
+        # the next start mark of a packet of maximum size arrives in two reads
+        framer = Framer(self.instrument)
+        self.assertEqual(framer.feed(self.frame + self.frame[:1]), [])
+        packets = [bytearray(p) for p in framer.feed(self.frame[1:])]
+        self.assertEqual(packets, [self.frame[2:]])
+        self.assertEqual(framer.resyncs, 0)
+
+    def test_too_long(self):
+        framer = Framer(self.instrument)
+        self.assertEqual(framer.feed(self.frame + bytearray(2)), [])
+        self.assertEqual(framer.resyncs, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checks of the transmit queue of the connections.
+
+The waiting frames have to be coalesced into one write, written partially
+when the connection does not accept all of them, merged with an identical
+waiting frame and dropped (the oldest first) when the queue is full or the
+link is lost, with all the frames accounted for:
+
+    python -m unittest discover -s test -p 'test_*.py'
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from txqueue import TxQueue
+
+
+class TxQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = TxQueue(max_frames=4)
+
+    def test_coalesce(self):
+        for frame in ('ab', 'cd', 'ef'):
+            self.queue.put(bytearray(frame))
+        self.assertEqual(self.queue.data(), 'abcdef')
+        self.queue.consume(6)
+        self.assertEqual(self.queue.data(), '')
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.queue.sent, 3)
+
+    def test_partial_write(self):
+        self.queue.put('ab')
+        self.queue.put('cd')
+        self.queue.data()
+        self.queue.consume(3)
+        # only the first frame has been written completely
+        self.assertEqual(self.queue.sent, 1)
+        self.assertEqual(len(self.queue), 1)
+        # new frames wait until the data being written is finished
+        self.queue.put('ef')
+        self.assertEqual(self.queue.data(), 'd')
+        self.queue.consume(1)
+        self.assertEqual(self.queue.data(), 'ef')
+        self.queue.consume(2)
+        self.assertEqual(self.queue.sent, 3)
+        self.assertEqual(len(self.queue), 0)
+
+    def test_merge(self):
+        self.queue.put('ab')
+        self.queue.put('cd')
+        self.queue.put('ab')
+        self.assertEqual(self.queue.merged, 1)
+        self.assertEqual(self.queue.data(), 'abcd')
+        # the frame being written is not merged, it is sent again
+        self.queue.put('ab')
+        self.assertEqual(self.queue.merged, 1)
+        self.assertEqual(len(self.queue), 3)
+
+    def test_overflow(self):
+        for i in xrange(6):
+            self.queue.put(str(i))
+        # the oldest frames are dropped
+        self.assertEqual(self.queue.dropped, 2)
+        self.assertEqual(len(self.queue), 4)
+        self.assertEqual(self.queue.max_depth, 4)
+        self.assertEqual(self.queue.data(), '2345')
+        self.queue.consume(4)
+        self.assertEqual(self.queue.sent, 4)
+
+    def test_overflow_while_writing(self):
+        # the frames being written are not dropped, only the waiting ones
+        for i in xrange(4):
+            self.queue.put(str(i))
+        self.queue.data()
+        for i in xrange(4, 9):
+            self.queue.put(str(i))
+        self.assertEqual(self.queue.dropped, 1)
+        self.assertEqual(self.queue.max_depth, 8)
+        self.queue.consume(4)
+        self.assertEqual(self.queue.data(), '5678')
+
+    def test_clear(self):
+        for frame in ('ab', 'cd', 'ef'):
+            self.queue.put(frame)
+        self.queue.data()
+        self.queue.consume(3)
+        self.queue.put('gh')
+        self.queue.clear()
+        # the frame partially written and the waiting ones are dropped
+        self.assertEqual((self.queue.sent, self.queue.dropped), (1, 3))
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(self.queue.data(), '')
+
+    def test_accounting(self):
+        # every frame put is sent, merged or dropped
+        frames = [str(i % 7) for i in xrange(50)]
+        for i, frame in enumerate(frames):
+            self.queue.put(frame)
+            if i % 5 == 4:
+                self.queue.consume(len(self.queue.data()) // 2)
+        self.queue.clear()
+        queue = self.queue
+        self.assertEqual(queue.sent + queue.merged + queue.dropped, len(frames))
+        self.assertTrue(queue.summary().startswith(
+            "Frames sent: {0}, merged: {1}, dropped: {2}".format(queue.sent, queue.merged,
+                                                                 queue.dropped)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Local UDP sender to test UDP connections.
+
+It splits an input file (raw or capture) into the frames of an instrument
+and sends each one in a datagram, optionally preceded by a sequence counter
+and skipping some of them to check the lost datagrams counters:
+
+    python test/udp_sender.py conf/instruments/gps.json test/LOF06.bin \\
+        --port 5000 --rate 1000 --sequence-size 2 --skip-every 100
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from framer import Framer
+from instrument import Instrument, PacketFormat
+from replay import FastReplay
+
+
+def datagrams(instrument, filename, sequence_size):
+    """Generate the datagrams with the frames in the given file."""
+    framer = Framer(instrument)
+    sequence = None
+    if sequence_size:
+        sequence = struct.Struct(instrument.byte_order_char +
+                                 PacketFormat.SIZE_CODES[sequence_size])
+        modulus = 1 << (8 * sequence_size)
+
+    with open(filename, 'rb') as fp:
+        number = 0
+        for batch in FastReplay(fp, framer).batches(1024):
+            for packet in batch:
+                if framer.stuffed_dle:
+                    packet = packet.replace(framer.dle, framer.stuffed_dle)
+                frame = framer.start_bytes + packet + framer.end_bytes
+                if sequence:
+                    frame = bytearray(sequence.pack(number % modulus)) + frame
+                number += 1
+                yield frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send the frames of a file in UDP datagrams')
+    parser.add_argument('instrument', help='Instrument file (.json) of the frames')
+    parser.add_argument('input', help='Input file (raw or capture)')
+    parser.add_argument('--host', default='127.0.0.1', help='Destination host')
+    parser.add_argument('--port', type=int, default=5000, help='Destination port')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Datagrams per second (0: as fast as possible)')
+    parser.add_argument('--sequence-size', type=int, default=0, choices=(0, 1, 2, 4),
+                        help='Bytes of the sequence counter before each frame')
+    parser.add_argument('--skip-every', type=int, default=0,
+                        help='Do not send one datagram of every N (lost datagrams)')
+    args = parser.parse_args()
+
+    instrument = Instrument(os.path.abspath(args.instrument))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = (args.host, args.port)
+
+    sent = skipped = 0
+    start = time.time()
+    for number, datagram in enumerate(datagrams(instrument, args.input, args.sequence_size)):
+        if args.skip_every and number % args.skip_every == args.skip_every - 1:
+            skipped += 1
+            continue
+        if args.rate:
+            delay = start + number / args.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        sock.sendto(str(datagram), address)
+        sent += 1
+
+    elapsed = time.time() - start
+    print "Sent {0} datagrams ({1} skipped) in {2:.3f} s".format(sent, skipped, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the transports of the instrument connections.
+
+A transport opens and configures the I/O object of a connection type, and
+reads, writes and closes it without blocking. Instruments streaming
+datagrams are received with a DatagramReceiver, and TCP connections are
+opened again with the Reconnector policy when they are lost.
+
+The transports are only driven from outside: the Connection threads watch
+them with QSocketNotifiers and the channels with the I/O reactor, so each
+transport is implemented once for both. It does not depend on Qt.
+"""
+import array
+import errno
+import fcntl
+import os
+import socket
+import termios
+
+import serial
+
+from capture import CaptureStream, is_capture
+from datagram import DatagramReceiver
+import instrument
+from reconnect import Reconnector
+import serialport
+
+
+class Transport(object):
+
+    @staticmethod
+    def create(instr, log):
+        conn_type = instrument.ConnectionCfg.Type
+        transport = {
+            conn_type.file:     FileTransport,
+            conn_type.serial: SerialTransport,
+            conn_type.tcp:     TCPTransport,
+            conn_type.udp:     UDPTransport,
+            conn_type.unix:   UnixTransport
+        }.get(instr.connection.type, None)
+
+        if not transport:
+            raise Exception('Connection type not implemented')
+
+        return transport(instr, log)
+
+    # bytes read at once when the input bytes waiting are not known
+    READ_SIZE = 4096
+
+    # whether a read of no bytes means that the connection was closed (end
+    # of stream of sockets and files)
+    EMPTY_READ_CLOSES = True
+
+    def __init__(self, instrument, log):
+        # instrument description
+        self.instrument = instrument
+
+        # I/O object, while the transport is open
+        self.io_conn = None
+
+        # datagrams receiver, with its counters, when each datagram holds a
+        # whole frame (see receive)
+        self.receiver = None
+
+        # logger of the connection using the transport
+        self.log = log
+
+    def open(self):
+        """Open the I/O object.
+
+        Returns whether it has been opened, the errors are logged.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Close the I/O object, if it is open."""
+        if self.io_conn:
+            self.log.info("Closing connection")
+            self.io_conn.close()
+            self.io_conn = None
+
+    def fileno(self):
+        return self.io_conn.fileno()
+
+    def bytes_available(self):
+        """Number of bytes to read now: the input bytes waiting, or READ_SIZE
+        when they are not known."""
+        return self.READ_SIZE
+
+    def read_into(self, buffer):
+        """Read input data into the given writable buffer.
+
+        Returns the number of bytes read, 0 when the connection has been
+        closed by the other end (if EMPTY_READ_CLOSES), or None when there is
+        no data.
+        """
+        raise NotImplementedError
+
+    def write_some(self, data):
+        """Write data without blocking.
+
+        Returns the number of bytes written, 0 if the connection does not
+        accept more data now.
+        """
+        try:
+            return os.write(self.fileno(), data)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise
+
+    def receive(self, framer, max_packets=0):
+        """Receive the datagrams waiting, checking them with framer.
+
+        Only for transports with a receiver, see DatagramReceiver.receive.
+        """
+        return self.receiver.receive(self.io_conn, framer, max_packets)
+
+    def send_datagram(self, data):
+        """Send a frame in a datagram, to the receiver destination."""
+        address = self.receiver.destination()
+        if not address:
+            self.log.error("No datagram received yet, command can not be sent")
+            return
+        self.io_conn.sendto(str(data), address)
+
+
+class SocketTransport(Transport):
+    """Transport of a non-blocking socket."""
+
+    def bytes_available(self):
+        # a readable socket without data has been closed, the read finds it
+        available = array.array('i', [0])
+        fcntl.ioctl(self.fileno(), termios.FIONREAD, available)
+        return available[0] or self.READ_SIZE
+
+    def read_into(self, buffer):
+        try:
+            return self.io_conn.recv_into(buffer)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return None
+            raise
+
+    def write_some(self, data):
+        try:
+            return self.io_conn.send(data)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise
+
+    def close(self):
+        if self.io_conn and self.receiver:
+            self.log.info(self.receiver.summary(self.io_conn))
+        Transport.close(self)
+        if self.receiver:
+            self.receiver.unlink()
+
+
+class SerialTransport(Transport):
+
+    # Serial Constants
+    BYTESIZE = {
+                    5: serial.FIVEBITS,
+                    6: serial.SIXBITS,
+                    7: serial.SEVENBITS,
+                    8: serial.EIGHTBITS
+                }
+
+    PARITY = {
+                'N': serial.PARITY_NONE,
+                'E': serial.PARITY_EVEN,
+                'O': serial.PARITY_ODD
+            }
+
+    STOPBITS = {
+                    1: serial.STOPBITS_ONE,
+                    2: serial.STOPBITS_TWO
+                }
+
+    # serial ports have no end of stream, reads return no bytes when there
+    # is no data yet (e.g.: VMIN=0 or a readiness without data)
+    EMPTY_READ_CLOSES = False
+
+    def open(self):
+        conn = self.instrument.connection
+        io_conn = serial.Serial()
+        io_conn.port = conn.serial_port
+        io_conn.baudrate = conn.baudrate
+        io_conn.bytesize = self.BYTESIZE[conn.data_bits]
+        io_conn.parity = self.PARITY[conn.parity]
+        io_conn.stopbits = self.STOPBITS[conn.stop_bits]
+        io_conn.timeout = 0 # non-blocking mode (return immediately on read)
+        try:
+            io_conn.open()
+        except serial.SerialException:
+            self.log.exception("Serial device can not be found or configured")
+            return False
+        self.io_conn = io_conn
+        self.log.info("Connected: {0}".format(io_conn.port))
+        serialport.configure_latency(io_conn, conn, self.log)
+        return True
+
+    def close(self):
+        if self.io_conn and self.io_conn.isOpen():
+            self.log.debug("Clearing serial port buffers (In and Out)")
+            self.io_conn.flushOutput()
+            self.io_conn.flushInput()
+        Transport.close(self)
+
+    def bytes_available(self):
+        return self.io_conn.inWaiting()
+
+    def read_into(self, buffer):
+        return self.io_conn.readinto(buffer)
+
+
+class TCPTransport(SocketTransport):
+    """TCP client, opened again after the reconnection delay when it is lost.
+
+    The connection is started by open and established when the socket is
+    writable, then finish_connect has to be called. When it fails or is
+    lost, lost returns the delay before calling open again.
+    """
+
+    def __init__(self, instrument, log):
+        SocketTransport.__init__(self, instrument, log)
+
+        # whether the connection has been established (data written before
+        # has to wait until then)
+        self.connected = False
+
+        # reconnection policy, with its metrics
+        self.reconnector = Reconnector(instrument.connection)
+
+    def open(self):
+        conn = self.instrument.connection
+        self.io_conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.io_conn.setblocking(0)
+        error = self.io_conn.connect_ex((conn.tcp_host, conn.tcp_port))
+        if error and error not in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.log.error("Can not connect: {0}".format(errno.errorcode.get(error, error)))
+            return False
+        return True
+
+    def finish_connect(self):
+        """Check the connection started by open, once the socket is writable.
+
+        Returns whether it has been established, the errors are logged.
+        """
+        error = self.io_conn.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            self.log.error("Can not connect: {0}".format(errno.errorcode.get(error, error)))
+            return False
+        downtime = self.reconnector.connected()
+        if downtime is None:
+            self.log.info("Connected: {0}".format(self.io_conn.getpeername()))
+        else:
+            txt = "Reconnected after {0:.1f} s ({1} reconnections)"
+            self.log.info(txt.format(downtime, self.reconnector.reconnects))
+        self.connected = True
+        return True
+
+    def lost(self):
+        """Close the socket, as the connection (or an attempt) has failed.
+
+        Returns the delay (seconds) before opening it again, or None if no
+        more attempts have to be made.
+        """
+        self.disconnect()
+        delay = self.reconnector.lost()
+        if delay is None:
+            if self.reconnector.max_attempts and self.reconnector.was_connected:
+                self.log.error("Can not reconnect, giving up")
+            return None
+        txt = "Reconnecting in {0:.1f} s (attempt {1} of {2})"
+        self.log.info(txt.format(delay, self.reconnector.attempts, self.reconnector.max_attempts))
+        return delay
+
+    def disconnect(self):
+        """Close the socket, keeping the transport ready to open it again."""
+        if self.io_conn:
+            self.io_conn.close()
+            self.io_conn = None
+        self.connected = False
+
+    def close(self):
+        if self.reconnector.reconnects or self.reconnector.attempts:
+            self.log.info(self.reconnector.summary())
+        SocketTransport.close(self)
+        self.connected = False
+
+    def write_some(self, data):
+        if not self.connected:
+            return 0
+        return SocketTransport.write_some(self, data)
+
+
+class UDPTransport(SocketTransport):
+
+    def __init__(self, instrument, log):
+        SocketTransport.__init__(self, instrument, log)
+        self.receiver = DatagramReceiver(instrument)
+
+    def open(self):
+        try:
+            self.io_conn = self.receiver.open()
+        except socket.error:
+            self.log.exception("Can not bind UDP socket to {0}".format(self.receiver.address))
+            return False
+        self.log.info("Listening: {0}".format(self.io_conn.getsockname()))
+        return True
+
+
+class UnixTransport(SocketTransport):
+    """Transport with a local producer through a Unix domain socket.
+
+    Stream sockets connect to the path where the producer listens and are
+    read as any byte stream. Datagram sockets are bound to the path and hold
+    a whole frame in each datagram, as UDP.
+    """
+
+    def __init__(self, instrument, log):
+        SocketTransport.__init__(self, instrument, log)
+        conn = instrument.connection
+        if conn.socket_type == conn.SocketType.datagram:
+            self.receiver = DatagramReceiver(instrument)
+
+    def open(self):
+        path = self.instrument.connection.socket_path
+        try:
+            if self.receiver:
+                self.io_conn = self.receiver.open()
+            else:
+                self.io_conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.io_conn.connect(path)
+                self.io_conn.setblocking(0)
+        except socket.error:
+            self.log.exception("Can not open Unix socket '{0}'".format(path))
+            if self.io_conn:
+                self.io_conn.close()
+                self.io_conn = None
+            return False
+        self.log.info("{0}: {1}".format("Listening" if self.receiver else "Connected", path))
+        return True
+
+
+class FileTransport(Transport):
+    """Input file, read as the data received from a device.
+
+    When it is not replayed (see replay module), only the data of the
+    records of capture files is read.
+    """
+
+    # bytes read at once from the input file
+    READ_SIZE = 65536
+
+    def open(self):
+        conn = self.instrument.connection
+        try:
+            self.io_conn = open(conn.filename, 'rb')
+        except IOError:
+            self.log.exception("The input file does not exist")
+            return False
+        if conn.replay == conn.ReplayMode.stream and is_capture(self.io_conn):
+            # read only the data of the capture records
+            self.io_conn = CaptureStream(self.io_conn)
+        return True
+
+    def close(self):
+        if self.io_conn:
+            self.log.info("Closing input file")
+            self.io_conn.close()
+            self.io_conn = None
+
+    def read_into(self, buffer):
+        return self.io_conn.readinto(buffer)
+
+    def write_some(self, data):
+        # file connection can not send data
+        raise NotImplementedError
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Module implementing the transmit queue of the instrument connections.
+
+Frames sent to an instrument are queued and written without blocking: all
+the frames waiting when the connection accepts data are coalesced into a
+single write. While the link is saturated frames stay in the queue, where a
+frame identical to one still waiting (e.g.: the next period of a periodic
+command) is merged with it, and the oldest frames are dropped when the
+queue is full. It does not depend on Qt, so it is used both by Connection
+and Channel.
+"""
+from collections import deque
+import time
+
+
+class TxQueue(object):
+
+    # frames waiting to be written, the oldest are dropped beyond it
+    MAX_FRAMES = 64
+
+    def __init__(self, max_frames=MAX_FRAMES):
+        self.max_frames = max_frames
+
+        # frames waiting to be coalesced: (frame data, time queued)
+        self.frames = deque()
+
+        # data being written (coalesced frames) and bytes of it written, and
+        # the end position and time queued of each frame in it
+        self.output = b''
+        self.written = 0
+        self.output_frames = deque()
+
+        # number of frames written, merged with an identical waiting frame
+        # and dropped, and maximum queue depth (frames)
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+        # time from queuing a frame until it is completely written (seconds)
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def __len__(self):
+        """Queue depth, frames not completely written yet."""
+        return len(self.frames) + len(self.output_frames)
+
+    def put(self, frame):
+        """Queue a frame to be written."""
+        frame = str(frame)
+        for waiting, _ in self.frames:
+            if waiting == frame:
+                # the waiting frame will send the same, it is not stale yet
+                self.merged += 1
+                return
+        if len(self.frames) >= self.max_frames:
+            self.frames.popleft()
+            self.dropped += 1
+        self.frames.append((frame, time.time()))
+        self.max_depth = max(self.max_depth, len(self))
+
+    def data(self):
+        """Return the data to be written next, empty if there is none.
+
+        When the previous data has been completely written, all the waiting
+        frames are coalesced into it.
+        """
+        if self.written >= len(self.output) and self.frames:
+            end = 0
+            for frame, queued in self.frames:
+                end += len(frame)
+                self.output_frames.append((end, queued))
+            self.output = b''.join([frame for frame, _ in self.frames])
+            self.written = 0
+            self.frames.clear()
+        if self.written:
+            return self.output[self.written:]
+        return self.output
+
+    def consume(self, size):
+        """Mark size bytes of the data returned by data() as written."""
+        self.written += size
+        now = time.time()
+        while self.output_frames and self.output_frames[0][0] <= self.written:
+            _, queued = self.output_frames.popleft()
+            latency = now - queued
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.sent += 1
+        if self.written >= len(self.output):
+            self.output = b''
+            self.written = 0
+
+    def clear(self):
+        """Drop all the frames not written yet (e.g.: the link has been lost)."""
+        self.dropped += len(self)
+        self.frames.clear()
+        self.output_frames.clear()
+        self.output = b''
+        self.written = 0
+
+    def summary(self):
+        """Return a text describing the frames sent."""
+        latency_mean = self.latency_total / self.sent if self.sent else 0.0
+        txt = ("Frames sent: {0}, merged: {1}, dropped: {2}, max queue depth: {3}, "
+               "tx latency mean: {4:.3f} ms, max: {5:.3f} ms")
+        return txt.format(self.sent, self.merged, self.dropped, self.max_depth,
+                          latency_mean * 1000, self.latency_max * 1000)
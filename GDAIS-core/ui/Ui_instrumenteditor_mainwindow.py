@@ -70,6 +70,7 @@ class Ui_InstrumentEditorMainWindow(object):
         self.conn_type.addItem(_fromUtf8(""))
         self.conn_type.addItem(_fromUtf8(""))
         self.conn_type.addItem(_fromUtf8(""))
+        self.conn_type.addItem(_fromUtf8(""))
         self.formLayout_4.setWidget(0, QtGui.QFormLayout.FieldRole, self.conn_type)
         self.horizontalLayout.addLayout(self.formLayout_4)
         spacerItem2 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
@@ -152,6 +153,54 @@ class Ui_InstrumentEditorMainWindow(object):
         spacerItem6 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
         self.horizontalLayout_34.addItem(spacerItem6)
         self.verticalLayout_16.addWidget(self.conn_tcp_group)
+        self.conn_udp_group = QtGui.QGroupBox(self.connection)
+        self.conn_udp_group.setEnabled(False)
+        self.conn_udp_group.setObjectName(_fromUtf8("conn_udp_group"))
+        self.horizontalLayout_35 = QtGui.QHBoxLayout(self.conn_udp_group)
+        self.horizontalLayout_35.setObjectName(_fromUtf8("horizontalLayout_35"))
+        self.formLayout_11 = QtGui.QFormLayout()
+        self.formLayout_11.setFieldGrowthPolicy(QtGui.QFormLayout.ExpandingFieldsGrow)
+        self.formLayout_11.setObjectName(_fromUtf8("formLayout_11"))
+        self.label_40 = QtGui.QLabel(self.conn_udp_group)
+        self.label_40.setObjectName(_fromUtf8("label_40"))
+        self.formLayout_11.setWidget(0, QtGui.QFormLayout.LabelRole, self.label_40)
+        self.conn_udp_host = QtGui.QLineEdit(self.conn_udp_group)
+        self.conn_udp_host.setObjectName(_fromUtf8("conn_udp_host"))
+        self.formLayout_11.setWidget(0, QtGui.QFormLayout.FieldRole, self.conn_udp_host)
+        self.label_41 = QtGui.QLabel(self.conn_udp_group)
+        self.label_41.setObjectName(_fromUtf8("label_41"))
+        self.formLayout_11.setWidget(1, QtGui.QFormLayout.LabelRole, self.label_41)
+        self.conn_udp_port = QtGui.QLineEdit(self.conn_udp_group)
+        self.conn_udp_port.setObjectName(_fromUtf8("conn_udp_port"))
+        self.formLayout_11.setWidget(1, QtGui.QFormLayout.FieldRole, self.conn_udp_port)
+        self.label_42 = QtGui.QLabel(self.conn_udp_group)
+        self.label_42.setObjectName(_fromUtf8("label_42"))
+        self.formLayout_11.setWidget(2, QtGui.QFormLayout.LabelRole, self.label_42)
+        self.conn_udp_sequence_size = QtGui.QLineEdit(self.conn_udp_group)
+        self.conn_udp_sequence_size.setObjectName(_fromUtf8("conn_udp_sequence_size"))
+        self.formLayout_11.setWidget(2, QtGui.QFormLayout.FieldRole, self.conn_udp_sequence_size)
+        self.horizontalLayout_35.addLayout(self.formLayout_11)
+        spacerItem7 = QtGui.QSpacerItem(50, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_35.addItem(spacerItem7)
+        self.formLayout_12 = QtGui.QFormLayout()
+        self.formLayout_12.setFieldGrowthPolicy(QtGui.QFormLayout.ExpandingFieldsGrow)
+        self.formLayout_12.setObjectName(_fromUtf8("formLayout_12"))
+        self.label_43 = QtGui.QLabel(self.conn_udp_group)
+        self.label_43.setObjectName(_fromUtf8("label_43"))
+        self.formLayout_12.setWidget(0, QtGui.QFormLayout.LabelRole, self.label_43)
+        self.conn_udp_remote_host = QtGui.QLineEdit(self.conn_udp_group)
+        self.conn_udp_remote_host.setObjectName(_fromUtf8("conn_udp_remote_host"))
+        self.formLayout_12.setWidget(0, QtGui.QFormLayout.FieldRole, self.conn_udp_remote_host)
+        self.label_44 = QtGui.QLabel(self.conn_udp_group)
+        self.label_44.setObjectName(_fromUtf8("label_44"))
+        self.formLayout_12.setWidget(1, QtGui.QFormLayout.LabelRole, self.label_44)
+        self.conn_udp_remote_port = QtGui.QLineEdit(self.conn_udp_group)
+        self.conn_udp_remote_port.setObjectName(_fromUtf8("conn_udp_remote_port"))
+        self.formLayout_12.setWidget(1, QtGui.QFormLayout.FieldRole, self.conn_udp_remote_port)
+        self.horizontalLayout_35.addLayout(self.formLayout_12)
+        spacerItem8 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_35.addItem(spacerItem8)
+        self.verticalLayout_16.addWidget(self.conn_udp_group)
         self.conn_file_group = QtGui.QGroupBox(self.connection)
         self.conn_file_group.setEnabled(False)
         self.conn_file_group.setObjectName(_fromUtf8("conn_file_group"))
@@ -170,8 +219,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.horizontalLayout_17.addWidget(self.conn_file_name_btn)
         self.formLayout_5.setLayout(0, QtGui.QFormLayout.FieldRole, self.horizontalLayout_17)
         self.verticalLayout_16.addWidget(self.conn_file_group)
-        spacerItem7 = QtGui.QSpacerItem(20, 281, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
-        self.verticalLayout_16.addItem(spacerItem7)
+        spacerItem9 = QtGui.QSpacerItem(20, 281, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
+        self.verticalLayout_16.addItem(spacerItem9)
         self.tabWidget.addTab(self.connection, _fromUtf8(""))
         self.packet_format = QtGui.QWidget()
         self.packet_format.setObjectName(_fromUtf8("packet_format"))
@@ -189,6 +238,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_rx_format_0.addItem(_fromUtf8(""))
         self.pf_rx_format_0.addItem(_fromUtf8(""))
         self.pf_rx_format_0.addItem(_fromUtf8(""))
+        self.pf_rx_format_0.addItem(_fromUtf8(""))
+        self.pf_rx_format_0.addItem(_fromUtf8(""))
         self.horizontalLayout_4.addWidget(self.pf_rx_format_0)
         self.pf_rx_format_1 = QtGui.QComboBox(self.packet_format)
         self.pf_rx_format_1.setObjectName(_fromUtf8("pf_rx_format_1"))
@@ -197,6 +248,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_rx_format_1.addItem(_fromUtf8(""))
         self.pf_rx_format_1.addItem(_fromUtf8(""))
         self.pf_rx_format_1.addItem(_fromUtf8(""))
+        self.pf_rx_format_1.addItem(_fromUtf8(""))
+        self.pf_rx_format_1.addItem(_fromUtf8(""))
         self.horizontalLayout_4.addWidget(self.pf_rx_format_1)
         self.pf_rx_format_2 = QtGui.QComboBox(self.packet_format)
         self.pf_rx_format_2.setObjectName(_fromUtf8("pf_rx_format_2"))
@@ -205,6 +258,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_rx_format_2.addItem(_fromUtf8(""))
         self.pf_rx_format_2.addItem(_fromUtf8(""))
         self.pf_rx_format_2.addItem(_fromUtf8(""))
+        self.pf_rx_format_2.addItem(_fromUtf8(""))
+        self.pf_rx_format_2.addItem(_fromUtf8(""))
         self.horizontalLayout_4.addWidget(self.pf_rx_format_2)
         self.pf_rx_format_3 = QtGui.QComboBox(self.packet_format)
         self.pf_rx_format_3.setObjectName(_fromUtf8("pf_rx_format_3"))
@@ -213,9 +268,31 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_rx_format_3.addItem(_fromUtf8(""))
         self.pf_rx_format_3.addItem(_fromUtf8(""))
         self.pf_rx_format_3.addItem(_fromUtf8(""))
+        self.pf_rx_format_3.addItem(_fromUtf8(""))
+        self.pf_rx_format_3.addItem(_fromUtf8(""))
         self.horizontalLayout_4.addWidget(self.pf_rx_format_3)
-        spacerItem8 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_4.addItem(spacerItem8)
+        self.pf_rx_format_4 = QtGui.QComboBox(self.packet_format)
+        self.pf_rx_format_4.setObjectName(_fromUtf8("pf_rx_format_4"))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.pf_rx_format_4.addItem(_fromUtf8(""))
+        self.horizontalLayout_4.addWidget(self.pf_rx_format_4)
+        self.pf_rx_format_5 = QtGui.QComboBox(self.packet_format)
+        self.pf_rx_format_5.setObjectName(_fromUtf8("pf_rx_format_5"))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.pf_rx_format_5.addItem(_fromUtf8(""))
+        self.horizontalLayout_4.addWidget(self.pf_rx_format_5)
+        spacerItem10 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_4.addItem(spacerItem10)
         self.verticalLayout_8.addLayout(self.horizontalLayout_4)
         self.label_14 = QtGui.QLabel(self.packet_format)
         self.label_14.setObjectName(_fromUtf8("label_14"))
@@ -229,6 +306,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_tx_format_0.addItem(_fromUtf8(""))
         self.pf_tx_format_0.addItem(_fromUtf8(""))
         self.pf_tx_format_0.addItem(_fromUtf8(""))
+        self.pf_tx_format_0.addItem(_fromUtf8(""))
+        self.pf_tx_format_0.addItem(_fromUtf8(""))
         self.horizontalLayout_16.addWidget(self.pf_tx_format_0)
         self.pf_tx_format_1 = QtGui.QComboBox(self.packet_format)
         self.pf_tx_format_1.setObjectName(_fromUtf8("pf_tx_format_1"))
@@ -237,6 +316,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_tx_format_1.addItem(_fromUtf8(""))
         self.pf_tx_format_1.addItem(_fromUtf8(""))
         self.pf_tx_format_1.addItem(_fromUtf8(""))
+        self.pf_tx_format_1.addItem(_fromUtf8(""))
+        self.pf_tx_format_1.addItem(_fromUtf8(""))
         self.horizontalLayout_16.addWidget(self.pf_tx_format_1)
         self.pf_tx_format_2 = QtGui.QComboBox(self.packet_format)
         self.pf_tx_format_2.setObjectName(_fromUtf8("pf_tx_format_2"))
@@ -245,6 +326,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_tx_format_2.addItem(_fromUtf8(""))
         self.pf_tx_format_2.addItem(_fromUtf8(""))
         self.pf_tx_format_2.addItem(_fromUtf8(""))
+        self.pf_tx_format_2.addItem(_fromUtf8(""))
+        self.pf_tx_format_2.addItem(_fromUtf8(""))
         self.horizontalLayout_16.addWidget(self.pf_tx_format_2)
         self.pf_tx_format_3 = QtGui.QComboBox(self.packet_format)
         self.pf_tx_format_3.setObjectName(_fromUtf8("pf_tx_format_3"))
@@ -253,9 +336,31 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_tx_format_3.addItem(_fromUtf8(""))
         self.pf_tx_format_3.addItem(_fromUtf8(""))
         self.pf_tx_format_3.addItem(_fromUtf8(""))
+        self.pf_tx_format_3.addItem(_fromUtf8(""))
+        self.pf_tx_format_3.addItem(_fromUtf8(""))
         self.horizontalLayout_16.addWidget(self.pf_tx_format_3)
-        spacerItem9 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_16.addItem(spacerItem9)
+        self.pf_tx_format_4 = QtGui.QComboBox(self.packet_format)
+        self.pf_tx_format_4.setObjectName(_fromUtf8("pf_tx_format_4"))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.pf_tx_format_4.addItem(_fromUtf8(""))
+        self.horizontalLayout_16.addWidget(self.pf_tx_format_4)
+        self.pf_tx_format_5 = QtGui.QComboBox(self.packet_format)
+        self.pf_tx_format_5.setObjectName(_fromUtf8("pf_tx_format_5"))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.pf_tx_format_5.addItem(_fromUtf8(""))
+        self.horizontalLayout_16.addWidget(self.pf_tx_format_5)
+        spacerItem11 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_16.addItem(spacerItem11)
         self.verticalLayout_8.addLayout(self.horizontalLayout_16)
         self.line_5 = QtGui.QFrame(self.packet_format)
         self.line_5.setFrameShape(QtGui.QFrame.HLine)
@@ -277,16 +382,16 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_add_start_byte = QtGui.QPushButton(self.packet_format)
         self.pf_add_start_byte.setObjectName(_fromUtf8("pf_add_start_byte"))
         self.horizontalLayout_3.addWidget(self.pf_add_start_byte)
-        spacerItem10 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_3.addItem(spacerItem10)
+        spacerItem12 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_3.addItem(spacerItem12)
         self.pf_delete_start_byte = QtGui.QPushButton(self.packet_format)
         self.pf_delete_start_byte.setEnabled(False)
         self.pf_delete_start_byte.setObjectName(_fromUtf8("pf_delete_start_byte"))
         self.horizontalLayout_3.addWidget(self.pf_delete_start_byte)
         self.verticalLayout_2.addLayout(self.horizontalLayout_3)
         self.horizontalLayout_15.addLayout(self.verticalLayout_2)
-        spacerItem11 = QtGui.QSpacerItem(80, 50, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_15.addItem(spacerItem11)
+        spacerItem13 = QtGui.QSpacerItem(80, 50, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_15.addItem(spacerItem13)
         self.verticalLayout_3 = QtGui.QVBoxLayout()
         self.verticalLayout_3.setObjectName(_fromUtf8("verticalLayout_3"))
         self.label_17 = QtGui.QLabel(self.packet_format)
@@ -300,8 +405,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_add_end_byte = QtGui.QPushButton(self.packet_format)
         self.pf_add_end_byte.setObjectName(_fromUtf8("pf_add_end_byte"))
         self.horizontalLayout_2.addWidget(self.pf_add_end_byte)
-        spacerItem12 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_2.addItem(spacerItem12)
+        spacerItem14 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_2.addItem(spacerItem14)
         self.pf_delete_end_byte = QtGui.QPushButton(self.packet_format)
         self.pf_delete_end_byte.setEnabled(False)
         self.pf_delete_end_byte.setObjectName(_fromUtf8("pf_delete_end_byte"))
@@ -330,8 +435,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.rx_packets_add = QtGui.QPushButton(self.rx_packets)
         self.rx_packets_add.setObjectName(_fromUtf8("rx_packets_add"))
         self.horizontalLayout_11.addWidget(self.rx_packets_add)
-        spacerItem13 = QtGui.QSpacerItem(20, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_11.addItem(spacerItem13)
+        spacerItem15 = QtGui.QSpacerItem(20, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_11.addItem(spacerItem15)
         self.rx_packets_delete = QtGui.QPushButton(self.rx_packets)
         self.rx_packets_delete.setEnabled(False)
         self.rx_packets_delete.setObjectName(_fromUtf8("rx_packets_delete"))
@@ -363,8 +468,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.rx_packets_name.setObjectName(_fromUtf8("rx_packets_name"))
         self.formLayout_2.setWidget(1, QtGui.QFormLayout.FieldRole, self.rx_packets_name)
         self.horizontalLayout_6.addLayout(self.formLayout_2)
-        spacerItem14 = QtGui.QSpacerItem(60, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_6.addItem(spacerItem14)
+        spacerItem16 = QtGui.QSpacerItem(60, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_6.addItem(spacerItem16)
         self.verticalLayout_4.addLayout(self.horizontalLayout_6)
         self.line = QtGui.QFrame(self.rx_packets)
         self.line.setFrameShape(QtGui.QFrame.HLine)
@@ -376,8 +481,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.label_20 = QtGui.QLabel(self.rx_packets)
         self.label_20.setObjectName(_fromUtf8("label_20"))
         self.horizontalLayout_5.addWidget(self.label_20)
-        spacerItem15 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_5.addItem(spacerItem15)
+        spacerItem17 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_5.addItem(spacerItem17)
         self.verticalLayout_4.addLayout(self.horizontalLayout_5)
         self.rx_packets_fields = QtGui.QTreeWidget(self.rx_packets)
         self.rx_packets_fields.setRootIsDecorated(False)
@@ -389,8 +494,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.rx_packets_add_field = QtGui.QPushButton(self.rx_packets)
         self.rx_packets_add_field.setObjectName(_fromUtf8("rx_packets_add_field"))
         self.horizontalLayout_7.addWidget(self.rx_packets_add_field)
-        spacerItem16 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_7.addItem(spacerItem16)
+        spacerItem18 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_7.addItem(spacerItem18)
         self.rx_packets_delete_field = QtGui.QPushButton(self.rx_packets)
         self.rx_packets_delete_field.setEnabled(False)
         self.rx_packets_delete_field.setObjectName(_fromUtf8("rx_packets_delete_field"))
@@ -418,8 +523,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.tx_packets_add = QtGui.QPushButton(self.tx_packets)
         self.tx_packets_add.setObjectName(_fromUtf8("tx_packets_add"))
         self.horizontalLayout_12.addWidget(self.tx_packets_add)
-        spacerItem17 = QtGui.QSpacerItem(20, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_12.addItem(spacerItem17)
+        spacerItem19 = QtGui.QSpacerItem(20, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_12.addItem(spacerItem19)
         self.tx_packets_delete = QtGui.QPushButton(self.tx_packets)
         self.tx_packets_delete.setEnabled(False)
         self.tx_packets_delete.setObjectName(_fromUtf8("tx_packets_delete"))
@@ -450,8 +555,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.tx_packets_name.setObjectName(_fromUtf8("tx_packets_name"))
         self.formLayout_3.setWidget(1, QtGui.QFormLayout.FieldRole, self.tx_packets_name)
         self.horizontalLayout_9.addLayout(self.formLayout_3)
-        spacerItem18 = QtGui.QSpacerItem(60, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_9.addItem(spacerItem18)
+        spacerItem20 = QtGui.QSpacerItem(60, 20, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_9.addItem(spacerItem20)
         self.verticalLayout_5.addLayout(self.horizontalLayout_9)
         self.line_2 = QtGui.QFrame(self.tx_packets)
         self.line_2.setFrameShape(QtGui.QFrame.HLine)
@@ -463,8 +568,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.label_13 = QtGui.QLabel(self.tx_packets)
         self.label_13.setObjectName(_fromUtf8("label_13"))
         self.horizontalLayout_8.addWidget(self.label_13)
-        spacerItem19 = QtGui.QSpacerItem(168, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_8.addItem(spacerItem19)
+        spacerItem21 = QtGui.QSpacerItem(168, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_8.addItem(spacerItem21)
         self.verticalLayout_5.addLayout(self.horizontalLayout_8)
         self.tx_packets_fields = QtGui.QTreeWidget(self.tx_packets)
         self.tx_packets_fields.setRootIsDecorated(False)
@@ -476,8 +581,8 @@ class Ui_InstrumentEditorMainWindow(object):
         self.tx_packets_add_field = QtGui.QPushButton(self.tx_packets)
         self.tx_packets_add_field.setObjectName(_fromUtf8("tx_packets_add_field"))
         self.horizontalLayout_10.addWidget(self.tx_packets_add_field)
-        spacerItem20 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
-        self.horizontalLayout_10.addItem(spacerItem20)
+        spacerItem22 = QtGui.QSpacerItem(40, 20, QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Minimum)
+        self.horizontalLayout_10.addItem(spacerItem22)
         self.tx_packets_delete_field = QtGui.QPushButton(self.tx_packets)
         self.tx_packets_delete_field.setEnabled(False)
         self.tx_packets_delete_field.setObjectName(_fromUtf8("tx_packets_delete_field"))
@@ -523,6 +628,11 @@ class Ui_InstrumentEditorMainWindow(object):
         self.label_5.setBuddy(self.conn_serial_port)
         self.label_6.setBuddy(self.conn_serial_baudrate)
         self.label_8.setBuddy(self.conn_serial_port)
+        self.label_40.setBuddy(self.conn_udp_host)
+        self.label_41.setBuddy(self.conn_udp_port)
+        self.label_42.setBuddy(self.conn_udp_sequence_size)
+        self.label_43.setBuddy(self.conn_udp_remote_host)
+        self.label_44.setBuddy(self.conn_udp_remote_port)
         self.label_7.setBuddy(self.conn_serial_port)
 
         self.retranslateUi(InstrumentEditorMainWindow)
@@ -530,9 +640,13 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_rx_format_1.setCurrentIndex(1)
         self.pf_rx_format_2.setCurrentIndex(2)
         self.pf_rx_format_3.setCurrentIndex(3)
+        self.pf_rx_format_4.setCurrentIndex(4)
+        self.pf_rx_format_5.setCurrentIndex(4)
         self.pf_tx_format_1.setCurrentIndex(1)
         self.pf_tx_format_2.setCurrentIndex(2)
         self.pf_tx_format_3.setCurrentIndex(3)
+        self.pf_tx_format_4.setCurrentIndex(4)
+        self.pf_tx_format_5.setCurrentIndex(4)
         QtCore.QObject.connect(self.action_Quit, QtCore.SIGNAL(_fromUtf8("triggered()")), InstrumentEditorMainWindow.close)
         QtCore.QMetaObject.connectSlotsByName(InstrumentEditorMainWindow)
 
@@ -547,6 +661,7 @@ class Ui_InstrumentEditorMainWindow(object):
         self.conn_type.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Serial", None, QtGui.QApplication.UnicodeUTF8))
         self.conn_type.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "TCP", None, QtGui.QApplication.UnicodeUTF8))
         self.conn_type.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "File", None, QtGui.QApplication.UnicodeUTF8))
+        self.conn_type.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "UDP", None, QtGui.QApplication.UnicodeUTF8))
         self.conn_serial_group.setTitle(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Serial Connection", None, QtGui.QApplication.UnicodeUTF8))
         self.label_5.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Port", None, QtGui.QApplication.UnicodeUTF8))
         self.label_6.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Baudrate", None, QtGui.QApplication.UnicodeUTF8))
@@ -556,6 +671,12 @@ class Ui_InstrumentEditorMainWindow(object):
         self.conn_tcp_group.setTitle(QtGui.QApplication.translate("InstrumentEditorMainWindow", "TCP Connection", None, QtGui.QApplication.UnicodeUTF8))
         self.label_8.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Host", None, QtGui.QApplication.UnicodeUTF8))
         self.label_39.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Port", None, QtGui.QApplication.UnicodeUTF8))
+        self.conn_udp_group.setTitle(QtGui.QApplication.translate("InstrumentEditorMainWindow", "UDP Connection", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_40.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Host", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_41.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Port", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_42.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Sequence bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_43.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Remote host", None, QtGui.QApplication.UnicodeUTF8))
+        self.label_44.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Remote port", None, QtGui.QApplication.UnicodeUTF8))
         self.conn_file_group.setTitle(QtGui.QApplication.translate("InstrumentEditorMainWindow", "File Connection", None, QtGui.QApplication.UnicodeUTF8))
         self.label_7.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "File name", None, QtGui.QApplication.UnicodeUTF8))
         self.conn_file_name_btn.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "...", None, QtGui.QApplication.UnicodeUTF8))
@@ -566,42 +687,86 @@ class Ui_InstrumentEditorMainWindow(object):
         self.pf_rx_format_0.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_0.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_0.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_0.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_0.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_1.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_1.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_1.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_1.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_1.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_1.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_1.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_2.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_2.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_2.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_2.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_2.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_2.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_2.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_3.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_3.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_3.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_3.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_rx_format_3.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_3.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_3.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_4.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_rx_format_5.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.label_14.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "tx packets format:", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_0.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_0.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_0.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_0.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_0.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_0.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_0.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_1.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_1.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_1.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_1.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_1.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_1.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_1.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_2.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_2.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_2.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_2.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_2.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_2.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_2.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_3.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_3.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_3.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_3.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_tx_format_3.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_3.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_3.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_4.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(0, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(1, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet num", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(2, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Packet fields", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(3, QtGui.QApplication.translate("InstrumentEditorMainWindow", "End bytes", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(4, QtGui.QApplication.translate("InstrumentEditorMainWindow", "none", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(5, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Length", None, QtGui.QApplication.UnicodeUTF8))
+        self.pf_tx_format_5.setItemText(6, QtGui.QApplication.translate("InstrumentEditorMainWindow", "Checksum", None, QtGui.QApplication.UnicodeUTF8))
         self.label_16.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Start bytes", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_add_start_byte.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Add new...", None, QtGui.QApplication.UnicodeUTF8))
         self.pf_delete_start_byte.setText(QtGui.QApplication.translate("InstrumentEditorMainWindow", "Delete", None, QtGui.QApplication.UnicodeUTF8))
@@ -22,6 +22,9 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
     
     FILEDIALOG_FILTER = "Instrument configuration (*.json)"
     
+    # number of packet format fields that can be selected
+    FORMAT_FIELDS = 6
+    
     def __init__(self, parent = None):
         """
         Constructor
@@ -274,7 +277,7 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
             self.rx_packets_num.setText(num)
             self.rx_packets_name.setText(packet.name)
             for field in packet.fields:
-                item = QTreeWidgetItem([field.name, field.type])
+                item = QTreeWidgetItem([field.name, field.type_text()])
                 item.setFlags(item.flags() | Qt.ItemIsEditable)
                 self.rx_packets_fields.addTopLevelItem(item)
             
@@ -283,7 +286,7 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
             self.tx_packets_num.setText(num)
             self.tx_packets_name.setText(packet.name)
             for field in packet.fields:
-                item = QTreeWidgetItem([field.name, field.type])
+                item = QTreeWidgetItem([field.name, field.type_text()])
                 item.setFlags(item.flags() | Qt.ItemIsEditable)
                 self.tx_packets_fields.addTopLevelItem(item)
             
@@ -297,7 +300,7 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
             packet.fields = []
             for i in xrange(self.rx_packets_fields.topLevelItemCount()):
                 item = self.rx_packets_fields.takeTopLevelItem(0)
-                field = Field(str(item.text(0)), str(item.text(1)))
+                field = Field.from_text(str(item.text(0)), str(item.text(1)))
                 packet.fields.append(field)
             
         elif type == self.instrument.TX_PACKET:
@@ -306,7 +309,7 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
             packet.fields = []
             for i in xrange(self.tx_packets_fields.topLevelItemCount()):
                 item = self.tx_packets_fields.takeTopLevelItem(0)
-                field = Field(str(item.text(0)), str(item.text(1)))
+                field = Field.from_text(str(item.text(0)), str(item.text(1)))
                 packet.fields.append(field)
             
         else:
@@ -333,6 +336,14 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
             self.conn_tcp_group.setEnabled(True)
             self.conn_tcp_host.setText(conn.tcp_host)
             self.conn_tcp_port.setText(str(conn.tcp_port))
+        
+        elif conn.type == ConnectionCfg.Type.udp:
+            self.conn_udp_group.setEnabled(True)
+            self.conn_udp_host.setText(conn.udp_host)
+            self.conn_udp_port.setText(str(conn.udp_port))
+            self.conn_udp_sequence_size.setText(str(conn.sequence_size))
+            self.conn_udp_remote_host.setText(conn.udp_remote_host)
+            self.conn_udp_remote_port.setText(str(conn.udp_remote_port))
     
     def clear_connection(self):
         
@@ -349,6 +360,13 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
         self.conn_tcp_group.setEnabled(False)
         self.conn_tcp_host.setText('')
         self.conn_tcp_port.setText('')
+        
+        self.conn_udp_group.setEnabled(False)
+        self.conn_udp_host.setText('')
+        self.conn_udp_port.setText('')
+        self.conn_udp_sequence_size.setText('')
+        self.conn_udp_remote_host.setText('')
+        self.conn_udp_remote_port.setText('')
     
     def save_connection(self):
         conn = self.instrument.connection
@@ -366,6 +384,13 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
         elif conn.type == ConnectionCfg.Type.tcp:
             conn.tcp_host = str(self.conn_tcp_host.text())
             conn.tcp_port = int(self.conn_tcp_port.text())
+        
+        elif conn.type == ConnectionCfg.Type.udp:
+            conn.udp_host = str(self.conn_udp_host.text())
+            conn.udp_port = int(self.conn_udp_port.text())
+            conn.sequence_size = int(self.conn_udp_sequence_size.text() or 0)
+            conn.udp_remote_host = str(self.conn_udp_remote_host.text())
+            conn.udp_remote_port = int(self.conn_udp_remote_port.text() or 0)
 
     def load_instrument(self, instrument):
         self.clear_instrument()
@@ -378,7 +403,12 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
         self.byte_order.setCurrentIndex(self.byte_order.findText(self.instrument.byte_order))
         
         # connection
-        self.conn_type.setCurrentIndex(self.conn_type.findText(self.instrument.connection.type))
+        # connection types not edited here (Unix) are kept as they are, as
+        # selecting them in the combo would change the type
+        conn_type_index = self.conn_type.findText(self.instrument.connection.type)
+        self.conn_type.setEnabled(conn_type_index >= 0)
+        if conn_type_index >= 0:
+            self.conn_type.setCurrentIndex(conn_type_index)
         self.load_connection()
         
         # packet format
@@ -416,7 +446,7 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
         self.clear_connection()
         
         none_index = 4 # TODO: improve
-        for i in range(4):
+        for i in range(self.FORMAT_FIELDS):
             getattr(self, 'pf_rx_format_{0}'.format(i)).setCurrentIndex(none_index)
             getattr(self, 'pf_tx_format_{0}'.format(i)).setCurrentIndex(none_index)
         
@@ -445,14 +475,14 @@ class InstrumentEditorMainWindow(QMainWindow, Ui_InstrumentEditorMainWindow):
         
         # packet format
         self.instrument.packet_format.rx_format = []
-        for i in range(4):
+        for i in range(self.FORMAT_FIELDS):
             combo_box = getattr(self, 'pf_rx_format_{0}'.format(i))
             field = str(combo_box.currentText())
             if field != PacketFormat.FormatField.empty:
                 self.instrument.packet_format.rx_format.append(field)
         
         self.instrument.packet_format.tx_format = []
-        for i in range(4):
+        for i in range(self.FORMAT_FIELDS):
             combo_box = getattr(self, 'pf_tx_format_{0}'.format(i))
             field = str(combo_box.currentText())
             if field != PacketFormat.FormatField.empty: